@@ -0,0 +1,303 @@
+import argparse
+import itertools
+import json
+import sys
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+import numpy as np
+import pygame
+
+import biomes
+import generate_squares
+import grid
+import render
+import transform
+from classes.bitplane_automaton import find_mismatch
+from classes.cellular_automaton import CellularAutomaton
+from classes.strip_world import StripWorld
+from helper import get_grid_shape
+from random_field import RandomField
+from rules import SMOOTHING_RULES
+from terrain_types import GRASS, WATER
+
+# The grid engine, the grid engine spread over worker processes each advancing a strip of the grid, the grid packed
+# into bitplanes, or the original engine of TerrainSquare objects kept as the reference implementation. The biomes
+# generator is timed alongside them, its passes smoothing the coastline before the biomes are picked
+ENGINES = ('grid', 'strips', 'bitplanes', 'objects', 'biomes')
+
+# Phases quicker than this in the baseline are too noisy to flag as regressions on their own
+MIN_COMPARED_SECONDS = 0.005
+
+
+def run_phases(engine: str, screen_width: int, screen_height: int, square_size: int, land_chance: int,
+               iterations: int, seed: int, workers: int = 1) -> Dict[str, float]:
+    """
+    Generate one map, timing each phase of the generation separately. The strips engine generates and transforms
+    the map in its workers, so that's timed as one phase. The biomes generator times its elevation and moisture
+    fields, each smoothing pass and picking the biomes, the same steps as biomes.generate_biomes.
+
+    :param engine:         One of ENGINES
+    :param screen_width:   Width of screen surface as a number of pixels
+    :param screen_height:  Height of screen surface as a number of pixels
+    :param square_size:    Size of an individual terrain square as a number of pixels
+    :param land_chance:    The chance that a given terrain square should start as grass
+    :param iterations:     The number of cellular automata passes to run
+    :param seed:           The seed to generate the map from
+    :param workers:        The number of worker processes for the strips engine
+
+    :return: The wall time in seconds of each phase, in the order they were run
+    """
+    terrain_surf = pygame.Surface((screen_width * 2, screen_height * 2), 0, 32)
+    phases = {}
+    random_field = RandomField(seed)
+
+    start = time.perf_counter()
+    if engine == 'objects':
+        squares_list = generate_squares.generate_squares(screen_width, screen_height, square_size, terrain_surf,
+                                                         land_chance, random_field)
+        phases['generate'] = time.perf_counter() - start
+
+        for i in range(0, iterations):
+            start = time.perf_counter()
+            squares_list = transform.transform(squares_list, screen_width, screen_height, square_size, terrain_surf,
+                                               False, random_field=random_field, pass_index=i + 1)
+            phases['transform_{}'.format(i + 1)] = time.perf_counter() - start
+    elif engine == 'strips':
+        world = StripWorld(*get_grid_shape(screen_width, screen_height, square_size), workers)
+        terrain_grid = world.generate_terrain(land_chance, random_field, iterations)
+        phases['generate_and_transform'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        render.render_grid(terrain_grid, square_size, terrain_surf)
+        phases['render'] = time.perf_counter() - start
+    elif engine == 'biomes':
+        shape = get_grid_shape(screen_width, screen_height, square_size)
+        elevation = biomes.elevation_levels(random_field, shape)
+        phases['elevation'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        moisture = biomes.moisture_levels(random_field, shape)
+        phases['moisture'] = time.perf_counter() - start
+
+        land = None
+        if iterations:
+            coastline = np.where(elevation >= biomes.sea_level(land_chance), GRASS, WATER).astype(np.uint8)
+            automaton = CellularAutomaton(coastline, SMOOTHING_RULES, random_field=random_field)
+            for i in range(0, iterations):
+                start = time.perf_counter()
+                automaton.step()
+                phases['smooth_{}'.format(i + 1)] = time.perf_counter() - start
+            land = automaton.cells != WATER
+
+        start = time.perf_counter()
+        terrain_grid = biomes.classify_biomes(elevation, moisture, land_chance, land)
+        phases['classify'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        render.render_grid(terrain_grid, square_size, terrain_surf)
+        phases['render'] = time.perf_counter() - start
+    else:
+        terrain_grid = grid.generate_grid(screen_width, screen_height, square_size, land_chance, random_field)
+        phases['generate'] = time.perf_counter() - start
+
+        automaton = grid.make_automaton(terrain_grid, random_field=random_field, engine=engine)
+        for i in range(0, iterations):
+            start = time.perf_counter()
+            automaton.step()
+            phases['transform_{}'.format(i + 1)] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        render.render_grid(automaton.cells, square_size, terrain_surf)
+        phases['render'] = time.perf_counter() - start
+
+    return phases
+
+
+def benchmark_case(engine: str, screen_width: int, screen_height: int, square_size: int, land_chance: int,
+                   iterations: int, repeat: int, seed: int, workers: int = 1) -> dict:
+    """
+    Benchmark one set of generation parameters. Phase times are the best of the repeated runs, and peak memory is
+    measured in a separate run with tracemalloc so that tracing doesn't skew the times. Memory used inside the
+    strips engine's worker processes isn't traced.
+
+    :param engine:         One of ENGINES
+    :param screen_width:   Width of screen surface as a number of pixels
+    :param screen_height:  Height of screen surface as a number of pixels
+    :param square_size:    Size of an individual terrain square as a number of pixels
+    :param land_chance:    The chance that a given terrain square should start as grass
+    :param iterations:     The number of cellular automata passes to run
+    :param repeat:         The number of timed runs
+    :param seed:           The seed to generate the maps from
+    :param workers:        The number of worker processes for the strips engine
+
+    :return: The benchmark result, ready to be written out as JSON
+    """
+    args = (engine, screen_width, screen_height, square_size, land_chance, iterations, seed, workers)
+
+    phases = {}
+    for i in range(0, repeat):
+        for name, seconds in run_phases(*args).items():
+            phases[name] = min(seconds, phases.get(name, seconds))
+
+    tracemalloc.start()
+    run_phases(*args)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    rows, cols = get_grid_shape(screen_width, screen_height, square_size)
+    total_seconds = sum(phases.values())
+
+    return {
+        'engine': engine,
+        'screen_width': screen_width,
+        'screen_height': screen_height,
+        'square_size': square_size,
+        'land_chance': land_chance,
+        'iterations': iterations,
+        'workers': workers,
+        'cells': rows * cols,
+        'phases': phases,
+        'total_seconds': total_seconds,
+        'peak_memory_bytes': peak_memory,
+        'cells_per_second': rows * cols / total_seconds,
+    }
+
+
+def case_key(result: dict) -> tuple:
+    """
+    Get the parameters that identify a benchmark case, used to match results against a baseline.
+
+    :param result:  The benchmark result
+
+    :return: The case's engine, size, square size, land chance, iterations and workers
+    """
+    return tuple(result[name] for name in ('engine', 'screen_width', 'screen_height', 'square_size', 'land_chance',
+                                           'iterations')) + (result.get('workers', 1),)
+
+
+def compare_to_baseline(results: List[dict], baseline: List[dict], tolerance: float) -> List[str]:
+    """
+    Compare benchmark results against a stored baseline, flagging any case whose total time, any phase's time or
+    peak memory has grown by more than the tolerance. Cases missing from the baseline are skipped.
+
+    :param results:    The benchmark results
+    :param baseline:   The baseline benchmark results
+    :param tolerance:  The allowed fractional increase, e.g. 0.2 for 20%
+
+    :return: A description of each regression found
+    """
+    baseline_cases = {case_key(result): result for result in baseline}
+    regressions = []
+
+    for result in results:
+        base = baseline_cases.get(case_key(result))
+        if base is None:
+            continue
+
+        measures = [('total_seconds', result['total_seconds'], base['total_seconds']),
+                    ('peak_memory_bytes', result['peak_memory_bytes'], base['peak_memory_bytes'])]
+        measures += [(name, seconds, base['phases'][name]) for name, seconds in result['phases'].items()
+                     if base['phases'].get(name, 0) >= MIN_COMPARED_SECONDS]
+
+        for name, value, base_value in measures:
+            if value > base_value * (1 + tolerance):
+                regressions.append('{}: {} {:.4g} -> {:.4g} (+{:.0%})'.format(
+                    case_key(result), name, base_value, value, value / base_value - 1
+                ))
+
+    return regressions
+
+
+def parse_size(size: str) -> tuple:
+    """
+    Parse a display window size given as WIDTHxHEIGHT.
+
+    :param size:  The size to parse
+
+    :return: The width and height
+    """
+    width, height = size.lower().split('x')
+    return int(width), int(height)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Parse the command line arguments for a benchmark run.
+
+    :param argv:  The arguments to parse, sys.argv is used if not given
+
+    :return: The parsed arguments
+    """
+    parser = argparse.ArgumentParser(description='Benchmark map generation without opening a display window. '
+                                                 'Every combination of the swept values is run.')
+    parser.add_argument('--sizes', type=parse_size, nargs='+', default=[(1600, 800)],
+                        help='Display window sizes to sweep, as WIDTHxHEIGHT')
+    parser.add_argument('--square-sizes', type=int, nargs='+', default=[12], help='Square sizes to sweep')
+    parser.add_argument('--land-chances', type=int, nargs='+', default=[50], help='Land chances to sweep')
+    parser.add_argument('--iterations', type=int, nargs='+', default=[grid.TRANSFORM_PASSES],
+                        help='Numbers of cellular automata passes to sweep')
+    parser.add_argument('--engines', choices=ENGINES, nargs='+', default=['grid'], help='Engines to sweep')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1],
+                        help='Numbers of worker processes to sweep for the strips engine')
+    parser.add_argument('--validate', action='store_true',
+                        help='Before timing each bitplanes case, check it makes the same grid as the grid engine '
+                             'after every pass, and stop with an error if it doesn\'t')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of timed runs of each case, the best is kept')
+    parser.add_argument('--seed', type=int, default=0, help='Seed to generate the maps from')
+    parser.add_argument('--output', default=None, help='File to write the JSON results to, stdout if not given')
+    parser.add_argument('--baseline', default=None, help='JSON results of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed fractional slowdown or memory growth before a case counts as a regression')
+
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Run the benchmark sweep, write out the results and compare them against a baseline if one is given.
+
+    :param argv:  The arguments to parse, sys.argv is used if not given
+
+    :return: The exit code, 1 if any regressions were found against the baseline
+    """
+    args = parse_args(argv)
+
+    results = []
+    for engine, (width, height), square_size, land_chance, iterations, workers in itertools.product(
+            args.engines, args.sizes, args.square_sizes, args.land_chances, args.iterations, args.workers):
+        # Only the strips engine uses workers, so the other engines are run once
+        if engine != 'strips' and workers != args.workers[0]:
+            continue
+        if args.validate and engine == 'bitplanes':
+            random_field = RandomField(args.seed)
+            mismatch = find_mismatch(grid.generate_grid(width, height, square_size, land_chance, random_field),
+                                     iterations, random_field=random_field)
+            if mismatch is not None:
+                print('Bitplanes engine differs from the grid engine after pass {} at {}x{}, square size {}, land '
+                      'chance {}'.format(mismatch, width, height, square_size, land_chance), file=sys.stderr)
+                return 1
+        results.append(benchmark_case(engine, width, height, square_size, land_chance, iterations, args.repeat,
+                                      args.seed, workers if engine == 'strips' else 1))
+
+    output = json.dumps(results, indent=2)
+    if args.output is None:
+        print(output)
+    else:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output)
+
+    if args.baseline is not None:
+        with open(args.baseline) as baseline_file:
+            regressions = compare_to_baseline(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print('Regression {}'.format(regression), file=sys.stderr)
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,249 @@
+from typing import Callable, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from classes.cellular_automaton import CellularAutomaton, PassSnapshot
+from helper import get_grid_shape
+from neighbourhood import DEFAULT_BOUNDARY
+from random_field import RandomField
+from rules import SMOOTHING_RULES, Rule
+from terrain_types import WATER, DEEP_WATER, SAND, GRASS, FOREST, HILL, MOUNTAIN, SNOW
+
+# Size in cells of the largest features of the elevation and moisture fields, and the number of octaves of finer
+# detail layered over them, each half the size and half the strength of the last
+ELEVATION_SCALE = 128
+ELEVATION_OCTAVES = 5
+MOISTURE_SCALE = 256
+MOISTURE_OCTAVES = 3
+PERSISTENCE = 0.5
+
+# Noise lattice values are pass 0 draws of the random field, each octave of each field on its own stream so they
+# never share draws with each other or with the initial grid on stream 0
+ELEVATION_STREAM = 16
+MOISTURE_STREAM = 32
+
+# Layered noise bunches up around the middle of its range, so elevation is stretched away from the middle by this
+# much to spread it over the whole range
+ELEVATION_CONTRAST = 2.0
+
+# Elevation is classified in this many steps, so it can be looked up in a table in one go
+ELEVATION_LEVELS = 256
+
+# Number of output rows interpolated at a time, small enough that each row only has a few lattice rows to blend
+BAND_ROWS = 32
+
+# The biome of land cells, from the shore upwards, by the fraction of the way from sea level to the highest
+# elevation they start at, and the biome of water cells by how far below sea level they are
+SHALLOW_DEPTH = 0.15
+LAND_BANDS: Tuple[Tuple[float, int], ...] = (
+    (0.0, SAND),
+    (0.05, GRASS),
+    (0.45, HILL),
+    (0.7, MOUNTAIN),
+    (0.9, SNOW),
+)
+
+# Grass and hills wetter than this are forest
+FOREST_MOISTURE = 0.55
+MOISTURE_LEVELS = 2
+
+
+def fractal_noise(random_field: RandomField, stream: int, shape: Tuple[int, int], scale: float, octaves: int,
+                  persistence: float = PERSISTENCE, origin: Tuple[int, int] = (0, 0)) -> np.ndarray:
+    """
+    Fractal value noise: octaves of random values on ever finer lattices, smoothly interpolated between the lattice
+    points and added together with ever smaller weights. Every lattice value is a draw of the random field keyed by
+    its lattice position, so any part of the noise can be made on its own and match.
+
+    Interpolating along each row is a small gather, and interpolating down the columns is done for every octave at
+    once as a matrix product of the row weights and the rows of every octave stacked together, a band of rows at a
+    time so each band only multiplies by the lattice rows near it.
+
+    :param random_field:  The random field the lattice values are drawn from
+    :param stream:        The stream of the first octave, each later octave uses the next stream
+    :param shape:         The number of rows and columns of noise to make
+    :param scale:         The lattice spacing of the first octave in cells
+    :param octaves:       The number of octaves
+    :param persistence:   How much weaker each octave is than the last
+    :param origin:        The row and column in the world of the top left cell
+
+    :return: The float32 noise, between 0 and 1
+    """
+    rows, cols = shape
+    weight = 1.0
+    total_weight = 0.0
+    octave_rows = []
+    for octave in range(0, octaves):
+        spacing = max(scale / 2 ** octave, 1.0)
+
+        # Interpolate every lattice row the output covers along the columns, already weighted for the octave
+        left, col_weights = _lattice_weights(np.arange(origin[1], origin[1] + cols), spacing)
+        top, row_weights = _lattice_weights(np.arange(origin[0], origin[0] + rows), spacing)
+        lattice = random_field.block(0, stream + octave, top, left, (row_weights.shape[1], col_weights.shape[1]))
+        lattice *= np.float32(weight)
+        octave_rows.append((row_weights, lattice @ col_weights.T))
+
+        total_weight += weight
+        weight *= persistence
+
+    noise = np.empty(shape, dtype=np.float32)
+    for start in range(0, rows, BAND_ROWS):
+        stop = min(start + BAND_ROWS, rows)
+        band_weights = []
+        band_rows = []
+        for row_weights, interpolated in octave_rows:
+            used = np.flatnonzero(row_weights[start:stop].any(axis=0))
+            band_weights.append(row_weights[start:stop, used[0]:used[-1] + 1])
+            band_rows.append(interpolated[used[0]:used[-1] + 1])
+        np.matmul(np.hstack(band_weights), np.vstack(band_rows), out=noise[start:stop])
+
+    noise *= np.float32(1 / total_weight)
+    return noise
+
+
+def _lattice_weights(positions: np.ndarray, spacing: float) -> Tuple[int, np.ndarray]:
+    # The weight of each lattice point covering the positions for each position, with a smoothstep between the two
+    # points either side of it
+    scaled = positions / spacing
+    lower = np.floor(scaled).astype(np.int64)
+    fraction = (scaled - lower).astype(np.float32)
+    fraction = fraction * fraction * (3 - 2 * fraction)
+
+    first = int(lower.min())
+    weights = np.zeros((len(positions), int(lower.max()) - first + 2), dtype=np.float32)
+    index = np.arange(0, len(positions))
+    weights[index, lower - first] = 1 - fraction
+    weights[index, lower - first + 1] = fraction
+    return first, weights
+
+
+def elevation_levels(random_field: RandomField, shape: Tuple[int, int],
+                     origin: Tuple[int, int] = (0, 0)) -> np.ndarray:
+    """
+    Make the elevation of every cell from fractal noise, stretched to cover the whole range of levels.
+
+    :param random_field:  The random field the noise is drawn from
+    :param shape:         The number of rows and columns of the grid
+    :param origin:        The row and column in the world of the top left cell
+
+    :return: The uint8 elevation of each cell, from 0 to ELEVATION_LEVELS - 1
+    """
+    elevation = fractal_noise(random_field, ELEVATION_STREAM, shape, ELEVATION_SCALE, ELEVATION_OCTAVES,
+                              origin=origin)
+    elevation -= np.float32(0.5)
+    elevation *= np.float32(ELEVATION_CONTRAST * ELEVATION_LEVELS)
+    elevation += np.float32(ELEVATION_LEVELS / 2)
+    np.clip(elevation, 0, ELEVATION_LEVELS - 1, out=elevation)
+    return elevation.astype(np.uint8)
+
+
+def moisture_levels(random_field: RandomField, shape: Tuple[int, int],
+                    origin: Tuple[int, int] = (0, 0)) -> np.ndarray:
+    """
+    Make the moisture of every cell from fractal noise, as whether it's wet enough for forest.
+
+    :param random_field:  The random field the noise is drawn from
+    :param shape:         The number of rows and columns of the grid
+    :param origin:        The row and column in the world of the top left cell
+
+    :return: The uint8 moisture of each cell, 1 if it's wet enough for forest and 0 if not
+    """
+    moisture = fractal_noise(random_field, MOISTURE_STREAM, shape, MOISTURE_SCALE, MOISTURE_OCTAVES, origin=origin)
+    return (moisture >= np.float32(FOREST_MOISTURE)).view(np.uint8)
+
+
+def sea_level(land_chance: int) -> int:
+    """
+    Get the elevation level land starts at. Like the chance a cell of a random grid starts as grass, a higher land
+    chance gives less land.
+
+    :param land_chance:  A number from 0 to 100
+
+    :return: The lowest elevation level that's land
+    """
+    return min(max(round(land_chance * ELEVATION_LEVELS / 100), 0), ELEVATION_LEVELS)
+
+
+def biome_table(land_chance: int) -> np.ndarray:
+    """
+    Build the table of the biome of each combination of moisture and elevation level.
+
+    :param land_chance:  A number from 0 to 100, see sea_level
+
+    :return: The uint8 table of terrain type codes, indexed by moisture level, whether the cell is land and
+             elevation level
+    """
+    level = sea_level(land_chance)
+    levels = np.arange(0, ELEVATION_LEVELS)
+    table = np.empty((MOISTURE_LEVELS, 2, ELEVATION_LEVELS), dtype=np.uint8)
+
+    # Water gets deep once it's far enough below sea level
+    table[:, 0] = np.where(levels < level - SHALLOW_DEPTH * ELEVATION_LEVELS, DEEP_WATER, WATER)
+
+    # Land bands go up from sea level, land below sea level is always the lowest band
+    height = (levels - level) / max(ELEVATION_LEVELS - level, 1)
+    land = np.full(ELEVATION_LEVELS, LAND_BANDS[0][1], dtype=np.uint8)
+    for start, type_id in LAND_BANDS[1:]:
+        land[height >= start] = type_id
+    table[:, 1] = land
+    table[1, 1][(land == GRASS) | (land == HILL)] = FOREST
+
+    return table
+
+
+def classify_biomes(elevation: np.ndarray, moisture: np.ndarray, land_chance: int,
+                    land: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Turn elevation and moisture into terrain type codes with a single table lookup per cell.
+
+    :param elevation:    The uint8 elevation level of each cell
+    :param moisture:     The uint8 moisture level of each cell
+    :param land_chance:  A number from 0 to 100, see sea_level
+    :param land:         Whether each cell is land, taken from the elevation if not given
+
+    :return: The grid of terrain type codes
+    """
+    if land is None:
+        land = elevation >= sea_level(land_chance)
+
+    return biome_table(land_chance)[moisture, land.view(np.uint8), elevation]
+
+
+def generate_biomes(screen_width: int, screen_height: int, square_size: int, land_chance: int,
+                    random_field: Optional[RandomField] = None, smooth_passes: int = 0,
+                    rules: Sequence[Rule] = SMOOTHING_RULES, min_changes: int = 0, boundary: str = DEFAULT_BOUNDARY,
+                    observers: Iterable[Callable[[PassSnapshot], None]] = ()) -> np.ndarray:
+    """
+    Generate a map of biomes from an elevation and a moisture field, optionally running cellular automata passes
+    over the coastline made by the elevation before the biomes are picked, to smooth it out.
+
+    :param screen_width:   Width of screen surface as a number of pixels
+    :param screen_height:  Height of screen surface as a number of pixels
+    :param square_size:    Size of an individual terrain square as a number of pixels
+    :param land_chance:    A number from 0 to 100, the higher it is the lower the land, see sea_level
+    :param random_field:   The random field to draw from, a freshly seeded one is used if not given
+    :param smooth_passes:  The number of cellular automata passes to run over the coastline
+    :param rules:          The rule table the passes follow, over a grid of grass and water
+    :param min_changes:    Stop the passes once a pass changes fewer than this many cells
+    :param boundary:       How cells on the edge of the grid see past it, one of neighbourhood.BOUNDARY_MODES
+    :param observers:      Called with a snapshot of the coastline after each pass, see CellularAutomaton.subscribe
+
+    :return: The finished grid of terrain type codes
+    """
+    if random_field is None:
+        random_field = RandomField()
+
+    shape = get_grid_shape(screen_width, screen_height, square_size)
+    elevation = elevation_levels(random_field, shape)
+    moisture = moisture_levels(random_field, shape)
+
+    land = None
+    if smooth_passes:
+        coastline = np.where(elevation >= sea_level(land_chance), GRASS, WATER).astype(np.uint8)
+        automaton = CellularAutomaton(coastline, rules, boundary=boundary, random_field=random_field)
+        for observer in observers:
+            automaton.subscribe(observer)
+        automaton.run(smooth_passes, min_changes)
+        land = automaton.cells != WATER
+
+    return classify_biomes(elevation, moisture, land_chance, land)
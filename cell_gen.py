@@ -1,25 +1,54 @@
 import sys
 
+import numpy as np
 import pygame
 from pygame.locals import *
 
-import generate_squares
+import grid
 import input
 import pygame_setup
-import transform
+import render
 
 # Declare setup variables ----------------------------------------------------------------------------------------------
+from classes.cellular_automaton import CellularAutomaton
+from classes.index_saver import IndexSaver
+from classes.infinite_world import InfiniteWorld
 from classes.key_input import KeyInput
+from classes.map_cache import MapCache, MapKey
+from classes.map_file import MapFile
+from classes.map_index import index_path, load_index
+from classes.pass_observers import DisplayObserver, PassLogger
+from classes.profile_hud import ProfileHud
+from classes.profiler import Profiler
+from classes.regen_worker import RegenWorker
+from map_format import MapFormatError
+from random_field import RandomField
 
 screen_width = 1600
 screen_height = 800
 square_size = 12
 land_chance = 50
+map_file_path = None
 running = True
 
+# Explore an unbounded world generated a chunk at a time as it's dragged into view, rather than a fixed size map
+infinite = False
+
+# Show a coarse version of the starting map almost straight away, then refine it level by level, showing each level
+# as it's finished
+progressive = False
+
+# Maps that have been generated are cached so going back to them is instant. If a directory is given, here or as the
+# ninth command line argument, they're also kept in it between runs
+map_cache_dir = None
+
 # Debug shows the output of each iteration, but results in vastly decreased performance of the terrain generation
 # as the overhead for the greatly increased amount of drawing to the display surface is quite high.
 debug = False
+
+# F3 shows a HUD with the frame rate, memory use and how long each stage of the last regen took, and p regenerates the
+# map under cProfile, writing the stats to this file
+profile_path = 'regen.prof'
 # ----------------------------------------------------------------------------------------------------------------------
 
 
@@ -47,43 +76,127 @@ if __name__ == "__main__":
             debug = sys.argv[5].lower() == 'true'
         except IndexError:
             pass
+        try:
+            map_file_path = sys.argv[6] or None
+        except IndexError:
+            pass
+        try:
+            infinite = sys.argv[7].lower() == 'true'
+        except IndexError:
+            pass
+        try:
+            progressive = sys.argv[8].lower() == 'true'
+        except IndexError:
+            pass
+        try:
+            map_cache_dir = sys.argv[9] or None
+        except IndexError:
+            pass
 
     # Set up the screen
     display_surface = pygame_setup.setup(screen_width, screen_height)
     terrain_surf = pygame.Surface((screen_width * 2, screen_height * 2), 0, 32)
 
-    # Set up the screen with a random assortment of land and water tiles, return that as a list and assign
-    # the neighbours of each tile to one another.
-    squares_list = generate_squares.generate_squares(
-        screen_width,
-        screen_height,
-        square_size,
-        terrain_surf,
-        land_chance
-    )
-    if debug:
-        display_surface.blit(terrain_surf, (0, 0))
-
-    # Prune the tiles based on a rule set, give the land and water definition
-    for i in range(0, 7):
-        squares_list = transform.transform(squares_list, screen_width, screen_height, square_size, terrain_surf, debug)
+    # Debug shows each pass of the full size map instead of the progressive levels
+    progressive = progressive and not debug
+    terrain_rendered = False
+
+    world = None
+    map_index = None
+    if infinite:
+        # The world's chunks are generated in the background as they come into view
+        seed = grid.new_seed()
+        terrain_grid = None
+        world = InfiniteWorld(seed, land_chance, square_size)
+    elif map_file_path is not None:
+        # Show a previously saved terrain map instead of generating a new one
+        with MapFile(map_file_path) as map_file:
+            terrain_grid = np.array(map_file.cells)
+            land_chance = map_file.land_chance
+            seed = map_file.seed
+
+        # Along with the index saved beside it, built again on save if it's missing, unreadable or for a different map
+        try:
+            map_index = load_index(index_path(map_file_path))
+        except (OSError, MapFormatError):
+            map_index = None
+        if map_index is not None and map_index.regions.labels.shape != terrain_grid.shape:
+            map_index = None
+    elif progressive:
+        # Show each level of the map as soon as it's finished, the last is at the full square size
+        seed = grid.new_seed()
+        for level_square_size, terrain_grid in grid.generate_progressive(screen_width, screen_height, square_size,
+                                                                          land_chance, RandomField(seed)):
+            render.render_grid(terrain_grid, level_square_size, terrain_surf)
+            display_surface.blit(terrain_surf, (0, 0))
+            pygame.display.update()
+            pygame.event.pump()
+        terrain_rendered = True
+    else:
+        # Set up the screen with a random assortment of land and water tiles, then prune the tiles based on a rule
+        # set to give the land and water definition
+        seed = grid.new_seed()
+        random_field = RandomField(seed)
+        terrain_grid = grid.generate_grid(screen_width, screen_height, square_size, land_chance, random_field)
         if debug:
+            render.render_grid(terrain_grid, square_size, terrain_surf)
             display_surface.blit(terrain_surf, (0, 0))
+            pygame.display.update()
+
+        # In debug each pass is shown as it's run, with the number of cells it changed
+        automaton = CellularAutomaton(terrain_grid, random_field=random_field)
+        if debug:
+            automaton.subscribe(DisplayObserver(terrain_surf, display_surface, square_size))
+            automaton.subscribe(PassLogger())
+        automaton.run(grid.TRANSFORM_PASSES, grid.MIN_CHANGES)
+        terrain_grid = automaton.cells
+        terrain_rendered = debug
+
+    map_cache = MapCache(directory=map_cache_dir)
+    # Progressive maps differ from those the same seed gives otherwise, so aren't cached
+    if map_file_path is None and world is None and not progressive:
+        map_cache.put(MapKey(seed, screen_width, screen_height, square_size, land_chance, grid.TRANSFORM_PASSES),
+                      terrain_grid)
+
+    if world is None and not terrain_rendered:
+        render.render_grid(terrain_grid, square_size, terrain_surf)
 
     # Set up the input script, blit the screen surface for the
     # land and water tiles to the display surface and set the game clock
-    key_input = KeyInput(land_chance, terrain_surf, screen_width, screen_height)
-    display_surface.blit(terrain_surf, (0, 0))
+    profiler = Profiler()
+    key_input = KeyInput(land_chance, terrain_surf, screen_width, screen_height, terrain_grid, seed, world, profiler,
+                         IndexSaver(terrain_grid, map_index))
+    input.blit_to_display(display_surface, key_input)
+    pygame.display.update()
+    key_input.dirty_rects = []
     clock = pygame.time.Clock()
 
+    # Regenerated maps are made in the background so the main loop doesn't stall while they're generated
+    regen_worker = RegenWorker(screen_width, screen_height, square_size, map_cache, profiler)
+    generating_text = pygame.font.SysFont(None, 24).render('Generating...', True, (0, 0, 0), (255, 255, 255))
+    profile_hud = ProfileHud()
+    show_hud = False
+
     # Main loop to keep it running until the user quits
     while running:
-        clock.tick(60)
+        profiler.frame(clock.tick(60) / 1000)
         events = pygame.event.get()
         for event in events:
             if event.type == QUIT:
                 running = False
 
+            # Memory is only traced while the HUD is shown, as tracing slows everything down. Once it's hidden the
+            # map is drawn again over where it was
+            if event.type == KEYDOWN and event.key == K_F3:
+                show_hud = not show_hud
+                profiler.set_tracing(show_hud)
+                key_input.last_blit = None
+                input.blit_to_display(display_surface, key_input)
+
+            if event.type == KEYDOWN and event.key == K_p and world is None:
+                input.regen_map(screen_width, screen_height, square_size, terrain_surf, key_input, debug,
+                                regen_worker, profile_path=profile_path)
+
             # Check user inputs for actions
             terrain_surf = input.compute_input_actions(
                 screen_width,
@@ -92,9 +205,32 @@ if __name__ == "__main__":
                 display_surface,
                 terrain_surf,
                 key_input,
-                debug
+                debug,
+                regen_worker
             )
 
-        pygame.display.update()
-
+        terrain_surf = input.swap_in_regen(regen_worker, terrain_surf, key_input, display_surface)
+
+        # Keep drawing the world's view until every chunk in it has been generated
+        if world is not None:
+            input.blit_to_display(display_surface, key_input)
+        # The HUD changes every frame, so the map under it is drawn again each frame it's shown
+        if show_hud:
+            key_input.last_blit = None
+            input.blit_to_display(display_surface, key_input)
+        if regen_worker.is_busy():
+            key_input.dirty_rects.append(display_surface.blit(generating_text, (10, 10)))
+        if show_hud:
+            key_input.dirty_rects.append(profile_hud.draw(display_surface, profiler))
+
+        # Only update the areas of the display that have been drawn to this frame
+        if key_input.dirty_rects:
+            pygame.display.update(key_input.dirty_rects)
+            key_input.dirty_rects = []
+
+    regen_worker.stop()
+    if world is not None:
+        world.stop()
+    if debug:
+        print('Map cache: {}'.format(map_cache.stats()))
     pygame.quit()
@@ -0,0 +1,328 @@
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from classes.cellular_automaton import DENSE_FRACTION, CellularAutomaton, PassSnapshot
+from neighbourhood import DEFAULT_BOUNDARY, check_boundary
+from random_field import RandomField
+from rules import DEFAULT_RULES, Rule
+from terrain_types import WATER
+
+# Number of cells packed into each word of a bitplane
+WORD_BITS = 64
+
+# Numbers of bits in a bit-sliced neighbour count, enough for 0 to 8
+COUNT_BITS = 4
+
+
+class BitplaneAutomaton:
+    """
+    Runs cellular automata passes like a CellularAutomaton, but with the grid packed into bitplanes: bit k of every
+    cell's terrain type code is held in plane k, one bit per cell in 64 bit words. The three terrain types of the
+    original rules fit in two planes, a quarter of the memory of a grid of one byte codes.
+
+    Each pass works on whole words at once, 64 cells per operation. Whether each cell is of the types a rule counts
+    is worked out from the planes with bitwise logic, shifted a bit left and right and a row up and down to line up
+    each of the eight neighbours, and the eight neighbour planes are added together with bit-sliced full adders into
+    a four bit count per cell held in four planes. A rule's count range is then a bitwise test of those four planes.
+    Rules with a chance draw from the random field for just the cells the rule's other conditions hold for, so the
+    draws and the result are exactly the same as a CellularAutomaton's.
+
+    Each row is packed with a bit either side of it for the cells past the edge of the grid, and the planes have a
+    row above and below for the same, filled according to the boundary mode before every pass.
+
+    Attributes:
+        rules:           The rule table the passes follow
+        boundary:        How cells on the edge of the grid see past it, one of neighbourhood.BOUNDARY_MODES
+        random_field:    The random field that rules with a chance draw from
+        origin:          The row and column in the random field of the grid's top left cell
+        passes:          The number of passes run so far, the next pass draws with the pass number one higher
+        change_counts:   The number of cells that changed in each pass so far
+        observers:       Called with a PassSnapshot after every pass
+        cells:           The grid of terrain type codes after the latest pass, unpacked from the planes
+        previous_cells:  The grid of terrain type codes before the latest pass, unpacked from the planes
+
+    Methods:
+        load:           Replace the grid with a new one of the same shape
+        subscribe:      Add an observer to be called after every pass
+        step:           Run one pass over the grid
+        run:            Run passes until the grid settles or a number of passes have been run
+    """
+
+    def __init__(self, terrain_grid: np.ndarray, rules: Sequence[Rule] = DEFAULT_RULES,
+                 boundary: str = DEFAULT_BOUNDARY, random_field: Optional[RandomField] = None,
+                 origin: Tuple[int, int] = (0, 0)):
+        check_boundary(boundary)
+        self.rules = tuple(rules)
+        self.boundary = boundary
+        self.random_field = random_field if random_field is not None else RandomField()
+        self.origin = origin
+        self.passes = 0
+        self.change_counts: List[int] = []
+        self.observers: List[Callable[[PassSnapshot], None]] = []
+
+        rows, cols = terrain_grid.shape
+        self._shape = (rows, cols)
+        rule_types = [WATER] + [type_code for rule in self.rules
+                                for type_code in (rule.from_type, rule.to_type) + tuple(rule.count_types)]
+        self._plane_count = max(int(terrain_grid.max(initial=0)), *rule_types, 1).bit_length()
+        self._words = (cols + 2 + WORD_BITS - 1) // WORD_BITS
+
+        self._planes = np.zeros((self._plane_count, rows + 2, self._words), dtype=np.uint64)
+        self._previous = np.zeros_like(self._planes)
+
+        # The bits of each row that hold cells of the grid rather than the cells past its edges
+        inside = np.zeros(self._words * WORD_BITS, dtype=bool)
+        inside[1:cols + 1] = True
+        self._inside = self._pack(inside[None])[0]
+
+        self.load(terrain_grid)
+
+    @property
+    def cells(self) -> np.ndarray:
+        return self._unpack_planes(self._planes)
+
+    @property
+    def previous_cells(self) -> np.ndarray:
+        return self._unpack_planes(self._previous)
+
+    def load(self, terrain_grid: np.ndarray) -> None:
+        """
+        Replace the grid with a new one of the same shape, reusing the planes.
+
+        :param terrain_grid:  The grid of terrain type codes
+        """
+        if int(terrain_grid.max(initial=0)) >> self._plane_count:
+            raise ValueError('Terrain type codes up to {} fit in the planes, the grid has {}'.format(
+                (1 << self._plane_count) - 1, int(terrain_grid.max())))
+
+        padded = np.zeros((self._shape[0], self._words * WORD_BITS), dtype=np.uint8)
+        padded[:, 1:self._shape[1] + 1] = terrain_grid
+        for plane in range(0, self._plane_count):
+            self._planes[plane, 1:-1] = self._pack((padded >> plane) & 1)
+        np.copyto(self._previous, self._planes)
+
+        self.change_counts = []
+        self.passes = 0
+
+    def subscribe(self, observer: Callable[[PassSnapshot], None]) -> None:
+        """
+        Add an observer to be called with a snapshot of the grid once after every pass, see
+        CellularAutomaton.subscribe. The grids in the snapshot are unpacked from the planes for each pass.
+
+        :param observer:  The callable to add
+        """
+        self.observers.append(observer)
+
+    def step(self) -> int:
+        """
+        Run one pass of the rules over the grid.
+
+        :return: The number of cells that changed
+        """
+        self.passes += 1
+        self._planes, self._previous = self._previous, self._planes
+        previous = self._previous
+        self._fill_border(previous)
+        np.copyto(self._planes, previous)
+        planes = self._planes[:, 1:-1]
+
+        counts: Dict[Tuple[int, ...], List[np.ndarray]] = {}
+        for index, rule in enumerate(self.rules):
+            if rule.count_types not in counts:
+                counts[rule.count_types] = self._count_neighbours(self._is_any(previous, rule.count_types))
+
+            mask = self._is_any(previous[:, 1:-1], (rule.from_type,))
+            mask &= self._in_range(counts[rule.count_types], rule.min_count, rule.max_count)
+            mask &= self._inside
+            if rule.chance < 1:
+                self._draw(index, rule.chance, mask)
+
+            for plane in range(0, self._plane_count):
+                if rule.to_type >> plane & 1:
+                    planes[plane] |= mask
+                else:
+                    planes[plane] &= ~mask
+
+        differs = np.zeros(planes.shape[1:], dtype=np.uint64)
+        for plane in range(0, self._plane_count):
+            differs |= planes[plane] ^ previous[plane, 1:-1]
+        changed = _count_bits(differs)
+        self.change_counts.append(changed)
+
+        if self.observers:
+            snapshot = PassSnapshot(self.passes, self.cells, self.previous_cells, changed)
+            for observer in self.observers:
+                observer(snapshot)
+
+        return changed
+
+    def run(self, passes: int, min_changes: int = 0) -> None:
+        """
+        Run passes over the grid until the given number have been run, or a pass changes fewer than min_changes
+        cells.
+
+        :param passes:       The most passes to run
+        :param min_changes:  Stop once a pass changes fewer than this many cells
+        """
+        for i in range(0, passes):
+            if self.step() < min_changes:
+                break
+
+    def _pack(self, bits: np.ndarray) -> np.ndarray:
+        # Pack rows of 0 and 1 bytes, a whole number of words long, into words with the first cell in the lowest bit
+        packed = np.packbits(bits.astype(np.uint8, copy=False), axis=1, bitorder='little')
+        return packed.view('<u8').astype(np.uint64, copy=False)
+
+    def _unpack(self, words: np.ndarray) -> np.ndarray:
+        return np.unpackbits(words.astype('<u8', copy=False).view(np.uint8), axis=-1, bitorder='little')
+
+    def _unpack_planes(self, planes: np.ndarray) -> np.ndarray:
+        rows, cols = self._shape
+        cells = np.zeros(self._shape, dtype=np.uint8)
+        for plane in range(0, self._plane_count):
+            cells |= self._unpack(planes[plane, 1:-1])[:, 1:cols + 1] << np.uint8(plane)
+        return cells
+
+    def _fill_border(self, planes: np.ndarray) -> None:
+        # Fill the bit either side of each row, then the rows above and below, like neighbourhood.fill_border
+        cols = self._shape[1]
+        if self.boundary == 'wrap':
+            sources = (cols, 1)
+        elif self.boundary == 'clamp':
+            sources = (1, cols)
+        else:
+            sources = None
+
+        for column, source in zip((0, cols + 1), sources or (None, None)):
+            word, bit = divmod(column, WORD_BITS)
+            if source is None:
+                values = np.uint64(WATER) >> np.arange(0, self._plane_count, dtype=np.uint64) & np.uint64(1)
+                values = values[:, None]
+            else:
+                values = planes[:, 1:-1, source // WORD_BITS] >> np.uint64(source % WORD_BITS) & np.uint64(1)
+            planes[:, 1:-1, word] &= ~np.uint64(1 << bit)
+            planes[:, 1:-1, word] |= values << np.uint64(bit)
+
+        if self.boundary == 'wrap':
+            planes[:, 0] = planes[:, -2]
+            planes[:, -1] = planes[:, 1]
+        elif self.boundary == 'clamp':
+            planes[:, 0] = planes[:, 1]
+            planes[:, -1] = planes[:, -2]
+        else:
+            for plane in range(0, self._plane_count):
+                fill = ~np.uint64(0) if WATER >> plane & 1 else np.uint64(0)
+                planes[plane, 0] = fill
+                planes[plane, -1] = fill
+
+    def _is_any(self, planes: np.ndarray, type_codes: Tuple[int, ...]) -> np.ndarray:
+        # The bits of the cells that are any of the types, each type being where every plane matches its code's bit
+        result = np.zeros(planes.shape[1:], dtype=np.uint64)
+        for type_code in type_codes:
+            is_type = np.full(planes.shape[1:], ~np.uint64(0), dtype=np.uint64)
+            for plane in range(0, self._plane_count):
+                is_type &= planes[plane] if type_code >> plane & 1 else ~planes[plane]
+            result |= is_type
+        return result
+
+    def _count_neighbours(self, is_any: np.ndarray) -> List[np.ndarray]:
+        # Line up each of the eight neighbours of the cells of every row with the cells, then add them up with full
+        # adders a bit of the count at a time, giving the ones, twos, fours and eights bits of every cell's count
+        above, middle, below = is_any[:-2], is_any[1:-1], is_any[2:]
+        neighbours = [_from_left(above), above, _from_right(above), _from_left(middle), _from_right(middle),
+                      _from_left(below), below, _from_right(below)]
+
+        sum_a, carry_a = _full_add(*neighbours[0:3])
+        sum_b, carry_b = _full_add(*neighbours[3:6])
+        sum_c, carry_c = neighbours[6] ^ neighbours[7], neighbours[6] & neighbours[7]
+        ones, carry_d = _full_add(sum_a, sum_b, sum_c)
+        sum_e, carry_e = _full_add(carry_a, carry_b, carry_c)
+        twos, carry_f = sum_e ^ carry_d, sum_e & carry_d
+        return [ones, twos, carry_e ^ carry_f, carry_e & carry_f]
+
+    def _in_range(self, count: List[np.ndarray], min_count: int, max_count: int) -> np.ndarray:
+        # The bits of the cells whose count is one of the values in the range
+        result = np.zeros(count[0].shape, dtype=np.uint64)
+        for value in range(max(min_count, 0), min(max_count, 8) + 1):
+            matches = np.full(count[0].shape, ~np.uint64(0), dtype=np.uint64)
+            for bit in range(0, COUNT_BITS):
+                matches &= count[bit] if value >> bit & 1 else ~count[bit]
+            result |= matches
+        return result
+
+    def _draw(self, index: int, chance: float, mask: np.ndarray) -> None:
+        # Draw for just the cells set in the mask, in words that have any set, and clear the ones that miss. If there
+        # are too many for that to be worth it, draw for every cell at once, the draws being the same either way
+        if _count_bits(mask) > self._shape[0] * self._shape[1] * DENSE_FRACTION:
+            draws = self.random_field.block(self.passes, index, self.origin[0], self.origin[1] - 1,
+                                            (self._shape[0], self._words * WORD_BITS))
+            mask &= self._pack(draws < chance)
+            return
+
+        words = mask.ravel()
+        set_words = np.flatnonzero(words)
+        if len(set_words) == 0:
+            return
+
+        bits = self._unpack(words[set_words, None])
+        hits = np.flatnonzero(bits)
+        rows, word_columns = np.divmod(set_words[hits // WORD_BITS], self._words)
+        cols = word_columns * WORD_BITS + hits % WORD_BITS - 1
+        bits.ravel()[hits] = self.random_field.at(self.passes, index, rows + self.origin[0],
+                                                  cols + self.origin[1]) < chance
+        words[set_words] = self._pack(bits).ravel()
+
+
+def _from_left(words: np.ndarray) -> np.ndarray:
+    # Each bit of the result is the bit to its left in the row, carried over from the next lower word at its edge
+    shifted = words << np.uint64(1)
+    shifted[:, 1:] |= words[:, :-1] >> np.uint64(WORD_BITS - 1)
+    return shifted
+
+
+def _from_right(words: np.ndarray) -> np.ndarray:
+    # Each bit of the result is the bit to its right in the row, carried over from the next higher word at its edge
+    shifted = words >> np.uint64(1)
+    shifted[:, :-1] |= words[:, 1:] << np.uint64(WORD_BITS - 1)
+    return shifted
+
+
+def _full_add(a: np.ndarray, b: np.ndarray, c: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # Add three one bit numbers in every bit position at once, giving the sum bit and the carry bit
+    partial = a ^ b
+    return partial ^ c, (a & b) | (partial & c)
+
+
+def _count_bits(words: np.ndarray) -> int:
+    if hasattr(np, 'bitwise_count'):
+        return int(np.bitwise_count(words).sum())
+    return int(np.unpackbits(words.astype('<u8', copy=False).view(np.uint8)).sum())
+
+
+def find_mismatch(terrain_grid: np.ndarray, passes: int, rules: Sequence[Rule] = DEFAULT_RULES,
+                  boundary: str = DEFAULT_BOUNDARY, random_field: Optional[RandomField] = None,
+                  origin: Tuple[int, int] = (0, 0)) -> Optional[int]:
+    """
+    Check a BitplaneAutomaton against the reference CellularAutomaton, running both over the same grid with the same
+    rules and draws and comparing the grids after every pass.
+
+    :param terrain_grid:  The starting grid of terrain type codes
+    :param passes:        The number of passes to compare
+    :param rules:         The rule table to follow
+    :param boundary:      How cells on the edge of the grid see past it, one of neighbourhood.BOUNDARY_MODES
+    :param random_field:  The random field to draw from, a freshly seeded one is used if not given
+    :param origin:        The row and column in the random field of the grid's top left cell
+
+    :return: The number of the first pass the grids differ after, or None if they never do
+    """
+    if random_field is None:
+        random_field = RandomField()
+
+    reference = CellularAutomaton(terrain_grid, rules, boundary=boundary, random_field=random_field, origin=origin)
+    bitplanes = BitplaneAutomaton(terrain_grid, rules, boundary, random_field, origin)
+    for i in range(0, passes):
+        if reference.step() != bitplanes.step() or not np.array_equal(reference.cells, bitplanes.cells):
+            return reference.passes
+
+    return None
@@ -0,0 +1,286 @@
+from typing import Callable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from neighbourhood import DEFAULT_BOUNDARY, check_boundary, fill_border, fold_border
+from random_field import RandomField
+from rules import DEFAULT_RULES, Rule
+
+# Offsets into the padded grid of the eight neighbours of a cell
+NEIGHBOUR_OFFSETS: Tuple[Tuple[int, int], ...] = tuple(
+    (di, dj) for di in range(0, 3) for dj in range(0, 3) if di != 1 or dj != 1
+)
+
+# If more than this fraction of the grid needs evaluating in a pass, evaluating the whole grid is quicker
+DENSE_FRACTION = 0.2
+
+
+class PassSnapshot(NamedTuple):
+    """
+    The state of a CellularAutomaton after a pass, sent to each of its observers. The grids are the automaton's own
+    buffers, so are only valid until the next pass and must be copied to be kept.
+    """
+    pass_index: int
+    cells: np.ndarray
+    previous_cells: np.ndarray
+    changed: int
+
+
+class CellularAutomaton:
+    """
+    Runs cellular automata passes over a grid of terrain type codes according to a rule table.
+
+    Every pass reads from one preallocated buffer and writes to the other, then the two are swapped, so the result
+    of a pass never depends on the order cells are visited in and no memory is allocated per pass. The neighbour
+    counts and masks each pass needs are held in preallocated scratch buffers too.
+
+    Rules with a chance draw from a RandomField keyed by the pass number, the index of the rule and the position of
+    the cell, offset by the grid's origin, so a cell gets the same draw however much of the grid is evaluated and
+    wherever the grid sits in a larger world.
+
+    After the first pass only the active cells are evaluated: those next to or on a cell that changed in the previous
+    pass, cells where a rule with a chance fired in the previous pass, and cells where a rule with a chance could
+    fire this pass given its draw and whether the rule's other conditions held when the cell was last evaluated.
+    Every other cell would get the same result as last time, so is left as it is, and only the cells a rule's draw
+    matters for are drawn for. The result is exactly the same as evaluating every cell.
+
+    Attributes:
+        rules:           The rule table the passes follow
+        cells:           The grid of terrain type codes after the latest pass
+        previous_cells:  The grid of terrain type codes before the latest pass
+        change_counts:   The number of cells that changed in each pass so far
+        use_frontier:    Whether to evaluate only the active cells after the first pass
+        boundary:        How cells on the edge of the grid see past it, one of neighbourhood.BOUNDARY_MODES
+        random_field:    The random field that rules with a chance draw from
+        origin:          The row and column in the random field of the grid's top left cell
+        passes:          The number of passes run so far, the next pass draws with the pass number one higher
+        observers:       Called with a PassSnapshot after every pass
+
+    Methods:
+        load:           Replace the grid with a new one of the same shape
+        subscribe:      Add an observer to be called after every pass
+        step:           Run one pass over the grid
+        run:            Run passes until the grid settles or a number of passes have been run
+    """
+
+    def __init__(self, terrain_grid: np.ndarray, rules: Sequence[Rule] = DEFAULT_RULES, use_frontier: bool = True,
+                 boundary: str = DEFAULT_BOUNDARY, random_field: Optional[RandomField] = None,
+                 origin: Tuple[int, int] = (0, 0)):
+        check_boundary(boundary)
+        self.rules = tuple(rules)
+        self.use_frontier = use_frontier
+        self.boundary = boundary
+        self.random_field = random_field if random_field is not None else RandomField()
+        self.origin = origin
+        self.passes = 0
+        self.observers: List[Callable[[PassSnapshot], None]] = []
+        rows, cols = terrain_grid.shape
+
+        self.cells = terrain_grid.astype(np.uint8, copy=True)
+        self.previous_cells = np.empty_like(self.cells)
+        self.change_counts: List[int] = []
+
+        # The grid surrounded by a one cell border filled according to the boundary mode, so every cell has eight
+        # neighbours
+        self._padded = np.empty((rows + 2, cols + 2), dtype=np.uint8)
+        self._is_type = np.empty((rows + 2, cols + 2), dtype=bool)
+
+        self._counts = {}
+        for rule in self.rules:
+            for type_code in rule.count_types:
+                self._counts.setdefault((type_code,), np.empty((rows, cols), dtype=np.uint8))
+            self._counts.setdefault(rule.count_types, np.empty((rows, cols), dtype=np.uint8))
+
+        self._mask = np.empty((rows, cols), dtype=bool)
+        self._scratch = np.empty((rows, cols), dtype=bool)
+
+        # The neighbourhoods of the cells changed in the last pass, marked in a grid padded like the terrain so they
+        # can be marked without bounds checks, the cells a chance rule fired on in the last pass, and for each chance
+        # rule the cells its conditions other than the chance held for when they were last evaluated
+        self._frontier = np.zeros((rows + 2, cols + 2), dtype=bool)
+        self._has_frontier = False
+        self._fired = np.zeros((rows, cols), dtype=bool)
+        self._fired_last = np.zeros((rows, cols), dtype=bool)
+        self._ready = {index: np.zeros((rows, cols), dtype=bool)
+                       for index, rule in enumerate(self.rules) if rule.chance < 1}
+
+        # Offsets of a cell and each of its neighbours into the flattened padded grid
+        self._flat_offsets = np.array([(di - 1) * (cols + 2) + dj - 1 for di in range(0, 3) for dj in range(0, 3)])
+        self._flat_neighbour_offsets = np.delete(self._flat_offsets, 4)
+
+    def load(self, terrain_grid: np.ndarray) -> None:
+        """
+        Replace the grid with a new one of the same shape, reusing the buffers.
+
+        :param terrain_grid:  The grid of terrain type codes
+        """
+        np.copyto(self.cells, terrain_grid)
+        self.change_counts = []
+        self.passes = 0
+        self._has_frontier = False
+        self._fired_last.fill(False)
+
+    def subscribe(self, observer: Callable[[PassSnapshot], None]) -> None:
+        """
+        Add an observer to be called with a snapshot of the grid once after every pass, e.g. to show each pass
+        on screen, write it out as a frame or log how many cells changed.
+
+        :param observer:  The callable to add
+        """
+        self.observers.append(observer)
+
+    def step(self) -> int:
+        """
+        Run one pass of the rules over the grid.
+
+        :return: The number of cells that changed
+        """
+        self.passes += 1
+        self.cells, self.previous_cells = self.previous_cells, self.cells
+        np.copyto(self.cells, self.previous_cells)
+
+        active = None
+        if self.use_frontier and self._has_frontier:
+            np.logical_or(self._frontier[1:-1, 1:-1], self._fired_last, out=self._mask)
+
+            # Draw for just the cells each rule with a chance could fire on, unless there are already too many
+            # active cells for it to be worth it
+            if np.count_nonzero(self._mask) <= self._mask.size * DENSE_FRACTION:
+                for index in self._ready:
+                    ready = np.flatnonzero(self._ready[index])
+                    hits = self._draw_at(index, ready) < self.rules[index].chance
+                    self._mask.ravel()[ready[hits]] = True
+
+                active = np.flatnonzero(self._mask)
+                if len(active) > self._mask.size * DENSE_FRACTION:
+                    active = None
+
+        self._fired.fill(False)
+        if active is None:
+            changed = self._step_dense()
+        else:
+            changed = self._step_active(active)
+
+        self._fired, self._fired_last = self._fired_last, self._fired
+        self._mark_frontier(changed)
+        self.change_counts.append(len(changed))
+
+        if self.observers:
+            snapshot = PassSnapshot(self.passes, self.cells, self.previous_cells, len(changed))
+            for observer in self.observers:
+                observer(snapshot)
+
+        return len(changed)
+
+    def run(self, passes: int, min_changes: int = 0) -> None:
+        """
+        Run passes over the grid until the given number have been run, or a pass changes fewer than min_changes
+        cells.
+
+        :param passes:       The most passes to run
+        :param min_changes:  Stop once a pass changes fewer than this many cells
+        """
+        for i in range(0, passes):
+            if self.step() < min_changes:
+                break
+
+    def _step_dense(self) -> np.ndarray:
+        self._count_neighbours()
+
+        for index, rule in enumerate(self.rules):
+            count = self._counts[rule.count_types]
+            np.equal(self.previous_cells, rule.from_type, out=self._mask)
+            np.greater_equal(count, rule.min_count, out=self._scratch)
+            self._mask &= self._scratch
+            np.less_equal(count, rule.max_count, out=self._scratch)
+            self._mask &= self._scratch
+
+            if index in self._ready:
+                # Only draw for the cells the rule's other conditions hold for
+                np.copyto(self._ready[index], self._mask)
+                ready = np.flatnonzero(self._mask)
+                self._mask.ravel()[ready] = self._draw_at(index, ready) < rule.chance
+                self._fired |= self._mask
+
+            np.copyto(self.cells, rule.to_type, where=self._mask)
+
+        np.not_equal(self.cells, self.previous_cells, out=self._mask)
+        return np.flatnonzero(self._mask)
+
+    def _step_active(self, active: np.ndarray) -> np.ndarray:
+        cols = self.cells.shape[1]
+        self._padded[1:-1, 1:-1] = self.previous_cells
+        fill_border(self._padded, self.boundary)
+
+        # Count the neighbours of just the active cells, gathering one neighbour of each from the flattened padded
+        # grid at a time
+        padded_active = active + (active // cols) * 2 + cols + 3
+        padded = self._padded.ravel()
+        counts = {count_types: np.zeros(len(active), dtype=np.uint8)
+                  for count_types in self._counts if len(count_types) == 1}
+        for offset in self._flat_neighbour_offsets:
+            neighbours = padded[padded_active + offset]
+            for (type_code,), count in counts.items():
+                count += neighbours == type_code
+        for count_types in self._counts:
+            if len(count_types) != 1:
+                counts[count_types] = sum(counts[(type_code,)] for type_code in count_types)
+
+        old_types = self.previous_cells.ravel()[active]
+        new_types = old_types.copy()
+        for index, rule in enumerate(self.rules):
+            count = counts[rule.count_types]
+            mask = (old_types == rule.from_type) & (count >= rule.min_count) & (count <= rule.max_count)
+            if index in self._ready:
+                self._ready[index].ravel()[active] = mask
+                mask[mask] = self._draw_at(index, active[mask]) < rule.chance
+                self._fired.ravel()[active[mask]] = True
+            new_types[mask] = rule.to_type
+
+        self.cells.ravel()[active] = new_types
+        return active[new_types != old_types]
+
+    def _draw_at(self, index: int, cells: np.ndarray) -> np.ndarray:
+        rows, cols = np.divmod(cells, self.cells.shape[1])
+        return self.random_field.at(self.passes, index, rows + self.origin[0], cols + self.origin[1])
+
+    def _mark_frontier(self, changed: np.ndarray) -> None:
+        # With this many changes the next pass will evaluate the whole grid anyway
+        if len(changed) > self.cells.size * DENSE_FRACTION:
+            self._has_frontier = False
+            return
+
+        cols = self.cells.shape[1]
+        self._frontier.fill(False)
+
+        padded_changed = changed + (changed // cols) * 2 + cols + 3
+        frontier = self._frontier.ravel()
+        for offset in self._flat_offsets:
+            frontier[padded_changed + offset] = True
+        fold_border(self._frontier, self.boundary)
+
+        self._has_frontier = True
+
+    def _count_neighbours(self) -> None:
+        rows, cols = self.cells.shape
+        self._padded[1:-1, 1:-1] = self.previous_cells
+        fill_border(self._padded, self.boundary)
+
+        # Count the neighbours of each single type by summing shifted slices of where the padded grid is that type
+        for count_types, count in self._counts.items():
+            if len(count_types) != 1:
+                continue
+
+            np.equal(self._padded, count_types[0], out=self._is_type)
+            is_type = self._is_type.view(np.uint8)
+
+            count.fill(0)
+            for di, dj in NEIGHBOUR_OFFSETS:
+                count += is_type[di:di + rows, dj:dj + cols]
+
+        # Then add those up for rules that count more than one type
+        for count_types, count in self._counts.items():
+            if len(count_types) != 1:
+                np.copyto(count, self._counts[count_types[:1]])
+                for type_code in count_types[1:]:
+                    count += self._counts[(type_code,)]
@@ -0,0 +1,130 @@
+import os
+import tempfile
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+import grid
+from random_field import RandomField
+from terrain_types import WATER
+
+
+class ChunkedWorld:
+    """
+    A terrain grid too large to hold in memory, stored on disk and processed a fixed size chunk at a time.
+
+    The grid is held in two memory mapped npy files, one holding the current state of the terrain and one that
+    the next cellular automata pass is written into, which are swapped after each pass. To transform a chunk it's
+    read along with a one cell halo of the neighbouring chunks' cells (or water past the edge of the world), so
+    every cell sees exactly the same neighbours it would in one big grid and there are no seams between chunks.
+    Random draws come from a RandomField keyed by each cell's position in the world, so the finished world is the
+    same whatever the chunk size, and the same as generating it in memory with grid.generate_terrain.
+
+    Attributes:
+        rows:        Number of rows of cells in the world
+        cols:        Number of columns of cells in the world
+        chunk_size:  Number of rows and columns of cells in a chunk
+        directory:   The directory the memory mapped files are stored in
+        cells:       The memory mapped grid of terrain type codes holding the current state of the world
+        cells_path:  The path of the npy file backing the cells attribute
+        passes:      The number of cellular automata passes run so far
+
+    Methods:
+        chunks:        Iterate over the row and column slices of every chunk in the world
+        read_chunk:    Get a copy of a chunk of cells surrounded by its halo
+        generate:      Fill the world with random grass and water
+        transform:     Run one cellular automata pass over the whole world, chunk by chunk
+        close:         Flush the memory mapped files to disk and release them
+    """
+
+    def __init__(self, rows: int, cols: int, chunk_size: int = 1024, directory: Optional[str] = None):
+        self.rows = rows
+        self.cols = cols
+        self.chunk_size = chunk_size
+        self.directory = directory if directory is not None else tempfile.mkdtemp(prefix='terrain_')
+        self.passes = 0
+
+        self.cells_path = os.path.join(self.directory, 'terrain_a.npy')
+        self._next_cells_path = os.path.join(self.directory, 'terrain_b.npy')
+        self.cells = self._open_buffer(self.cells_path)
+        self._next_cells = self._open_buffer(self._next_cells_path)
+
+    def _open_buffer(self, path: str) -> np.memmap:
+        return np.lib.format.open_memmap(path, mode='w+', dtype=np.uint8, shape=(self.rows, self.cols))
+
+    def chunks(self) -> Iterator[Tuple[int, int, slice, slice]]:
+        """
+        Iterate over every chunk in the world, row by row.
+
+        :return: An iterator of (chunk row, chunk column, row slice, column slice) tuples
+        """
+        for chunk_y, y in enumerate(range(0, self.rows, self.chunk_size)):
+            for chunk_x, x in enumerate(range(0, self.cols, self.chunk_size)):
+                yield chunk_y, chunk_x, slice(y, min(y + self.chunk_size, self.rows)), \
+                    slice(x, min(x + self.chunk_size, self.cols))
+
+    def read_chunk(self, rows: slice, cols: slice, halo: int = 1) -> np.ndarray:
+        """
+        Get a copy of a chunk of cells surrounded by a halo of the neighbouring cells, where cells past the edge of
+        the world are water.
+
+        :param rows:  The row slice of the chunk
+        :param cols:  The column slice of the chunk
+        :param halo:  The width of the halo in cells
+
+        :return: The chunk of terrain type codes with its halo
+        """
+        chunk = np.full((rows.stop - rows.start + halo * 2, cols.stop - cols.start + halo * 2), WATER, dtype=np.uint8)
+
+        top = max(rows.start - halo, 0)
+        bottom = min(rows.stop + halo, self.rows)
+        left = max(cols.start - halo, 0)
+        right = min(cols.stop + halo, self.cols)
+
+        chunk_top = top - (rows.start - halo)
+        chunk_left = left - (cols.start - halo)
+        chunk[chunk_top:chunk_top + bottom - top, chunk_left:chunk_left + right - left] = \
+            self.cells[top:bottom, left:right]
+
+        return chunk
+
+    def generate(self, grass_chance: int, seed: int) -> None:
+        """
+        Fill the world with random grass and water, one chunk at a time.
+
+        :param grass_chance:  The chance that a given cell should start as grass
+        :param seed:          The seed of the random field for the world
+        """
+        random_field = RandomField(seed)
+        for chunk_y, chunk_x, rows, cols in self.chunks():
+            self.cells[rows, cols] = grid.random_grid((rows.stop - rows.start, cols.stop - cols.start),
+                                                      grass_chance, random_field, (rows.start, cols.start))
+        self.passes = 0
+
+    def transform(self, seed: int) -> None:
+        """
+        Run one cellular automata pass over the whole world. Each chunk is transformed with its halo, only the cells
+        inside the chunk are kept, and they're written to the other buffer so no chunk sees its neighbours' new
+        state part way through a pass.
+
+        :param seed:  The seed of the random field for the world
+        """
+        self.passes += 1
+        random_field = RandomField(seed)
+        for chunk_y, chunk_x, rows, cols in self.chunks():
+            self._next_cells[rows, cols] = grid.transform_grid(self.read_chunk(rows, cols), random_field,
+                                                               pass_index=self.passes,
+                                                               origin=(rows.start - 1, cols.start - 1))[1:-1, 1:-1]
+
+        self.cells, self._next_cells = self._next_cells, self.cells
+        self.cells_path, self._next_cells_path = self._next_cells_path, self.cells_path
+
+    def close(self) -> None:
+        """
+        Flush the memory mapped files to disk and release them, the final state of the world is left in the npy
+        file backing the cells attribute.
+        """
+        self.cells.flush()
+        self._next_cells.flush()
+        self.cells = None
+        self._next_cells = None
@@ -0,0 +1,75 @@
+import threading
+from typing import Optional
+
+import numpy as np
+
+from classes.map_index import MapIndex, build_index
+
+
+class IndexSaver:
+    """
+    Builds the index of a map and saves it on a background thread, so building the index of a large map doesn't
+    stall the main loop when the map is saved.
+
+    Only one save runs at a time, saves asked for while one is running are skipped. The index built for a map is
+    kept, and saved again rather than built again while that same grid of terrain is the one being saved.
+
+    Attributes:
+        thread:  The thread of the latest save, None before the first
+
+    Methods:
+        save:      Save the index of a map on a background thread
+        index_of:  Get the index already built for a map
+        is_busy:   Check whether a save is running
+    """
+
+    def __init__(self, terrain_grid: Optional[np.ndarray] = None, map_index: Optional[MapIndex] = None):
+        self.thread: Optional[threading.Thread] = None
+
+        # The grid of terrain and its index, swapped together so the index is never paired with the wrong grid
+        self._built = (terrain_grid, map_index) if map_index is not None else None
+
+    def save(self, terrain_grid: np.ndarray, path: str) -> bool:
+        """
+        Save the index of a map to a file on a background thread, building it first unless it's already been built
+        for this grid of terrain.
+
+        :param terrain_grid:  The grid of terrain type codes, which mustn't change while it's being indexed
+        :param path:          The file path to save the index to
+
+        :return: True if the save was started, False if one is already running
+        """
+        if self.is_busy():
+            return False
+
+        self.thread = threading.Thread(target=self._run, args=(terrain_grid, path), name='IndexSaver', daemon=True)
+        self.thread.start()
+        return True
+
+    def index_of(self, terrain_grid: np.ndarray) -> Optional[MapIndex]:
+        """
+        Get the index already built for a grid of terrain.
+
+        :param terrain_grid:  The grid of terrain type codes
+
+        :return: The index, or None if it hasn't been built for this grid
+        """
+        built = self._built
+        if built is None or built[0] is not terrain_grid:
+            return None
+        return built[1]
+
+    def is_busy(self) -> bool:
+        """
+        Check whether a save is running.
+
+        :return: True if a save is running
+        """
+        return self.thread is not None and self.thread.is_alive()
+
+    def _run(self, terrain_grid: np.ndarray, path: str) -> None:
+        map_index = self.index_of(terrain_grid)
+        if map_index is None:
+            map_index = build_index(terrain_grid)
+            self._built = (terrain_grid, map_index)
+        map_index.save(path)
@@ -0,0 +1,241 @@
+import math
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Tuple, Union
+
+import numpy as np
+import pygame
+from pygame.rect import Rect
+from pygame.surface import Surface, SurfaceType
+
+import grid
+import render
+from classes.cellular_automaton import CellularAutomaton
+from classes.zoom_pyramid import surface_bytes
+from random_field import RandomField
+
+# Default number of rows and columns of cells in a chunk, and limit on the memory used by rendered chunks in bytes
+DEFAULT_CHUNK_SIZE = 64
+DEFAULT_MAX_BYTES = 128 * 1024 * 1024
+
+# How many chunks past the edge of the screen are prefetched in the direction the view is moving
+PREFETCH_CHUNKS = 2
+
+# Colour shown where a chunk hasn't been generated yet
+PLACEHOLDER_COLOUR = (40, 40, 40)
+
+
+def generate_region(seed: int, land_chance: int, top: int, left: int, shape: Tuple[int, int],
+                    passes: int = grid.TRANSFORM_PASSES) -> np.ndarray:
+    """
+    Generate any rectangle of an unbounded world. A cell can only be affected by cells up to one cell further away
+    per pass, so the rectangle is generated with a halo as wide as the number of passes, and the halo is cut off
+    afterwards. The draws are keyed by each cell's position in the world, so every rectangle matches its neighbours
+    seamlessly and is the same whenever and in whatever order it's generated.
+
+    :param seed:         The seed of the world
+    :param land_chance:  The chance that a given cell should start as grass
+    :param top:          The row in the world of the rectangle's top left cell
+    :param left:         The column in the world of the rectangle's top left cell
+    :param shape:        The number of rows and columns of the rectangle
+    :param passes:       The number of cellular automata passes to run
+
+    :return: The rectangle's grid of terrain type codes
+    """
+    random_field = RandomField(seed)
+    rows, cols = shape
+    origin = (top - passes, left - passes)
+
+    automaton = CellularAutomaton(grid.random_grid((rows + passes * 2, cols + passes * 2), land_chance,
+                                                   random_field, origin), random_field=random_field, origin=origin)
+    automaton.run(passes)
+
+    return automaton.cells[passes:passes + rows, passes:passes + cols].copy()
+
+
+def generate_chunk(seed: int, land_chance: int, chunk_x: int, chunk_y: int, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                   passes: int = grid.TRANSFORM_PASSES) -> np.ndarray:
+    """
+    Generate one chunk of an unbounded world, see generate_region.
+
+    :param seed:         The seed of the world
+    :param land_chance:  The chance that a given cell should start as grass
+    :param chunk_x:      The column of the chunk in the world, in chunks
+    :param chunk_y:      The row of the chunk in the world, in chunks
+    :param chunk_size:   Number of rows and columns of cells in a chunk
+    :param passes:       The number of cellular automata passes to run
+
+    :return: The chunk's grid of terrain type codes
+    """
+    return generate_region(seed, land_chance, chunk_y * chunk_size, chunk_x * chunk_size, (chunk_size, chunk_size),
+                           passes)
+
+
+class InfiniteWorld:
+    """
+    An unbounded world made of chunks, generated as they come into view and rendered to a surface each.
+
+    Chunks are generated and rendered on a background thread, visible chunks first and then the chunks just past the
+    edge of the screen in the direction the view is moving, so they're usually ready before they're needed. Rendered
+    chunks are kept in a least recently used cache limited by the memory their surfaces take up, so memory stays the
+    same however far the view travels. Chunks in the latest view are never evicted, so prefetching can't push out
+    what's on screen. Chunks that aren't ready yet are shown as a placeholder until they are.
+
+    Attributes:
+        seed:         The seed of the world
+        land_chance:  The chance that a given cell should start as grass
+        square_size:  Size of an individual terrain square as a number of pixels
+        chunk_size:   Number of rows and columns of cells in a chunk
+        max_bytes:    The limit on the memory used by rendered chunks
+
+    Methods:
+        reset:          Start showing a different world, dropping every rendered chunk
+        chunk_pixels:   Get the width and height of a chunk in pixels
+        visible_chunks: Get the chunks covering an area of the world
+        blit_view:      Draw an area of the world to a surface, asking for any chunks that aren't ready
+        stop:           Stop the background thread
+    """
+
+    def __init__(self, seed: int, land_chance: int, square_size: int, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.seed = seed
+        self.land_chance = land_chance
+        self.square_size = square_size
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+
+        self._surfaces = OrderedDict()
+        self._cached_bytes = 0
+        self._condition = threading.Condition()
+        self._pending: List[Tuple[int, int]] = []
+        self._visible = set()
+        self._working = None
+        self._stopped = False
+
+        self._thread = threading.Thread(target=self._run, name='InfiniteWorld', daemon=True)
+        self._thread.start()
+
+    def reset(self, seed: int, land_chance: int) -> None:
+        """
+        Start showing a different world, dropping every rendered chunk and waiting request.
+
+        :param seed:         The seed of the new world
+        :param land_chance:  The chance that a given cell should start as grass
+        """
+        with self._condition:
+            self.seed = seed
+            self.land_chance = land_chance
+            self._surfaces.clear()
+            self._cached_bytes = 0
+            self._pending = []
+
+    def chunk_pixels(self) -> int:
+        """
+        Get the width and height of a chunk in pixels.
+
+        :return: The size of a chunk's surface in pixels
+        """
+        return self.chunk_size * self.square_size
+
+    def visible_chunks(self, view: Rect) -> List[Tuple[int, int]]:
+        """
+        Get every chunk covering an area of the world, row by row.
+
+        :param view:  The area of the world in pixels
+
+        :return: The (chunk column, chunk row) of each chunk
+        """
+        size = self.chunk_pixels()
+        return [(chunk_x, chunk_y)
+                for chunk_y in range(math.floor(view.top / size), math.floor((view.bottom - 1) / size) + 1)
+                for chunk_x in range(math.floor(view.left / size), math.floor((view.right - 1) / size) + 1)]
+
+    def blit_view(self, display_surface: Union[Surface, SurfaceType], view: Rect,
+                  direction: Tuple[int, int] = (0, 0)) -> bool:
+        """
+        Draw an area of the world to a surface, with a placeholder for chunks that aren't ready. Chunks that aren't
+        ready are asked for, followed by the chunks just past the area in the direction it's moving.
+
+        :param display_surface:  The surface to draw onto, the area's top left corner is drawn at its top left
+        :param view:             The area of the world in pixels
+        :param direction:        The direction the area is moving in, the sign of each of its x and y are used
+
+        :return: True if every chunk in the area was ready
+        """
+        size = self.chunk_pixels()
+        missing = []
+        with self._condition:
+            self._visible = set(self.visible_chunks(view))
+            for chunk in self.visible_chunks(view):
+                position = (chunk[0] * size - view.left, chunk[1] * size - view.top)
+                surface = self._surfaces.get(chunk)
+                if surface is None:
+                    missing.append(chunk)
+                    display_surface.fill(PLACEHOLDER_COLOUR, (position, (size, size)))
+                else:
+                    self._surfaces.move_to_end(chunk)
+                    display_surface.blit(surface, position)
+
+        self._request(missing + self._ahead(view, direction))
+        return not missing
+
+    def stop(self) -> None:
+        """
+        Stop the background thread once it's finished any chunk it's part way through.
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join()
+
+    def _ahead(self, view: Rect, direction: Tuple[int, int]) -> List[Tuple[int, int]]:
+        # The chunks just past the edges of the area it's moving towards
+        if direction == (0, 0):
+            return []
+
+        reach = self.chunk_pixels() * PREFETCH_CHUNKS
+        dx = (direction[0] > 0) - (direction[0] < 0)
+        dy = (direction[1] > 0) - (direction[1] < 0)
+        ahead = view.inflate(reach * 2 * abs(dx), reach * 2 * abs(dy)).move(reach * dx, reach * dy)
+        return self.visible_chunks(ahead)
+
+    def _request(self, chunks: Iterable[Tuple[int, int]]) -> None:
+        # Replace the waiting requests with the chunks that still aren't rendered, in order
+        with self._condition:
+            pending = [chunk for chunk in dict.fromkeys(chunks)
+                       if chunk not in self._surfaces and chunk != self._working]
+            if pending != self._pending:
+                self._pending = pending
+                self._condition.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                chunk = self._pending.pop(0)
+                self._working = chunk
+                seed, land_chance = self.seed, self.land_chance
+
+            cells = generate_chunk(seed, land_chance, chunk[0], chunk[1], self.chunk_size)
+            surface = pygame.Surface((self.chunk_pixels(), self.chunk_pixels()), 0, 32)
+            render.render_grid(cells, self.square_size, surface)
+
+            with self._condition:
+                # Drop the chunk if the world was reset while it was being made
+                self._working = None
+                if (seed, land_chance) == (self.seed, self.land_chance) and chunk not in self._surfaces:
+                    self._remember(chunk, surface)
+
+    def _remember(self, chunk: Tuple[int, int], surface: Union[Surface, SurfaceType]) -> None:
+        self._surfaces[chunk] = surface
+        self._cached_bytes += surface_bytes(surface)
+
+        # Evict the least recently used chunks, always keeping the one just made and the ones in view
+        for evicted_chunk in list(self._surfaces):
+            if self._cached_bytes <= self.max_bytes:
+                break
+            if evicted_chunk != chunk and evicted_chunk not in self._visible:
+                self._cached_bytes -= surface_bytes(self._surfaces.pop(evicted_chunk))
@@ -1,7 +1,14 @@
-from typing import Union
+from typing import List, Optional, Union
 
+import numpy as np
+from pygame.rect import Rect
 from pygame.surface import SurfaceType, Surface
 
+from classes.infinite_world import InfiniteWorld
+from classes.index_saver import IndexSaver
+from classes.profiler import Profiler
+from classes.zoom_pyramid import ZoomPyramid
+
 
 class KeyInput:
     """
@@ -15,6 +22,16 @@ class KeyInput:
             terrain_surf_copy:    A copy of the terrain surface
             screen_width:         Width of screen surface as a number of pixels
             screen_height:        Height of screen surface as a number of pixels
+            terrain_grid:         The grid of terrain type codes currently shown
+            seed:                 The seed the current terrain was generated from
+            zoom_pyramid:         The zoom levels of the terrain surface, built on first zoom after each regen
+            zoom_level:           The zoom level currently shown, 0 being the unscaled terrain surface
+            last_blit:            The surface and position last blitted to the display, None if it needs redrawing
+            dirty_rects:          The areas of the display drawn to since the display was last updated
+            world:                The unbounded world shown instead of the terrain surface, None if not exploring one
+            profiler:             Times the stages of making and showing the map
+            index_saver:          Builds and saves the regions and nearest terrain of the terrain shown in the
+                                  background, on first save after each regen
 
         Methods:
             get_width:              Get the width of the terrain surface
@@ -23,10 +40,15 @@ class KeyInput:
             new_y_pos:              Get the new y position of the mouse
             is_new_pos_in_x_bound:  Determine if the new x position of the mouse is in a legal area
             is_new_pos_in_y_bound:  Determine if the new y position of the mouse is in a legal area
+            set_zoom_level:         Show a different zoom level, keeping the centre of the view in place
+            set_terrain:            Show newly generated terrain at the default zoom level
+            clamp_surface_pos:      Move the surface so the screen doesn't go past its edges
         """
 
     def __init__(self, land_chance: int, terrain_surf_copy: Union[Surface, SurfaceType], screen_width: int,
-                 screen_height: int):
+                 screen_height: int, terrain_grid: Optional[np.ndarray] = None, seed: Optional[int] = None,
+                 world: Optional[InfiniteWorld] = None, profiler: Optional[Profiler] = None,
+                 index_saver: Optional[IndexSaver] = None):
         self.land_chance = land_chance
         self.old_mouse_pos = (0, 0)
         self.diff = (0, 0)
@@ -34,6 +56,15 @@ class KeyInput:
         self.terrain_surf_copy = terrain_surf_copy
         self.screen_width = screen_width
         self.screen_height = screen_height
+        self.terrain_grid = terrain_grid
+        self.seed = seed
+        self.zoom_pyramid: Optional[ZoomPyramid] = None
+        self.zoom_level = 0
+        self.last_blit = None
+        self.dirty_rects: List[Rect] = []
+        self.world = world
+        self.profiler = profiler if profiler is not None else Profiler()
+        self.index_saver = index_saver if index_saver is not None else IndexSaver()
 
     def get_width(self):
         return self.terrain_surf_copy.get_width()
@@ -48,16 +79,60 @@ class KeyInput:
         return self.current_surface_pos[1] + self.diff[1]
 
     def is_new_pos_in_x_bound(self):
-        return (
-                0 - self.get_width() < self.new_x_pos() <
-                0 < self.new_x_pos() + (self.get_width() / 2) < self.screen_width * 2
-        )
+        return self.world is not None or self.screen_width - self.get_width() <= self.new_x_pos() <= 0
 
     def is_new_pos_in_y_bound(self):
-        return (
-                0 - self.get_height() < self.new_y_pos() <
-                0 < self.new_y_pos() + (self.get_height() / 2) < self.screen_height * 2
-        )
+        return self.world is not None or self.screen_height - self.get_height() <= self.new_y_pos() <= 0
 
     def get_new_surface_pos(self):
-        return self.current_surface_pos[0] + self.diff[0], self.current_surface_pos[1] + self.diff[1]
\ No newline at end of file
+        return self.current_surface_pos[0] + self.diff[0], self.current_surface_pos[1] + self.diff[1]
+
+    def set_zoom_level(self, zoom_level: int) -> None:
+        """
+        Show a different level of the zoom pyramid, moving the surface so the terrain at the centre of the screen
+        stays there, but without letting the screen go past the edges of the surface.
+
+        :param zoom_level:  The zoom level to show
+        """
+        old_width, old_height = self.get_width(), self.get_height()
+        self.terrain_surf_copy = self.zoom_pyramid.get(zoom_level)
+        self.zoom_level = zoom_level
+
+        centre_x = self.screen_width / 2 - self.current_surface_pos[0]
+        centre_y = self.screen_height / 2 - self.current_surface_pos[1]
+        new_x = self.screen_width / 2 - centre_x * self.get_width() / old_width
+        new_y = self.screen_height / 2 - centre_y * self.get_height() / old_height
+
+        self.current_surface_pos = (round(new_x), round(new_y))
+        self.clamp_surface_pos()
+
+    def set_terrain(self, terrain_surf: Union[Surface, SurfaceType], terrain_grid: np.ndarray, seed: int,
+                    zoom_pyramid: Optional[ZoomPyramid] = None) -> None:
+        """
+        Show newly generated terrain at the default zoom level.
+
+        :param terrain_surf:  The display surface containing the map information
+        :param terrain_grid:  The grid of terrain type codes
+        :param seed:          The seed the terrain was generated from
+        :param zoom_pyramid:  The zoom levels of the terrain surface, if they've already been built
+        """
+        self.terrain_surf_copy = terrain_surf
+        self.terrain_grid = terrain_grid
+        self.seed = seed
+        self.zoom_pyramid = zoom_pyramid
+        self.zoom_level = 0
+        self.last_blit = None
+        self.clamp_surface_pos()
+
+    def clamp_surface_pos(self) -> None:
+        """
+        Move the surface as little as possible so that the screen doesn't go past any of its edges. An unbounded
+        world has no edges, so is left where it is.
+        """
+        if self.world is not None:
+            return
+
+        self.current_surface_pos = (
+            min(max(self.current_surface_pos[0], self.screen_width - self.get_width()), 0),
+            min(max(self.current_surface_pos[1], self.screen_height - self.get_height()), 0)
+        )
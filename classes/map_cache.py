@@ -0,0 +1,195 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, NamedTuple, Optional
+
+import numpy as np
+
+import map_format
+from classes.map_file import MapFile
+from rules import RULE_VERSION
+
+# Default limits on the number of maps kept in memory, and the space the maps kept on disk take up in bytes
+DEFAULT_MAX_ENTRIES = 32
+DEFAULT_MAX_DISK_BYTES = 256 * 1024 * 1024
+
+
+class MapKey(NamedTuple):
+    """
+    Everything that decides what a generated map looks like, so two maps with the same key are identical.
+    """
+    seed: int
+    screen_width: int
+    screen_height: int
+    square_size: int
+    land_chance: int
+    iterations: int
+    rule_version: int = RULE_VERSION
+
+    def digest(self) -> str:
+        """
+        Get a hash of the key, used to name the map's file in the on disk tier.
+
+        :return: The hex digest of the key
+        """
+        return hashlib.sha256(repr(tuple(self)).encode('utf-8')).hexdigest()
+
+
+class MapCache:
+    """
+    A cache of generated maps keyed by the parameters they were generated from, so revisiting a set of parameters
+    doesn't generate the map again.
+
+    Maps are kept in a least recently used cache in memory, and if a directory is given, also written to it as
+    terrain map files named after their key's digest. The files on disk are limited by the space they take up, the
+    least recently used being deleted first. The cache can be shared between threads.
+
+    Attributes:
+        max_entries:     The most maps kept in memory
+        directory:       The directory of the on disk tier, or None if there isn't one
+        max_disk_bytes:  The limit on the space the maps on disk take up
+        hits:            The number of lookups found in memory or on disk
+        disk_hits:       The number of those lookups that were found on disk
+        misses:          The number of lookups that weren't found
+
+    Methods:
+        get:              Look up a map
+        put:              Add a map
+        get_or_generate:  Look up a map, generating and adding it if it isn't cached
+        stats:            Get the hit and miss counters
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, directory: Optional[str] = None,
+                 max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, key: MapKey) -> Optional[np.ndarray]:
+        """
+        Look up a map, first in memory and then on disk. A map found on disk is moved into memory.
+
+        :param key:  The parameters the map was generated from
+
+        :return: The grid of terrain type codes, or None if it isn't cached. It's shared with the cache so is read only
+        """
+        with self._lock:
+            terrain_grid = self._memory.get(key)
+            if terrain_grid is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return terrain_grid
+
+        terrain_grid = self._read_disk(key)
+        with self._lock:
+            if terrain_grid is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(key, terrain_grid)
+            return terrain_grid
+
+    def put(self, key: MapKey, terrain_grid: np.ndarray) -> None:
+        """
+        Add a map to memory, and to disk if there's an on disk tier. The cache keeps its own copy, so the grid
+        given can still be modified afterwards.
+
+        :param key:           The parameters the map was generated from
+        :param terrain_grid:  The grid of terrain type codes
+        """
+        with self._lock:
+            self._remember(key, terrain_grid.copy())
+        self._write_disk(key, terrain_grid)
+
+    def get_or_generate(self, key: MapKey, generate: Callable[[], np.ndarray]) -> np.ndarray:
+        """
+        Look up a map, generating it and adding it to the cache if it isn't cached.
+
+        :param key:       The parameters the map is generated from
+        :param generate:  Called to generate the map if it isn't cached
+
+        :return: The grid of terrain type codes, read only if it was cached
+        """
+        terrain_grid = self.get(key)
+        if terrain_grid is None:
+            terrain_grid = generate()
+            self.put(key, terrain_grid)
+
+        return terrain_grid
+
+    def stats(self) -> dict:
+        """
+        Get the hit and miss counters.
+
+        :return: The number of hits, disk hits and misses, and the number of maps held in memory
+        """
+        with self._lock:
+            return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                    'entries': len(self._memory)}
+
+    def _remember(self, key: MapKey, terrain_grid: np.ndarray) -> None:
+        # The grid must be the cache's own, as it's made read only to stop it being changed through what get returns
+        terrain_grid.flags.writeable = False
+        self._memory[key] = terrain_grid
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _path(self, key: MapKey) -> str:
+        return os.path.join(self.directory, '{}.trn'.format(key.digest()))
+
+    def _read_disk(self, key: MapKey) -> Optional[np.ndarray]:
+        if self.directory is None:
+            return None
+
+        path = self._path(key)
+        try:
+            with MapFile(path) as map_file:
+                terrain_grid = np.array(map_file.cells)
+        except (OSError, ValueError):
+            return None
+
+        # Mark the file as recently used, so it's the last to be evicted
+        os.utime(path)
+        return terrain_grid
+
+    def _write_disk(self, key: MapKey, terrain_grid: np.ndarray) -> None:
+        if self.directory is None:
+            return
+
+        # Write to a temporary file first so a reader never sees a partly written map
+        path = self._path(key)
+        temp_path = '{}.{}.tmp'.format(path, threading.get_ident())
+        map_format.write_map(temp_path, terrain_grid, key.seed, key.land_chance, key.iterations)
+        os.replace(temp_path, path)
+
+        self._evict_disk()
+
+    def _evict_disk(self) -> None:
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.trn'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for mtime, size, path in entries)
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
@@ -0,0 +1,80 @@
+import mmap
+import os
+
+import numpy as np
+
+import map_format
+
+
+class MapFile:
+    """
+    A terrain map file opened read only through a memory map, so any part of the grid can be read without loading or
+    copying the rest of it. Opening a file that isn't a terrain map this version can read, including an empty or
+    truncated one, raises MapFormatError.
+
+    Attributes:
+        rows:         Number of rows of cells in the map
+        cols:         Number of columns of cells in the map
+        seed:         The seed the terrain was generated from
+        land_chance:  The chance that a terrain square started as grass
+        iterations:   The number of cellular automata passes run over the terrain
+        palette:      A list of (type code, name, RGB colour) tuples for the terrain types in the map
+        cells:        The grid of terrain type codes, a read only view straight onto the memory map
+
+    Methods:
+        read_rect:  Get a rectangle of cells from the map
+        close:      Close the memory map and the file
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, 'rb')
+        self._mmap = None
+        try:
+            # An empty file can't be memory mapped at all
+            if os.fstat(self._file.fileno()).st_size == 0:
+                raise map_format.MapFormatError('File is too short to be a terrain map')
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            header = map_format.read_header(self._mmap)
+        except BaseException:
+            if self._mmap is not None:
+                self._mmap.close()
+            self._file.close()
+            raise
+
+        self.rows = header.rows
+        self.cols = header.cols
+        self.seed = header.seed
+        self.land_chance = header.land_chance
+        self.iterations = header.iterations
+        self.palette = header.palette
+
+        self.cells = np.frombuffer(self._mmap, dtype=np.uint8, count=self.rows * self.cols,
+                                   offset=header.data_offset).reshape(self.rows, self.cols)
+
+    def read_rect(self, x: int, y: int, width: int, height: int) -> np.ndarray:
+        """
+        Get a rectangle of cells from the map without copying them, only the pages of the file the rectangle covers
+        are read from disk.
+
+        :param x:       The column of the top left cell of the rectangle
+        :param y:       The row of the top left cell of the rectangle
+        :param width:   Number of columns of cells in the rectangle
+        :param height:  Number of rows of cells in the rectangle
+
+        :return: A read only view of the rectangle of terrain type codes
+        """
+        return self.cells[y:y + height, x:x + width]
+
+    def close(self) -> None:
+        """
+        Close the memory map and the file, any views of the cells must be released first.
+        """
+        self.cells = None
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
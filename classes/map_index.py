@@ -0,0 +1,228 @@
+import os
+import zipfile
+import zlib
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+import regions
+from map_format import MapFormatError
+
+# Bump whenever what's stored in an index file changes, so old index files are rebuilt rather than misread
+INDEX_VERSION = 1
+
+# An index is saved beside its map, named after it with this in place of the map's extension
+INDEX_EXTENSION = '.index.npz'
+
+# What numpy raises reading a file that's corrupt, truncated, missing fields or not an npz at all
+UNREADABLE_ERRORS = (KeyError, ValueError, TypeError, EOFError, zipfile.BadZipFile, zlib.error)
+
+
+class Region(NamedTuple):
+    """
+    A connected region of one terrain type, e.g. an island or a lake. The bounding box is (x, y, width, height) and
+    the centroid is (x, y), both in cells.
+    """
+    label: int
+    type_id: int
+    area: int
+    bounding_box: Tuple[int, int, int, int]
+    centroid: Tuple[float, float]
+
+
+class MapIndex:
+    """
+    The connected regions of a finished map and, for each terrain type in it, the nearest cell of that type to every
+    cell, worked out once after generation so that questions about the map are single lookups rather than flood
+    fills.
+
+    Attributes:
+        regions:       The labelled regions of the map and their areas, bounding boxes and centroids
+        nearest:       For each terrain type indexed, the flat index of the nearest cell of that type to every cell
+        connectivity:  Whether cells touching at a corner are in the same region (8) or only along an edge (4)
+
+    Methods:
+        region_at:     Get the region a cell is in
+        region:        Get a region by its label
+        regions_of:    Get the labels of every region of a terrain type
+        nearest_cell:  Get the nearest cell of a terrain type to a cell
+        distance_to:   Get the straight line distance from a cell to the nearest cell of a terrain type
+        distances:     Get the distance from every cell to the nearest cell of a terrain type
+        save:          Write the index to a file
+    """
+
+    def __init__(self, map_regions: regions.Regions, nearest: Dict[int, np.ndarray],
+                 connectivity: int = regions.DEFAULT_CONNECTIVITY):
+        self.regions = map_regions
+        self.nearest = nearest
+        self.connectivity = connectivity
+
+    def region_at(self, x: int, y: int) -> Region:
+        """
+        Get the region a cell is in.
+
+        :param x:  The column of the cell
+        :param y:  The row of the cell
+
+        :return: The region
+        """
+        return self.region(int(self.regions.labels[y, x]))
+
+    def region(self, label: int) -> Region:
+        """
+        Get a region by its label.
+
+        :param label:  The label of the region
+
+        :return: The region
+        """
+        top, left, bottom, right = (int(value) for value in self.regions.bounding_boxes[label])
+        row, col = self.regions.centroids[label]
+        return Region(label, int(self.regions.type_ids[label]), int(self.regions.areas[label]),
+                      (left, top, right - left + 1, bottom - top + 1), (float(col), float(row)))
+
+    def regions_of(self, type_id: int) -> np.ndarray:
+        """
+        Get the labels of every region of a terrain type, e.g. every island of grass.
+
+        :param type_id:  The terrain type
+
+        :return: The labels of the regions, in label order
+        """
+        return np.flatnonzero(self.regions.type_ids == type_id)
+
+    def nearest_cell(self, x: int, y: int, type_id: int) -> Optional[Tuple[int, int]]:
+        """
+        Get the nearest cell of a terrain type to a cell, the cell itself if it's of that type.
+
+        :param x:        The column of the cell
+        :param y:        The row of the cell
+        :param type_id:  The terrain type, one of those indexed
+
+        :return: The column and row of the nearest cell, or None if there are no cells of the type in the map
+        """
+        nearest = int(self._nearest(type_id)[y, x])
+        if nearest < 0:
+            return None
+
+        row, col = divmod(nearest, self.regions.labels.shape[1])
+        return col, row
+
+    def distance_to(self, x: int, y: int, type_id: int) -> float:
+        """
+        Get the straight line distance from a cell to the nearest cell of a terrain type.
+
+        :param x:        The column of the cell
+        :param y:        The row of the cell
+        :param type_id:  The terrain type, one of those indexed
+
+        :return: The distance in cells, infinite if there are no cells of the type in the map
+        """
+        nearest = self.nearest_cell(x, y, type_id)
+        if nearest is None:
+            return float('inf')
+        return float(np.hypot(nearest[0] - x, nearest[1] - y))
+
+    def distances(self, type_id: int) -> np.ndarray:
+        """
+        Get the straight line distance from every cell to the nearest cell of a terrain type, the distance
+        transform of the map for that type.
+
+        :param type_id:  The terrain type, one of those indexed
+
+        :return: The float32 distance of every cell in cells, infinite if there are no cells of the type in the map
+        """
+        nearest = self._nearest(type_id)
+        if nearest.size and nearest.flat[0] < 0:
+            return np.full(nearest.shape, np.inf, dtype=np.float32)
+
+        rows, cols = np.divmod(nearest, nearest.shape[1])
+        return np.hypot(rows - np.arange(0, nearest.shape[0])[:, None],
+                        cols - np.arange(0, nearest.shape[1])).astype(np.float32)
+
+    def save(self, path: str) -> None:
+        """
+        Write the index to a compressed numpy npz file, see index_path for where to put it beside its map.
+
+        :param path:  The file path to write to
+        """
+        nearest = {'nearest_{}'.format(type_id): cells for type_id, cells in self.nearest.items()}
+        np.savez_compressed(path, version=INDEX_VERSION, connectivity=self.connectivity, **self.regions._asdict(),
+                            **nearest)
+
+    def _nearest(self, type_id: int) -> np.ndarray:
+        if type_id not in self.nearest:
+            raise KeyError('Terrain type {} is not indexed'.format(type_id))
+        return self.nearest[type_id]
+
+
+def build_index(cells: np.ndarray, connectivity: int = regions.DEFAULT_CONNECTIVITY,
+                type_ids: Optional[Iterable[int]] = None) -> MapIndex:
+    """
+    Label the regions of a finished map and find the nearest cell of each terrain type to every cell.
+
+    :param cells:         The grid of terrain type codes
+    :param connectivity:  One of regions.CONNECTIVITIES
+    :param type_ids:      The terrain types to find the nearest cells of, every type in the map if not given
+
+    :return: The index
+    """
+    if type_ids is None:
+        type_ids = np.unique(cells)
+
+    # Flat indexes of most maps fit in half the memory
+    index_type = np.int32 if cells.size < 2 ** 31 else np.int64
+    nearest = {int(type_id): regions.nearest_cells(cells, type_id).astype(index_type) for type_id in type_ids}
+    return MapIndex(regions.label_regions(cells, connectivity), nearest, connectivity)
+
+
+def index_path(map_path: str) -> str:
+    """
+    Get the file path the index of a map is saved to, beside the map.
+
+    :param map_path:  The file path of the map
+
+    :return: The file path for the index
+    """
+    return os.path.splitext(map_path)[0] + INDEX_EXTENSION
+
+
+def load_index(path: str) -> MapIndex:
+    """
+    Read an index written by MapIndex.save.
+
+    :param path:  The file path to read
+
+    :return: The index
+
+    :raises MapFormatError: If the file isn't an index this version can read
+    """
+    # Pickled objects are never loaded, and anything that isn't a readable npz with the fields of an index, e.g. a
+    # truncated file or a bare npy array, is reported the same way
+    try:
+        index_file = np.load(path, allow_pickle=False)
+    except UNREADABLE_ERRORS as error:
+        raise MapFormatError('File is not a map index: {}'.format(error)) from error
+    if not isinstance(index_file, np.lib.npyio.NpzFile):
+        raise MapFormatError('File is not a map index')
+
+    with index_file:
+        try:
+            if 'version' not in index_file.files:
+                raise MapFormatError('File is not a map index')
+            version = int(index_file['version'])
+            if version != INDEX_VERSION:
+                raise MapFormatError('Unsupported map index version {}'.format(version))
+
+            map_regions = regions.Regions(*(index_file[name] for name in regions.Regions._fields))
+            nearest = {int(name[len('nearest_'):]): index_file[name] for name in index_file.files
+                       if name.startswith('nearest_')}
+            connectivity = int(index_file['connectivity'])
+        except MapFormatError:
+            raise
+        except UNREADABLE_ERRORS as error:
+            raise MapFormatError('Map index is unreadable: {}'.format(error)) from error
+
+    if any(cells.shape != map_regions.labels.shape for cells in nearest.values()):
+        raise MapFormatError('Map index is inconsistent')
+    return MapIndex(map_regions, nearest, connectivity)
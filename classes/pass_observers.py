@@ -0,0 +1,97 @@
+import os
+from typing import Callable, Tuple, Union
+
+import pygame
+from pygame.surface import Surface, SurfaceType
+
+import render
+from classes.cellular_automaton import PassSnapshot
+
+
+class DisplayObserver:
+    """
+    Shows each pass of a CellularAutomaton in the display window as it's run, redrawing just the changed squares
+    and flipping the display once per pass.
+
+    Attributes:
+        terrain_surf:     The terrain surface showing the grid, kept up to date with each pass
+        display_surface:  The display surface the terrain surface is blitted to
+        square_size:      Size of an individual terrain square as a number of pixels
+        position:         Where on the display surface the terrain surface is blitted
+    """
+
+    def __init__(self, terrain_surf: Union[Surface, SurfaceType], display_surface: Union[Surface, SurfaceType],
+                 square_size: int, position: Tuple[int, int] = (0, 0)):
+        self.terrain_surf = terrain_surf
+        self.display_surface = display_surface
+        self.square_size = square_size
+        self.position = position
+
+    def __call__(self, snapshot: PassSnapshot) -> None:
+        render.render_changes(snapshot.previous_cells, snapshot.cells, self.square_size, self.terrain_surf)
+        self.display_surface.blit(self.terrain_surf, self.position)
+        pygame.display.update()
+
+        # Keep the window responding while the passes run
+        pygame.event.pump()
+
+
+class FrameWriter:
+    """
+    Writes each pass of a CellularAutomaton out as a numbered png frame, along with the grid it started from as
+    frame 0, so the passes can be put together into an animation afterwards.
+
+    Attributes:
+        directory:    The directory the frames are written to
+        square_size:  Size of an individual terrain square as a number of pixels
+        size:         The width and height of each frame in pixels
+        prefix:       The start of each frame's file name, followed by its pass number
+
+    Methods:
+        frame_path:   Get the path a pass's frame is written to
+    """
+
+    def __init__(self, directory: str, square_size: int, size: Tuple[int, int], prefix: str = 'frame'):
+        self.directory = directory
+        self.square_size = square_size
+        self.size = size
+        self.prefix = prefix
+        self._surface = None
+
+        os.makedirs(directory, exist_ok=True)
+
+    def frame_path(self, pass_index: int) -> str:
+        """
+        Get the path a pass's frame is written to.
+
+        :param pass_index:  The pass number, 0 for the grid the passes started from
+
+        :return: The file path of the frame
+        """
+        return os.path.join(self.directory, '{}_{:04d}.png'.format(self.prefix, pass_index))
+
+    def __call__(self, snapshot: PassSnapshot) -> None:
+        if self._surface is None:
+            self._surface = pygame.Surface(self.size, 0, 32)
+            render.render_grid(snapshot.previous_cells, self.square_size, self._surface)
+            pygame.image.save(self._surface, self.frame_path(snapshot.pass_index - 1))
+
+        render.render_changes(snapshot.previous_cells, snapshot.cells, self.square_size, self._surface)
+        pygame.image.save(self._surface, self.frame_path(snapshot.pass_index))
+
+
+class PassLogger:
+    """
+    Reports how many cells changed in each pass of a CellularAutomaton.
+
+    Attributes:
+        report:  Called with the log line for each pass
+        label:   Put at the start of each log line, e.g. to tell maps apart
+    """
+
+    def __init__(self, report: Callable[[str], None] = print, label: str = ''):
+        self.report = report
+        self.label = label
+
+    def __call__(self, snapshot: PassSnapshot) -> None:
+        self.report('{}Pass {}: {} cells changed'.format(self.label, snapshot.pass_index, snapshot.changed))
@@ -0,0 +1,103 @@
+from typing import List, Union
+
+import pygame
+from pygame.rect import Rect
+from pygame.surface import Surface, SurfaceType
+
+from classes.profiler import Profiler
+
+# Colours of the HUD's text and the box behind it
+TEXT_COLOUR = (255, 255, 255)
+BACKGROUND_COLOUR = (0, 0, 0, 180)
+
+# Space in pixels between the HUD and the edge of the screen, and between its text and the edge of its box
+MARGIN = 10
+PADDING = 6
+
+# Passes changing fewer than this many cells are folded into one line so the HUD doesn't run off the screen
+MIN_LISTED_CHANGES = 1
+
+
+class ProfileHud:
+    """
+    An overlay in the top right of the screen showing the frame rate, the memory traced by the profiler and how long
+    each stage of the latest regen took.
+
+    Attributes:
+        font:  The font the HUD is written in
+
+    Methods:
+        lines:  Get the lines of text the HUD shows
+        draw:   Draw the HUD onto a surface
+    """
+
+    def __init__(self, font_size: int = 18):
+        self.font = pygame.font.SysFont(None, font_size)
+
+    def lines(self, profiler: Profiler) -> List[str]:
+        """
+        Get the lines of text the HUD shows for the latest numbers recorded by a profiler.
+
+        :param profiler:  The profiler to show the numbers of
+
+        :return: The lines of text
+        """
+        frame_times = list(profiler.frame_times)
+        worst = max(frame_times) * 1000 if frame_times else 0.0
+        lines = ['FPS {:.1f} (worst frame {:.1f} ms)'.format(profiler.fps(), worst)]
+
+        memory = profiler.memory()
+        if memory is None:
+            lines.append('Memory not traced')
+        else:
+            lines.append('Memory {:.1f} MB (peak {:.1f} MB)'.format(memory[0] / 2 ** 20, memory[1] / 2 ** 20))
+
+        blit = profiler.last_stage('blit')
+        if blit is not None:
+            lines.append('Last blit {:.2f} ms'.format(blit.seconds * 1000))
+
+        regen = profiler.last_regen()
+        if not regen:
+            lines.append('No regen yet')
+            return lines
+
+        lines.append('Last regen')
+        quiet_passes, quiet_seconds = 0, 0.0
+        for timing in regen:
+            if timing.changed is not None and timing.changed < MIN_LISTED_CHANGES:
+                quiet_passes += 1
+                quiet_seconds += timing.seconds
+                continue
+
+            line = '  {} {:.1f} ms'.format(timing.stage, timing.seconds * 1000)
+            if timing.changed is not None:
+                line += ', {} changed'.format(timing.changed)
+            if timing.allocated_bytes is not None:
+                line += ', {:+.1f} MB'.format(timing.allocated_bytes / 2 ** 20)
+            lines.append(line)
+
+        if quiet_passes:
+            lines.append('  {} unchanged passes {:.1f} ms'.format(quiet_passes, quiet_seconds * 1000))
+        return lines
+
+    def draw(self, surface: Union[Surface, SurfaceType], profiler: Profiler) -> Rect:
+        """
+        Draw the HUD onto a surface, in its top right corner.
+
+        :param surface:   The surface to draw onto, usually the display surface
+        :param profiler:  The profiler to show the numbers of
+
+        :return: The area drawn to
+        """
+        rendered = [self.font.render(line, True, TEXT_COLOUR) for line in self.lines(profiler)]
+        width = max(text.get_width() for text in rendered) + PADDING * 2
+        height = sum(text.get_height() for text in rendered) + PADDING * 2
+
+        background = pygame.Surface((width, height), pygame.SRCALPHA)
+        background.fill(BACKGROUND_COLOUR)
+        y = PADDING
+        for text in rendered:
+            background.blit(text, (PADDING, y))
+            y += text.get_height()
+
+        return surface.blit(background, (surface.get_width() - width - MARGIN, MARGIN))
@@ -0,0 +1,230 @@
+import cProfile
+import itertools
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+from classes.cellular_automaton import PassSnapshot
+
+# Number of stage timings and frame times kept, older ones are dropped as new ones are recorded
+STAGE_CAPACITY = 512
+FRAME_CAPACITY = 120
+
+
+class StageTiming(NamedTuple):
+    """
+    The time taken by one stage of the pipeline. The allocated bytes are the change in memory traced by
+    tracemalloc over the stage, None if memory wasn't being traced, and changed is the number of cells a pass
+    changed, None for other stages. Stages that were part of a regen have its number, per frame stages have None.
+    """
+    stage: str
+    seconds: float
+    allocated_bytes: Optional[int]
+    changed: Optional[int]
+    regen: Optional[int]
+
+
+class Profiler:
+    """
+    Records how long each stage of making and showing a map takes, in ring buffers so memory stays the same however
+    long the application runs. Stages can be recorded from the main loop and the regen worker's thread at once.
+
+    Memory is only traced while tracing is switched on, as tracemalloc slows everything it traces down. The stages
+    of one regen share its number, so the breakdown of the latest finished regen can be shown.
+
+    Attributes:
+        stages:       The latest stage timings, oldest first
+        frame_times:  The latest frame times in seconds, oldest first
+
+    Methods:
+        stage:          Time a stage, as a context manager
+        record:         Record the time a stage took
+        begin_regen:    Number a new regen
+        end_regen:      Mark a regen as finished
+        pass_timer:     Get an observer that records each cellular automata pass as a stage
+        frame:          Record the time a frame took
+        fps:            Get the average frames per second
+        last_regen:     Get the stage timings of the latest finished regen
+        last_stage:     Get the latest timing of a stage
+        set_tracing:    Switch tracing memory allocations on or off
+        memory:         Get the current and peak traced memory
+        profile:        Run a block under cProfile and write its stats to a file, as a context manager
+    """
+
+    def __init__(self, stage_capacity: int = STAGE_CAPACITY, frame_capacity: int = FRAME_CAPACITY):
+        self.stages = deque(maxlen=stage_capacity)
+        self.frame_times = deque(maxlen=frame_capacity)
+
+        self._regen_numbers = itertools.count(1)
+        self._finished_regen = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str, regen: Optional[int] = None) -> Iterator[None]:
+        """
+        Time the block inside the with statement as a stage, along with the memory it allocates if tracing.
+
+        :param name:   The name of the stage
+        :param regen:  The number of the regen the stage is part of, if it is
+        """
+        allocated = _traced_memory()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            if allocated is not None:
+                allocated = _traced_memory() - allocated if tracemalloc.is_tracing() else None
+            self.record(name, seconds, allocated, regen=regen)
+
+    def record(self, name: str, seconds: float, allocated_bytes: Optional[int] = None, changed: Optional[int] = None,
+               regen: Optional[int] = None) -> None:
+        """
+        Record the time a stage took.
+
+        :param name:             The name of the stage
+        :param seconds:          The wall time the stage took
+        :param allocated_bytes:  The change in traced memory over the stage, if tracing
+        :param changed:          The number of cells the stage changed, for cellular automata passes
+        :param regen:            The number of the regen the stage is part of, if it is
+        """
+        self.stages.append(StageTiming(name, seconds, allocated_bytes, changed, regen))
+
+    def begin_regen(self) -> int:
+        """
+        Number a new regen, for its stages to be recorded with.
+
+        :return: The regen's number
+        """
+        with self._lock:
+            return next(self._regen_numbers)
+
+    def end_regen(self, regen: int) -> None:
+        """
+        Mark a regen as finished, making it the one last_regen gives.
+
+        :param regen:  The regen's number
+        """
+        with self._lock:
+            self._finished_regen = regen
+
+    def pass_timer(self, regen: Optional[int] = None) -> 'PassTimer':
+        """
+        Get an observer to subscribe to a CellularAutomaton, recording each pass it runs from then on as a stage.
+
+        :param regen:  The number of the regen the passes are part of, if they are
+
+        :return: The observer
+        """
+        return PassTimer(self, regen)
+
+    def frame(self, seconds: float) -> None:
+        """
+        Record the time a frame of the main loop took.
+
+        :param seconds:  The wall time since the last frame
+        """
+        self.frame_times.append(seconds)
+
+    def fps(self) -> float:
+        """
+        Get the average frames per second over the recorded frames.
+
+        :return: The frames per second, 0 if no frames have been recorded
+        """
+        total = sum(self.frame_times)
+        return len(self.frame_times) / total if total else 0.0
+
+    def last_regen(self) -> List[StageTiming]:
+        """
+        Get the stage timings of the latest finished regen, in the order they finished.
+
+        :return: The stage timings, empty if no regen has finished or its stages have been dropped from the buffer
+        """
+        regen = self._finished_regen
+        if regen is None:
+            return []
+        return [timing for timing in list(self.stages) if timing.regen == regen]
+
+    def last_stage(self, name: str) -> Optional[StageTiming]:
+        """
+        Get the latest timing of a stage.
+
+        :param name:  The name of the stage
+
+        :return: The stage timing, or None if the stage isn't in the buffer
+        """
+        for timing in reversed(list(self.stages)):
+            if timing.stage == name:
+                return timing
+        return None
+
+    def set_tracing(self, tracing: bool) -> None:
+        """
+        Switch tracing memory allocations with tracemalloc on or off.
+
+        :param tracing:  Whether to trace allocations
+        """
+        if tracing and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif not tracing and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def memory(self) -> Optional[Tuple[int, int]]:
+        """
+        Get the memory traced by tracemalloc since tracing was switched on.
+
+        :return: The current and peak traced memory in bytes, or None if memory isn't being traced
+        """
+        if not tracemalloc.is_tracing():
+            return None
+        return tracemalloc.get_traced_memory()
+
+    @contextmanager
+    def profile(self, path: str) -> Iterator[None]:
+        """
+        Run the block inside the with statement under cProfile, then write the stats to a file to be read with
+        pstats or a viewer such as snakeviz. Only the thread the block runs on is profiled.
+
+        :param path:  The file path to write the stats to
+        """
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            profile.dump_stats(path)
+
+
+class PassTimer:
+    """
+    Records each pass of a CellularAutomaton as a stage of a Profiler, timed from the previous pass, or from when
+    the timer was made for the first pass, with the number of cells it changed.
+
+    Attributes:
+        profiler:  The profiler the passes are recorded by
+        regen:     The number of the regen the passes are part of, if they are
+    """
+
+    def __init__(self, profiler: Profiler, regen: Optional[int] = None):
+        self.profiler = profiler
+        self.regen = regen
+        self._start = time.perf_counter()
+        self._allocated = _traced_memory()
+
+    def __call__(self, snapshot: PassSnapshot) -> None:
+        now = time.perf_counter()
+        allocated = _traced_memory()
+        self.profiler.record('pass {}'.format(snapshot.pass_index), now - self._start,
+                             None if allocated is None or self._allocated is None else allocated - self._allocated,
+                             snapshot.changed, self.regen)
+        self._start = now
+        self._allocated = allocated
+
+
+def _traced_memory() -> Optional[int]:
+    return tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
@@ -0,0 +1,190 @@
+import threading
+from typing import NamedTuple, Optional, Union
+
+import numpy as np
+import pygame
+from pygame.surface import Surface, SurfaceType
+
+import grid
+import render
+from classes.cellular_automaton import CellularAutomaton
+from classes.map_cache import MapCache, MapKey
+from classes.profiler import Profiler
+from classes.zoom_pyramid import ZoomPyramid
+from random_field import RandomField
+
+
+class RegenResult(NamedTuple):
+    """
+    A finished map produced by a RegenWorker, ready to be swapped in for the one on screen.
+    """
+    seed: int
+    land_chance: int
+    terrain_grid: np.ndarray
+    terrain_surf: Union[Surface, SurfaceType]
+    zoom_pyramid: ZoomPyramid
+
+
+class RegenWorker:
+    """
+    Regenerates maps on a background thread so the main loop keeps running while a new map is made.
+
+    Only the latest request is kept, so requests that arrive while a map is being generated replace each other and
+    just the last one is generated next. A finished map is held until the main loop collects it with poll, and a
+    regen that fails holds its exception until collected with poll_error, the worker then carrying on with the next
+    request. If a map cache is given, maps that have been generated before are taken from it rather than generated
+    again.
+
+    Each stage of every regen is timed by the profiler, and a regen can be run under cProfile by giving a file path
+    to write its stats to with the request.
+
+    Attributes:
+        screen_width:   Width of screen surface as a number of pixels
+        screen_height:  Height of screen surface as a number of pixels
+        square_size:    Size of an individual terrain square as a number of pixels
+        map_cache:      The cache of generated maps, or None to always generate them
+        profiler:       Times each stage of every regen
+
+    Methods:
+        request:     Ask for a new map to be generated
+        poll:        Collect the latest finished map, if there is one
+        poll_error:  Collect the exception of the latest failed regen, if there is one
+        is_busy:     Check whether a map is being generated or waiting to be
+        stop:        Stop the background thread
+    """
+
+    def __init__(self, screen_width: int, screen_height: int, square_size: int,
+                 map_cache: Optional[MapCache] = None, profiler: Optional[Profiler] = None):
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        self.square_size = square_size
+        self.map_cache = map_cache
+        self.profiler = profiler if profiler is not None else Profiler()
+
+        self._condition = threading.Condition()
+        self._pending = None
+        self._result = None
+        self._error = None
+        self._working = False
+        self._stopped = False
+
+        self._thread = threading.Thread(target=self._run, name='RegenWorker', daemon=True)
+        self._thread.start()
+
+    def request(self, seed: int, land_chance: int, profile_path: Optional[str] = None) -> None:
+        """
+        Ask for a new map to be generated, replacing any request that hasn't been started yet.
+
+        :param seed:          The seed to generate the map from
+        :param land_chance:   The chance that a given terrain square should start as grass
+        :param profile_path:  If given, the regen is run under cProfile and its stats written to this file path
+        """
+        with self._condition:
+            self._pending = (seed, land_chance, profile_path)
+            self._condition.notify()
+
+    def poll(self) -> Optional[RegenResult]:
+        """
+        Collect the latest finished map, if one has finished since the last poll.
+
+        :return: The finished map, or None
+        """
+        with self._condition:
+            result = self._result
+            self._result = None
+            return result
+
+    def poll_error(self) -> Optional[Exception]:
+        """
+        Collect the exception raised by the latest regen that failed, if one has failed since the last poll.
+
+        :return: The exception, or None
+        """
+        with self._condition:
+            error = self._error
+            self._error = None
+            return error
+
+    def is_busy(self) -> bool:
+        """
+        Check whether a map is being generated, or a request is waiting to be started.
+
+        :return: True if the worker is busy
+        """
+        with self._condition:
+            return self._working or self._pending is not None
+
+    def stop(self) -> None:
+        """
+        Stop the background thread once it's finished any map it's part way through, dropping any waiting request.
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while self._pending is None and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                seed, land_chance, profile_path = self._pending
+                self._pending = None
+                self._working = True
+
+            # A failed regen is handed to the main loop rather than ending the thread, which would leave the
+            # worker busy forever
+            result, error = None, None
+            try:
+                if profile_path is None:
+                    result = self._regen(seed, land_chance)
+                else:
+                    with self.profiler.profile(profile_path):
+                        result = self._regen(seed, land_chance)
+            except Exception as exception:
+                error = exception
+            finally:
+                with self._condition:
+                    if error is None:
+                        self._result = result
+                    else:
+                        self._error = error
+                    self._working = False
+
+    def _regen(self, seed: int, land_chance: int) -> RegenResult:
+        regen = self.profiler.begin_regen()
+        with self.profiler.stage('regen', regen):
+            terrain_grid = self._generate(seed, land_chance, regen)
+
+            with self.profiler.stage('render', regen):
+                terrain_surf = pygame.Surface((self.screen_width * 2, self.screen_height * 2), 0, 32)
+                render.render_grid(terrain_grid, self.square_size, terrain_surf)
+
+            with self.profiler.stage('zoom', regen):
+                zoom_pyramid = ZoomPyramid(terrain_surf, self.screen_width, self.screen_height, self.square_size)
+                zoom_pyramid.build_all()
+
+        self.profiler.end_regen(regen)
+        return RegenResult(seed, land_chance, terrain_grid, terrain_surf, zoom_pyramid)
+
+    def _generate(self, seed: int, land_chance: int, regen: int) -> np.ndarray:
+        def generate() -> np.ndarray:
+            # The same steps as grid.generate_terrain, timed one by one
+            random_field = RandomField(seed)
+            with self.profiler.stage('generate_grid', regen):
+                terrain_grid = grid.generate_grid(self.screen_width, self.screen_height, self.square_size,
+                                                  land_chance, random_field)
+            with self.profiler.stage('setup_automaton', regen):
+                automaton = CellularAutomaton(terrain_grid, random_field=random_field)
+            automaton.subscribe(self.profiler.pass_timer(regen))
+            automaton.run(grid.TRANSFORM_PASSES, grid.MIN_CHANGES)
+            return automaton.cells
+
+        if self.map_cache is None:
+            return generate()
+
+        key = MapKey(seed, self.screen_width, self.screen_height, self.square_size, land_chance,
+                     grid.TRANSFORM_PASSES)
+        return self.map_cache.get_or_generate(key, generate)
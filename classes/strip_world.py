@@ -0,0 +1,195 @@
+import multiprocessing
+import multiprocessing.connection
+import time
+from multiprocessing import shared_memory
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+import grid
+from classes.cellular_automaton import CellularAutomaton
+from neighbourhood import DEFAULT_BOUNDARY, check_boundary
+from random_field import RandomField
+from rules import DEFAULT_RULES, Rule
+from terrain_types import WATER
+
+# Seconds a worker waits at the barrier for the others to finish a pass before giving up, in case one of them died
+# without breaking it. A pass over even a very large strip takes far less
+BARRIER_TIMEOUT = 600
+
+# Seconds the other workers get to stop once one has failed, after which they're terminated
+STOP_TIMEOUT = 10
+
+
+class StripWorld:
+    """
+    A terrain grid generated by several worker processes at once, each advancing one horizontal strip of it, so a
+    single large map can use every core.
+
+    The grid is held in shared memory. Each worker generates its own strip and runs the cellular automata passes
+    over it with a one row halo above and below. After every pass each worker writes just its top and bottom rows
+    into a shared halo buffer, waits at a barrier for the others to do the same, and reads its halo rows from its
+    neighbours. The halo buffer alternates between two halves on odd and even passes, so one barrier per pass is
+    enough: a worker writing the next pass's rows never overwrites rows a slower neighbour is still reading.
+
+    If a worker fails it breaks the barrier, so the others stop at their next exchange rather than waiting for it
+    forever, and any that haven't stopped soon after are terminated.
+
+    Every cell sees exactly the neighbours it would in one big grid, and the random draws are keyed by each cell's
+    position in the world, so the result is identical to grid.generate_terrain with the same seed whatever the number
+    of workers. Workers evaluate every cell of their strip each pass, as their halo rows change underneath them.
+
+    Attributes:
+        rows:      Number of rows of cells in the world
+        cols:      Number of columns of cells in the world
+        workers:   The number of worker processes, one per strip
+        rules:     The rule table the passes follow
+        boundary:  How cells on the edge of the world see past it, one of neighbourhood.BOUNDARY_MODES
+
+    Methods:
+        strips:            Get the row range of each worker's strip
+        generate_terrain:  Generate a random grid and run the passes over it
+    """
+
+    def __init__(self, rows: int, cols: int, workers: int, rules: Sequence[Rule] = DEFAULT_RULES,
+                 boundary: str = DEFAULT_BOUNDARY):
+        check_boundary(boundary)
+        self.rows = rows
+        self.cols = cols
+        self.workers = max(min(workers, rows), 1)
+        self.rules = tuple(rules)
+        self.boundary = boundary
+
+    def strips(self) -> List[Tuple[int, int]]:
+        """
+        Split the rows of the world as evenly as possible between the workers.
+
+        :return: The first row and the row after the last of each strip, from the top
+        """
+        bounds = [self.rows * i // self.workers for i in range(0, self.workers + 1)]
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def generate_terrain(self, grass_chance: int, random_field: RandomField, passes: int = grid.TRANSFORM_PASSES,
+                         min_changes: int = grid.MIN_CHANGES) -> np.ndarray:
+        """
+        Generate a random grid of terrain and run the cellular automata passes over it, spread over the workers,
+        stopping early once a pass changes fewer than min_changes cells across the whole world.
+
+        :param grass_chance:  The chance that a given cell should start as grass
+        :param random_field:  The random field to draw from
+        :param passes:        The number of cellular automata passes to run
+        :param min_changes:   Stop once a pass changes fewer than this many cells
+
+        :return: The finished grid of terrain type codes
+
+        :raises RuntimeError: If any of the workers failed
+        """
+        cells_memory = shared_memory.SharedMemory(create=True, size=self.rows * self.cols)
+        halo_memory = shared_memory.SharedMemory(create=True, size=2 * self.workers * 2 * self.cols)
+        changes_memory = shared_memory.SharedMemory(create=True, size=2 * self.workers * 8)
+        processes = []
+        try:
+            barrier = multiprocessing.Barrier(self.workers, timeout=BARRIER_TIMEOUT)
+            processes = [
+                multiprocessing.Process(target=_run_strip, args=(
+                    index, self.strips(), self.cols, self.rules, self.boundary, grass_chance, random_field, passes,
+                    min_changes, barrier, cells_memory.name, halo_memory.name, changes_memory.name
+                ))
+                for index in range(0, self.workers)
+            ]
+            for process in processes:
+                process.start()
+            _join_strips(processes, barrier)
+
+            failed = [process.exitcode for process in processes if process.exitcode != 0]
+            if failed:
+                raise RuntimeError('Strip workers failed with exit codes {}'.format(failed))
+
+            return np.ndarray((self.rows, self.cols), dtype=np.uint8, buffer=cells_memory.buf).copy()
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+                    process.join()
+            for memory in (cells_memory, halo_memory, changes_memory):
+                memory.close()
+                memory.unlink()
+
+
+def _join_strips(processes: List[multiprocessing.Process], barrier: multiprocessing.Barrier) -> None:
+    # Wait for every worker to finish. Once one has failed the barrier is broken so the rest stop at their next
+    # exchange, and those still running after STOP_TIMEOUT are terminated
+    running = {process.sentinel: process for process in processes}
+    while running:
+        for sentinel in multiprocessing.connection.wait(list(running)):
+            process = running.pop(sentinel)
+            process.join()
+            if process.exitcode != 0:
+                barrier.abort()
+                deadline = time.monotonic() + STOP_TIMEOUT
+                for other in running.values():
+                    other.join(max(deadline - time.monotonic(), 0))
+                    if other.is_alive():
+                        other.terminate()
+                        other.join()
+                return
+
+
+def _run_strip(index: int, strips: List[Tuple[int, int]], cols: int, rules: Tuple[Rule, ...], boundary: str,
+               grass_chance: int, random_field: RandomField, passes: int, min_changes: int,
+               barrier: multiprocessing.Barrier, cells_name: str, halo_name: str, changes_name: str) -> None:
+    # Runs in a worker process, advancing one strip of the world and swapping halo rows with its neighbours
+    cells_memory = shared_memory.SharedMemory(name=cells_name)
+    halo_memory = shared_memory.SharedMemory(name=halo_name)
+    changes_memory = shared_memory.SharedMemory(name=changes_name)
+    try:
+        workers = len(strips)
+        top, bottom = strips[index]
+        rows = strips[-1][1]
+        halo_rows = np.ndarray((2, workers, 2, cols), dtype=np.uint8, buffer=halo_memory.buf)
+        change_counts = np.ndarray((2, workers), dtype=np.int64, buffer=changes_memory.buf)
+
+        strip = np.empty((bottom - top + 2, cols), dtype=np.uint8)
+        strip[1:-1] = grid.random_grid((bottom - top, cols), grass_chance, random_field, (top, 0))
+        _exchange_halo(strip, halo_rows[0], index, boundary, barrier)
+
+        automaton = CellularAutomaton(strip, rules, use_frontier=False, boundary=boundary,
+                                      random_field=random_field, origin=(top - 1, 0))
+        for i in range(0, passes):
+            automaton.step()
+            parity = automaton.passes % 2
+            if min_changes:
+                change_counts[parity, index] = np.count_nonzero(automaton.cells[1:-1] !=
+                                                                automaton.previous_cells[1:-1])
+            _exchange_halo(automaton.cells, halo_rows[parity], index, boundary, barrier)
+            if min_changes and change_counts[parity].sum() < min_changes:
+                break
+
+        cells = np.ndarray((rows, cols), dtype=np.uint8, buffer=cells_memory.buf)
+        cells[top:bottom] = automaton.cells[1:-1]
+        del cells, halo_rows, change_counts
+    except BaseException:
+        # Let the other workers go rather than leave them waiting for this one at the barrier
+        barrier.abort()
+        raise
+    finally:
+        for memory in (cells_memory, halo_memory, changes_memory):
+            memory.close()
+
+
+def _exchange_halo(strip: np.ndarray, halo_rows: np.ndarray, index: int, boundary: str,
+                   barrier: multiprocessing.Barrier) -> None:
+    # Publish the strip's edge rows, wait for every other strip to do the same, then fill in the halo rows from the
+    # neighbouring strips, or from the world's boundary at its top and bottom edges
+    workers = halo_rows.shape[0]
+    halo_rows[index, 0] = strip[1]
+    halo_rows[index, 1] = strip[-2]
+    barrier.wait()
+
+    for halo, neighbour, edge, at_edge in ((0, index - 1, 1, index == 0), (-1, index + 1, 0, index == workers - 1)):
+        if not at_edge or boundary == 'wrap':
+            strip[halo] = halo_rows[neighbour % workers, edge]
+        elif boundary == 'clamp':
+            strip[halo] = strip[1 if halo == 0 else -2]
+        else:
+            strip[halo] = WATER
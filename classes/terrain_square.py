@@ -1,45 +1,63 @@
-from __future__ import annotations
-
 from typing import Tuple, Union
 
 import pygame
 from pygame.surface import Surface, SurfaceType
 
+from terrain_types import TERRAIN_TYPES, TerrainType
+
 
 class TerrainSquare:
     """
     A square of pixels that represents an area of terrain on the map.
 
+    Squares only hold their position, size and terrain type code, with the rest of the terrain type's details shared
+    in the terrain_types palette registry and the vertices worked out when needed, so that maps of hundreds of
+    thousands of squares stay small.
+
     Attributes:
-        terrain_type:   A text description of the type of terrain the square represents and it's RGB colour value
+        x:              The x position of the top left vertex
+        y:              The y position of the top left vertex
+        size:           The width and height of the square in pixels
+        type_id:        The type code of the terrain the square represents, see terrain_types
+        terrain_type:   The palette registry entry of the terrain the square represents
         top_left:       The x and y position of the top left vertex
         top_right:      The x and y position of the top right vertex
         bottom_left:    The x and y position of the bottom left vertex
         bottom_right:   The x and y position of the bottom right vertex
-        neighbours:     A list of all the squares that neighbour this square
 
     Methods:
         draw_square:    Draws the terrain square to a given display surface
-        add_neighbour:  Adds a terrain square to the list of this square's neighbours
     """
 
-    def __init__(self, x_pos: int, y_pos: int, terrain_type: Tuple[str, Tuple[int, int, int]], size: int):
-        self.terrain_type = terrain_type
+    __slots__ = ('x', 'y', 'size', 'type_id')
 
-        # Vertices information
-        self.top_left = (x_pos, y_pos)
-        self.top_right = (x_pos + size, y_pos)
-        self.bottom_left = (x_pos, y_pos + size)
-        self.bottom_right = (x_pos + size, y_pos + size)
+    def __init__(self, x_pos: int, y_pos: int, type_id: int, size: int):
+        self.x = x_pos
+        self.y = y_pos
+        self.size = size
+        self.type_id = type_id
 
-        self.neighbours = []
+    @property
+    def terrain_type(self) -> TerrainType:
+        return TERRAIN_TYPES[self.type_id]
 
-    def draw_square(self, display_surface: Union[Surface, SurfaceType]) -> None:
-        pygame.draw.polygon(display_surface, self.terrain_type[1], (self.top_left, self.top_right,
-                            self.bottom_right, self.bottom_left), 0)
+    @property
+    def top_left(self) -> Tuple[int, int]:
+        return self.x, self.y
 
-        pygame.draw.polygon(display_surface, (0, 0, 0), (self.top_left, self.top_right,
-                                                         self.bottom_right, self.bottom_left), 1)
+    @property
+    def top_right(self) -> Tuple[int, int]:
+        return self.x + self.size, self.y
 
-    def add_neighbour(self, neighbour_square: TerrainSquare) -> None:
-        self.neighbours.append(neighbour_square)
+    @property
+    def bottom_left(self) -> Tuple[int, int]:
+        return self.x, self.y + self.size
+
+    @property
+    def bottom_right(self) -> Tuple[int, int]:
+        return self.x + self.size, self.y + self.size
+
+    def draw_square(self, display_surface: Union[Surface, SurfaceType]) -> None:
+        rect = (self.x, self.y, self.size + 1, self.size + 1)
+        pygame.draw.rect(display_surface, TERRAIN_TYPES[self.type_id].colour, rect, 0)
+        pygame.draw.rect(display_surface, (0, 0, 0), rect, 1)
@@ -0,0 +1,190 @@
+import asyncio
+import json
+import multiprocessing
+import re
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Tuple
+
+import tiles
+
+# Default limit on the memory used by cached tiles in bytes
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# A tile request path, /{seed}/{z}/{x}/{y}.{format}, tiles can be anywhere in the unbounded world so x and y can be
+# negative
+TILE_PATH = re.compile(r'^/(\d+)/(-?\d+)/(-?\d+)/(-?\d+)\.(\w+)$')
+
+CONTENT_TYPES = {'png': 'image/png', 'npy': 'application/octet-stream', 'json': 'application/json'}
+
+# Longest request line or header line read before the request is rejected
+MAX_LINE_BYTES = 8192
+
+
+class TileService:
+    """
+    Serves tiles of unbounded worlds over HTTP with asyncio, generating and rendering each tile on demand in a pool
+    of worker processes so the event loop is never blocked by generation.
+
+    Finished tiles are kept in a least recently used cache limited by the memory they take up. Requests for a tile
+    that's already being made wait for that one rather than starting another, so a burst of requests for the same
+    tile only generates it once. The pool has a fixed number of workers, so however many requests arrive only that
+    many tiles are generated at once.
+
+    Attributes:
+        land_chance:  The chance that a given cell should start as grass, shared by every world served
+        workers:      The number of worker processes tiles are made in
+        max_bytes:    The limit on the memory used by cached tiles
+        hits:         The number of requests answered from the cache
+        coalesced:    The number of requests that waited for a tile another request was already making
+        misses:       The number of tiles made
+
+    Methods:
+        get_tile:  Get a tile, from the cache or by making it
+        handle:    Answer one HTTP request on a connection
+        serve:     Start serving HTTP requests
+        stats:     Get the cache counters
+        close:     Shut down the worker pool
+    """
+
+    def __init__(self, land_chance: int, workers: int = 1, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.land_chance = land_chance
+        self.workers = workers
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+        self._in_flight: Dict[tuple, asyncio.Future] = {}
+        # Workers are started as the first requests arrive, so they're spawned rather than forked, as a forked worker
+        # would inherit the sockets of open connections and keep them open after they're closed here
+        self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+    async def get_tile(self, seed: int, z: int, x: int, y: int, tile_format: str) -> bytes:
+        """
+        Get the encoded bytes of a tile, from the cache, by waiting for a request already making it, or by making it
+        in the worker pool.
+
+        :param seed:         The seed of the world
+        :param z:            The zoom level
+        :param x:            The column of the tile
+        :param y:            The row of the tile
+        :param tile_format:  One of tiles.TILE_FORMATS
+
+        :return: The encoded tile
+        """
+        key = (seed, z, x, y, tile_format)
+        tile = self._cache.get(key)
+        if tile is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return tile
+
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().run_in_executor(self._executor, tiles.render_tile, seed,
+                                                            self.land_chance, z, x, y, tile_format)
+        self._in_flight[key] = future
+        try:
+            tile = await asyncio.shield(future)
+        finally:
+            del self._in_flight[key]
+
+        self._remember(key, tile)
+        return tile
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Read one HTTP request from a connection, answer it and close the connection.
+
+        :param reader:  The stream the request is read from
+        :param writer:  The stream the response is written to
+        """
+        try:
+            request_line = await reader.readuntil(b'\r\n')
+            while await reader.readuntil(b'\r\n') != b'\r\n':
+                pass
+
+            status, content_type, body = await self._respond(request_line.decode('latin-1').split())
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            writer.close()
+            return
+
+        writer.write('HTTP/1.1 {}\r\nContent-Type: {}\r\nContent-Length: {}\r\nConnection: close\r\n\r\n'.format(
+            status, content_type, len(body)).encode('latin-1'))
+        writer.write(body)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+    async def _respond(self, request: list) -> Tuple[str, str, bytes]:
+        # Work out the status, content type and body of the response to a request line
+        if len(request) != 3:
+            return '400 Bad Request', 'text/plain', b'Bad request'
+        method, path, version = request
+        if method != 'GET':
+            return '405 Method Not Allowed', 'text/plain', b'Only GET is supported'
+
+        if path == '/stats':
+            return '200 OK', CONTENT_TYPES['json'], json.dumps(self.stats()).encode('utf-8')
+
+        match = TILE_PATH.match(path)
+        if match is None or match.group(5) not in tiles.TILE_FORMATS:
+            return '404 Not Found', 'text/plain', b'Not found'
+
+        seed, z, x, y = (int(value) for value in match.groups()[:4])
+        tile_format = match.group(5)
+        if not tiles.MIN_ZOOM <= z <= tiles.MAX_ZOOM:
+            return '404 Not Found', 'text/plain', 'Zoom must be from {} to {}'.format(
+                tiles.MIN_ZOOM, tiles.MAX_ZOOM).encode('utf-8')
+
+        try:
+            tile = await self.get_tile(seed, z, x, y, tile_format)
+        except Exception as error:
+            return '500 Internal Server Error', 'text/plain', 'Failed to make tile: {}'.format(error).encode('utf-8')
+        return '200 OK', CONTENT_TYPES[tile_format], tile
+
+    async def serve(self, host: str, port: int) -> asyncio.AbstractServer:
+        """
+        Start serving HTTP requests.
+
+        :param host:  The address to listen on
+        :param port:  The port to listen on
+
+        :return: The running server
+        """
+        return await asyncio.start_server(self.handle, host, port, limit=MAX_LINE_BYTES)
+
+    def stats(self) -> dict:
+        """
+        Get the cache counters.
+
+        :return: The number of hits, coalesced requests and misses, and the number and size of cached tiles
+        """
+        return {'hits': self.hits, 'coalesced': self.coalesced, 'misses': self.misses, 'tiles': len(self._cache),
+                'cached_bytes': self._cached_bytes}
+
+    def close(self) -> None:
+        """
+        Shut down the worker pool, waiting for any tiles being made.
+        """
+        self._executor.shutdown()
+
+    def _remember(self, key: tuple, tile: bytes) -> None:
+        if key in self._cache:
+            return
+        self._cache[key] = tile
+        self._cached_bytes += len(tile)
+
+        # Evict the least recently used tiles, always keeping the one just made
+        while self._cached_bytes > self.max_bytes and len(self._cache) > 1:
+            evicted_key, evicted = self._cache.popitem(last=False)
+            self._cached_bytes -= len(evicted)
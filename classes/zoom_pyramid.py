@@ -0,0 +1,104 @@
+import math
+from collections import OrderedDict
+from typing import Tuple, Union
+
+import pygame
+from pygame.surface import Surface, SurfaceType
+
+# Default limit on the memory used by cached zoom levels, in bytes
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class ZoomPyramid:
+    """
+    The terrain surface scaled to each zoom level the view can step through, each level being scaled once and then
+    cached so repeated zooming is just a lookup.
+
+    Level 0 is the terrain surface itself, negative levels are zoomed out and positive levels are zoomed in. Each
+    level differs in size from the last by the same step the zoom keys always used. Levels are scaled on first use
+    and kept in a least recently used cache, limited by the memory the cached surfaces take up.
+
+    Attributes:
+        base:       The terrain surface at level 0
+        step:       The width and height in pixels that each level grows by
+        min_level:  The most zoomed out level
+        max_level:  The most zoomed in level
+        max_bytes:  The limit on the memory used by cached levels
+
+    Methods:
+        size:       Get the size of the surface at a level
+        get:        Get the surface at a level, scaling it if it isn't cached
+        build_all:  Scale and cache every level up front
+    """
+
+    def __init__(self, base: Union[Surface, SurfaceType], screen_width: int, screen_height: int, square_size: int,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.base = base
+        self.step = (square_size * math.ceil(screen_width / 20), square_size * math.ceil(screen_height / 20))
+        self.max_bytes = max_bytes
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+
+        # Zooming out stops once the surface is no more than a fifth of its full size wider than the screen, and
+        # zooming in stops once it's at least three screens wide
+        self.min_level = 0
+        while self.size(self.min_level)[0] > screen_width + math.ceil(base.get_width() / 5):
+            self.min_level -= 1
+        self.max_level = 0
+        while self.size(self.max_level)[0] < screen_width * 3:
+            self.max_level += 1
+
+    def size(self, level: int) -> Tuple[int, int]:
+        """
+        Get the size of the surface at a zoom level.
+
+        :param level:  The zoom level
+
+        :return: The width and height of the surface in pixels
+        """
+        return self.base.get_width() + level * self.step[0], self.base.get_height() + level * self.step[1]
+
+    def get(self, level: int) -> Union[Surface, SurfaceType]:
+        """
+        Get the terrain surface scaled to a zoom level, scaling and caching it if it isn't already cached.
+
+        :param level:  The zoom level, between min_level and max_level
+
+        :return: The scaled terrain surface
+        """
+        if level == 0:
+            return self.base
+
+        surface = self._cache.get(level)
+        if surface is not None:
+            self._cache.move_to_end(level)
+            return surface
+
+        surface = pygame.transform.smoothscale(self.base, self.size(level))
+        self._cache[level] = surface
+        self._cached_bytes += surface_bytes(surface)
+
+        # Evict the least recently used levels, always keeping the one just made
+        while self._cached_bytes > self.max_bytes and len(self._cache) > 1:
+            evicted_level, evicted = self._cache.popitem(last=False)
+            self._cached_bytes -= surface_bytes(evicted)
+
+        return surface
+
+    def build_all(self) -> None:
+        """
+        Scale and cache every zoom level up front, as far as the memory limit allows.
+        """
+        for level in range(self.min_level, self.max_level + 1):
+            self.get(level)
+
+
+def surface_bytes(surface: Union[Surface, SurfaceType]) -> int:
+    """
+    Get the memory taken up by a surface's pixels.
+
+    :param surface:  The surface
+
+    :return: The size of the surface's pixels in bytes
+    """
+    return surface.get_pitch() * surface.get_height()
@@ -1,23 +1,28 @@
-from random import randint
-from typing import List, Union
+from typing import List, Optional, Union
 
+import numpy as np
 from pygame.surface import Surface, SurfaceType
 
 from helper import get_2d_list
 from classes.terrain_square import TerrainSquare
+from random_field import RandomField
+from terrain_types import WATER, GRASS
 
 
 def generate_squares(screen_width: int, screen_height: int, square_size: int,
-                     display_surface: Union[Surface, SurfaceType], grass_chance: int) -> List[List[TerrainSquare]]:
+                     display_surface: Union[Surface, SurfaceType], grass_chance: int,
+                     random_field: Optional[RandomField] = None) -> List[List[TerrainSquare]]:
     """
     This function creates list of terrain squares which have been assigned a value of grass,
-    or water randomly based on a given chance threshold.
+    or water randomly based on a given chance threshold. Squares don't keep track of their neighbours, those are
+    looked up from their position in the list with the neighbourhood module.
 
     :param screen_width:     Width of screen surface as a number of pixels
     :param screen_height:    Height of screen surface as a number of pixels
     :param square_size:      Size of an individual terrain square as a number of pixels
     :param display_surface:  The display surface to draw onto
     :param grass_chance:     The chance that a given terrain square should represent grass
+    :param random_field:     The random field to draw from, a freshly seeded one is used if not given
 
     :return: The finished list of random terrain squares.
     """
@@ -25,71 +30,35 @@ def generate_squares(screen_width: int, screen_height: int, square_size: int,
     start_x = 0
     start_y = 0
 
-    x = start_x
+    squares_list = get_2d_list(screen_width, screen_height, square_size)
+
+    # Every square in a column shares the one x position object, and every square in a row the one y position, rather
+    # than each square holding its own copies
+    x_positions = [start_x + j * square_size for j in range(0, len(squares_list[0]))]
     y = start_y
 
-    squares_list = get_2d_list(screen_width, screen_height, square_size)
+    # Draw a number from 0 to 100 for every square at once, pass 0 of the random field like grid.random_grid
+    if random_field is None:
+        random_field = RandomField()
+    shape = (len(squares_list), len(squares_list[0]))
+    rand_types = (random_field.block(0, 0, 0, 0, shape) * np.float64(101)).astype(np.uint8).tolist()
 
     # Loop over the list of squares and randomly assign each square to be either grass or water and draw each square
     # to the display surface
     for i in range(0, len(squares_list)):
         for j in range(0, len(squares_list[i])):
 
-            rand_type = randint(0, 100)
-            if rand_type >= grass_chance:
-                terrain_type = ('Grass', (0, 255, 0))
+            if rand_types[i][j] >= grass_chance:
+                type_id = GRASS
             else:
-                terrain_type = ('Water', (0, 0, 255))
+                type_id = WATER
 
-            new_square = TerrainSquare(x, y, terrain_type, square_size)
+            new_square = TerrainSquare(x_positions[j], y, type_id, square_size)
 
             new_square.draw_square(display_surface)
             squares_list[i][j] = new_square
 
-            x += square_size
-
-        x = start_x
         y += square_size
 
-    # Loop over the list of squares again and tell each terrain square who it's neighbours are
-    # (vital for performing the cellular automata functions on the squares)
-    for i in range(0, len(squares_list)):
-        for j in range(0, len(squares_list[i])):
-            if i != 0:
-                try:
-                    squares_list[i][j].add_neighbour(squares_list[i - 1][j - 1])
-                except IndexError:
-                    continue
-                try:
-                    squares_list[i][j].add_neighbour(squares_list[i - 1][j])
-                except IndexError:
-                    continue
-                try:
-                    squares_list[i][j].add_neighbour(squares_list[i - 1][j + 1])
-                except IndexError:
-                    continue
-            try:
-                squares_list[i][j].add_neighbour(squares_list[i][j - 1])
-            except IndexError:
-                continue
-            try:
-                squares_list[i][j].add_neighbour(squares_list[i][j + 1])
-            except IndexError:
-                continue
-
-            if i != (len(squares_list) - 1):
-                try:
-                    squares_list[i][j].add_neighbour(squares_list[i + 1][j - 1])
-                except IndexError:
-                    continue
-                try:
-                    squares_list[i][j].add_neighbour(squares_list[i + 1][j])
-                except IndexError:
-                    continue
-                try:
-                    squares_list[i][j].add_neighbour(squares_list[i + 1][j + 1])
-                except IndexError:
-                    continue
-
     return squares_list
 
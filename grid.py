@@ -0,0 +1,220 @@
+import random
+from typing import Callable, Iterable, Iterator, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from classes.bitplane_automaton import BitplaneAutomaton
+from classes.cellular_automaton import CellularAutomaton, PassSnapshot
+from helper import get_grid_shape
+from neighbourhood import DEFAULT_BOUNDARY
+from random_field import RandomField
+from rules import DEFAULT_RULES, Rule
+from terrain_types import WATER, GRASS
+
+# Number of cellular automata passes run over a freshly generated grid
+TRANSFORM_PASSES = 7
+
+# Stop the passes early once a pass changes fewer than this many cells, 0 always runs every pass
+MIN_CHANGES = 0
+
+# Multiples of the square size each level of a progressively generated map is made at, from the coarsest, and the
+# number of passes run over each level after the first to smooth out the upsampled map
+PROGRESSIVE_FACTORS = (8, 4, 2, 1)
+REFINE_PASSES = 3
+
+# The fraction of cells of each upsampled level that are drawn again before its passes, giving detail finer than
+# the level before, and the stream of the random field the draws are taken from
+REFINE_NOISE = 0.15
+REFINE_STREAM = 8
+
+# Engines the passes can run on, a grid of one byte terrain type codes or bit-packed planes of them (see
+# BitplaneAutomaton), both giving exactly the same result
+ENGINES = ('grid', 'bitplanes')
+DEFAULT_ENGINE = 'grid'
+
+
+def new_seed() -> int:
+    """
+    Pick a new random seed to generate a map from.
+
+    :return: The seed
+    """
+    return random.randrange(2 ** 63)
+
+
+def generate_grid(screen_width: int, screen_height: int, square_size: int, grass_chance: int,
+                  random_field: Optional[RandomField] = None) -> np.ndarray:
+    """
+    This function creates a grid of terrain type codes which have been assigned a value of grass,
+    or water randomly based on a given chance threshold.
+
+    :param screen_width:   Width of screen surface as a number of pixels
+    :param screen_height:  Height of screen surface as a number of pixels
+    :param square_size:    Size of an individual terrain square as a number of pixels
+    :param grass_chance:   The chance that a given terrain square should represent grass
+    :param random_field:   The random field to draw from, a freshly seeded one is used if not given
+
+    :return: The finished grid of random terrain type codes
+    """
+    return random_grid(get_grid_shape(screen_width, screen_height, square_size), grass_chance, random_field)
+
+
+def random_grid(shape: Tuple[int, int], grass_chance: int, random_field: Optional[RandomField] = None,
+                origin: Tuple[int, int] = (0, 0)) -> np.ndarray:
+    """
+    Create a grid of the given shape where each cell is randomly grass or water based on a given chance threshold.
+    The draws are pass 0 of the random field, so part of a larger grid can be made on its own and match.
+
+    :param shape:         The number of rows and columns of the grid
+    :param grass_chance:  The chance that a given cell should represent grass
+    :param random_field:  The random field to draw from, a freshly seeded one is used if not given
+    :param origin:        The row and column in the random field of the grid's top left cell
+
+    :return: The grid of random terrain type codes
+    """
+    if random_field is None:
+        random_field = RandomField()
+
+    # A number from 0 to 100 for each cell, like randint(0, 100)
+    rand_type = (random_field.block(0, 0, origin[0], origin[1], shape) * np.float64(101)).astype(np.uint8)
+    return np.where(rand_type >= grass_chance, GRASS, WATER).astype(np.uint8)
+
+
+def make_automaton(terrain_grid: np.ndarray, rules: Sequence[Rule] = DEFAULT_RULES,
+                   boundary: str = DEFAULT_BOUNDARY, random_field: Optional[RandomField] = None,
+                   origin: Tuple[int, int] = (0, 0),
+                   engine: str = DEFAULT_ENGINE) -> Union[CellularAutomaton, BitplaneAutomaton]:
+    """
+    Create the automaton that runs the passes over a grid on the given engine.
+
+    :param terrain_grid:  The starting grid of terrain type codes
+    :param rules:         The rule table to follow
+    :param boundary:      How cells on the edge of the grid see past it, one of neighbourhood.BOUNDARY_MODES
+    :param random_field:  The random field to draw from, a freshly seeded one is used if not given
+    :param origin:        The row and column in the random field of the grid's top left cell
+    :param engine:        One of ENGINES
+
+    :return: The automaton
+
+    :raises ValueError: If the engine isn't known
+    """
+    if engine == 'bitplanes':
+        return BitplaneAutomaton(terrain_grid, rules, boundary, random_field, origin)
+    if engine == 'grid':
+        return CellularAutomaton(terrain_grid, rules, boundary=boundary, random_field=random_field, origin=origin)
+    raise ValueError('Unknown engine {!r}, expected one of {}'.format(engine, ', '.join(ENGINES)))
+
+
+def transform_grid(grid: np.ndarray, random_field: Optional[RandomField] = None,
+                   rules: Sequence[Rule] = DEFAULT_RULES, boundary: str = DEFAULT_BOUNDARY, pass_index: int = 1,
+                   origin: Tuple[int, int] = (0, 0)) -> np.ndarray:
+    """
+    This function acts as the cellular automata algorithm; it takes the grid of terrain type codes and transforms
+    every cell at once according to the state of it's neighbours. With successive iterations this smooths out the
+    terrain into more well defined areas. To run several passes over the same grid use a CellularAutomaton, which
+    reuses its buffers between passes.
+
+    :param grid:          The starting grid of terrain type codes
+    :param random_field:  The random field to draw from, a freshly seeded one is used if not given
+    :param rules:         The rule table to follow
+    :param boundary:      How cells on the edge of the grid see past it, one of neighbourhood.BOUNDARY_MODES
+    :param pass_index:    The number of the pass, which picks the random field's draws
+    :param origin:        The row and column in the random field of the grid's top left cell
+
+    :return: The transformed grid of terrain type codes
+    """
+    automaton = CellularAutomaton(grid, rules, boundary=boundary, random_field=random_field, origin=origin)
+    automaton.passes = pass_index - 1
+    automaton.step()
+
+    return automaton.cells
+
+
+def generate_terrain(screen_width: int, screen_height: int, square_size: int, grass_chance: int,
+                     passes: int = TRANSFORM_PASSES, random_field: Optional[RandomField] = None,
+                     rules: Sequence[Rule] = DEFAULT_RULES, min_changes: int = MIN_CHANGES,
+                     boundary: str = DEFAULT_BOUNDARY,
+                     observers: Iterable[Callable[[PassSnapshot], None]] = (),
+                     engine: str = DEFAULT_ENGINE) -> np.ndarray:
+    """
+    Generate a random grid of terrain and run the given number of cellular automata passes over it, stopping early
+    once the terrain has settled enough that a pass changes fewer than min_changes cells.
+
+    :param screen_width:   Width of screen surface as a number of pixels
+    :param screen_height:  Height of screen surface as a number of pixels
+    :param square_size:    Size of an individual terrain square as a number of pixels
+    :param grass_chance:   The chance that a given terrain square should start as grass
+    :param passes:         The number of cellular automata passes to run
+    :param random_field:   The random field to draw from, a freshly seeded one is used if not given
+    :param rules:          The rule table to follow
+    :param min_changes:    Stop once a pass changes fewer than this many cells
+    :param boundary:       How cells on the edge of the grid see past it, one of neighbourhood.BOUNDARY_MODES
+    :param observers:      Called with a snapshot of the grid after each pass, see CellularAutomaton.subscribe
+    :param engine:         The engine to run the passes on, one of ENGINES
+
+    :return: The finished grid of terrain type codes
+    """
+    if random_field is None:
+        random_field = RandomField()
+
+    terrain_grid = generate_grid(screen_width, screen_height, square_size, grass_chance, random_field)
+    automaton = make_automaton(terrain_grid, rules, boundary, random_field, engine=engine)
+    for observer in observers:
+        automaton.subscribe(observer)
+    automaton.run(passes, min_changes)
+
+    return automaton.cells
+
+
+def generate_progressive(screen_width: int, screen_height: int, square_size: int, grass_chance: int,
+                         random_field: Optional[RandomField] = None,
+                         factors: Sequence[int] = PROGRESSIVE_FACTORS, passes: int = TRANSFORM_PASSES,
+                         refine_passes: int = REFINE_PASSES,
+                         rules: Sequence[Rule] = DEFAULT_RULES) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Generate a map coarse to fine, so something can be shown almost straight away. The first level is generated
+    with squares several times the size as usual, which is quick as it has far fewer cells. Each level after that
+    upsamples the one before it to smaller squares, draws a fraction of its cells again to add finer detail, and
+    runs a few passes to smooth it out. Each level is yielded as it's finished, the last being at the square size
+    asked for.
+
+    The finished map isn't the same as generate_terrain would make from the same seed, but is the same every time
+    for the same seed and factors. Passes are numbered on from one level to the next so no two levels share draws.
+
+    :param screen_width:   Width of screen surface as a number of pixels
+    :param screen_height:  Height of screen surface as a number of pixels
+    :param square_size:    Size of an individual terrain square of the finished map as a number of pixels
+    :param grass_chance:   The chance that a given terrain square should start as grass
+    :param random_field:   The random field to draw from, a freshly seeded one is used if not given
+    :param factors:        The multiple of the square size of each level, from the coarsest, each a multiple of the
+                           next and ending with 1
+    :param passes:         The number of cellular automata passes run over the first level
+    :param refine_passes:  The number of cellular automata passes run over each level after the first
+    :param rules:          The rule table to follow
+
+    :return: An iterator of the square size and grid of terrain type codes of each level, coarsest first
+    """
+    if random_field is None:
+        random_field = RandomField()
+
+    level_square_size = square_size * factors[0]
+    automaton = CellularAutomaton(generate_grid(screen_width, screen_height, level_square_size, grass_chance,
+                                                random_field), rules, random_field=random_field)
+    automaton.run(passes)
+    yield level_square_size, automaton.cells
+
+    for factor in factors[1:]:
+        scale = level_square_size // (square_size * factor)
+        level_square_size = square_size * factor
+        shape = get_grid_shape(screen_width, screen_height, level_square_size)
+
+        # Each square of the level before covers scale by scale squares of this one
+        terrain_grid = np.repeat(np.repeat(automaton.cells, scale, axis=0), scale, axis=1)[:shape[0], :shape[1]]
+        redrawn = random_field.block(automaton.passes, REFINE_STREAM, 0, 0, shape) < np.float32(REFINE_NOISE)
+        terrain_grid[redrawn] = random_grid(shape, grass_chance, random_field)[redrawn]
+
+        passes_so_far = automaton.passes
+        automaton = CellularAutomaton(terrain_grid, rules, random_field=random_field)
+        automaton.passes = passes_so_far
+        automaton.run(refine_passes)
+        yield level_square_size, automaton.cells
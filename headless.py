@@ -0,0 +1,386 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, List, Optional
+
+import numpy as np
+import pygame
+
+import biomes
+import grid
+import map_format
+import render
+from classes.chunked_world import ChunkedWorld
+from classes.map_index import build_index, index_path
+from classes.pass_observers import FrameWriter, PassLogger
+from classes.strip_world import StripWorld
+from helper import get_grid_shape
+from neighbourhood import BOUNDARY_MODES, DEFAULT_BOUNDARY
+from random_field import RandomField
+
+# Supported output formats, a rendered image of the map, the raw grid of terrain type codes as a numpy npy file, or
+# a terrain map file (see map_format)
+OUTPUT_FORMATS = ('png', 'npy', 'trn')
+
+# Supported generators, cellular automata over a random grid of grass and water, or biomes picked from elevation and
+# moisture fields (see biomes), where the passes only smooth the coastline
+GENERATORS = ('cells', 'biomes')
+
+
+def map_seed(seed: int, index: int) -> int:
+    """
+    Get the seed for a single map in a batch, derived from the batch seed and the map's index so that each map can
+    be reproduced on its own.
+
+    :param seed:   The seed for the whole batch of maps
+    :param index:  The index of the map within the batch
+
+    :return: The seed for the map
+    """
+    return int(np.random.SeedSequence([seed, index]).generate_state(1, np.uint64)[0] >> np.uint64(1))
+
+
+def generate_map(seed: int, index: int, screen_width: int, screen_height: int, square_size: int, land_chance: int,
+                 iterations: int, min_changes: int = grid.MIN_CHANGES, boundary: str = DEFAULT_BOUNDARY,
+                 frames_dir: Optional[str] = None, log_passes: bool = False, generator: str = 'cells',
+                 strip_workers: int = 1, engine: str = grid.DEFAULT_ENGINE) -> np.ndarray:
+    """
+    Generate a single finished map of a batch without touching the display, optionally writing out every pass as a
+    frame or logging how many cells each pass changed.
+
+    :param seed:           The seed for the whole batch of maps
+    :param index:          The index of the map within the batch
+    :param screen_width:   Width of screen surface as a number of pixels
+    :param screen_height:  Height of screen surface as a number of pixels
+    :param square_size:    Size of an individual terrain square as a number of pixels
+    :param land_chance:    The chance that a given terrain square should start as grass
+    :param iterations:     The number of cellular automata passes to run
+    :param min_changes:    Stop the passes early once a pass changes fewer than this many cells
+    :param boundary:       How cells on the edge of the map see past it, one of neighbourhood.BOUNDARY_MODES
+    :param frames_dir:     If given, each pass is written as a png frame to a directory for the map inside this one
+    :param log_passes:     Whether to print the number of cells changed by each pass
+    :param generator:      One of GENERATORS
+    :param strip_workers:  The number of worker processes to spread the map's passes over, each advancing a strip of
+                           it, not supported with frames_dir, log_passes or the biomes generator
+    :param engine:         The engine the cells generator runs its passes on, one of grid.ENGINES
+
+    :return: The finished grid of terrain type codes
+    """
+    if strip_workers > 1:
+        world = StripWorld(*get_grid_shape(screen_width, screen_height, square_size), strip_workers,
+                           boundary=boundary)
+        return world.generate_terrain(land_chance, RandomField(map_seed(seed, index)), iterations, min_changes)
+
+    map_name = 'map_{:05d}'.format(index)
+    observers = []
+    if frames_dir is not None:
+        observers.append(FrameWriter(os.path.join(frames_dir, map_name), square_size,
+                                     (screen_width * 2, screen_height * 2)))
+    if log_passes:
+        observers.append(PassLogger(label='{} '.format(map_name)))
+
+    if generator == 'biomes':
+        return biomes.generate_biomes(screen_width, screen_height, square_size, land_chance,
+                                      RandomField(map_seed(seed, index)), iterations, min_changes=min_changes,
+                                      boundary=boundary, observers=observers)
+
+    return grid.generate_terrain(screen_width, screen_height, square_size, land_chance, iterations,
+                                 RandomField(map_seed(seed, index)), min_changes=min_changes,
+                                 boundary=boundary, observers=observers, engine=engine)
+
+
+def save_map(terrain_grid: np.ndarray, path: str, output_format: str, screen_width: int, screen_height: int,
+             square_size: int, seed: int, land_chance: int, iterations: int) -> None:
+    """
+    Write a finished map to disk, either rendered to a png the same size as the in app terrain surface, as the raw
+    grid of terrain type codes in numpy's npy format, or as a terrain map file.
+
+    :param terrain_grid:   The grid of terrain type codes
+    :param path:           The file path to write to
+    :param output_format:  One of OUTPUT_FORMATS
+    :param screen_width:   Width of screen surface as a number of pixels
+    :param screen_height:  Height of screen surface as a number of pixels
+    :param square_size:    Size of an individual terrain square as a number of pixels
+    :param seed:           The seed the map was generated from
+    :param land_chance:    The chance that a given terrain square started as grass
+    :param iterations:     The number of cellular automata passes run over the map
+    """
+    if output_format == 'npy':
+        np.save(path, terrain_grid)
+    elif output_format == 'trn':
+        map_format.write_map(path, terrain_grid, seed, land_chance, iterations)
+    else:
+        terrain_surf = pygame.Surface((screen_width * 2, screen_height * 2), 0, 32)
+        render.render_grid(terrain_grid, square_size, terrain_surf)
+        pygame.image.save(terrain_surf, path)
+
+
+def map_path(output_dir: str, index: int, output_format: str) -> str:
+    """
+    Get the file path a map of a batch is written to.
+
+    :param output_dir:     The directory the batch is written to
+    :param index:          The index of the map within the batch
+    :param output_format:  One of OUTPUT_FORMATS
+
+    :return: The file path for the map
+    """
+    return os.path.join(output_dir, 'map_{:05d}.{}'.format(index, output_format))
+
+
+def generate_chunked_map(seed: int, index: int, path: str, output_format: str, screen_width: int, screen_height: int,
+                         square_size: int, land_chance: int, iterations: int, chunk_size: int) -> None:
+    """
+    Generate a single map of a batch a chunk at a time with bounded memory, and write it to disk as a raw npy grid
+    or a terrain map file.
+
+    :param seed:           The seed for the whole batch of maps
+    :param index:          The index of the map within the batch
+    :param path:           The file path to write to
+    :param output_format:  Either npy or trn
+    :param screen_width:   Width of screen surface as a number of pixels
+    :param screen_height:  Height of screen surface as a number of pixels
+    :param square_size:    Size of an individual terrain square as a number of pixels
+    :param land_chance:    The chance that a given terrain square should start as grass
+    :param iterations:     The number of cellular automata passes to run
+    :param chunk_size:     Number of rows and columns of cells in a chunk
+    """
+    rows, cols = get_grid_shape(screen_width, screen_height, square_size)
+    world_seed = map_seed(seed, index)
+
+    # The scratch directory is next to the output file so large intermediate files stay on the same disk, and is
+    # removed along with the world's files whether or not generating the map succeeds
+    with tempfile.TemporaryDirectory(prefix='terrain_', dir=os.path.dirname(os.path.abspath(path))) as directory:
+        world = ChunkedWorld(rows, cols, chunk_size, directory)
+        try:
+            world.generate(land_chance, world_seed)
+            for i in range(0, iterations):
+                world.transform(world_seed)
+
+            if output_format == 'trn':
+                map_format.write_map(path, world.cells, world_seed, land_chance, iterations)
+        finally:
+            world.close()
+
+        if output_format != 'trn':
+            os.replace(world.cells_path, path)
+
+
+def generate_job(seed: int, index: int, output_dir: str, output_format: str, screen_width: int, screen_height: int,
+                 square_size: int, land_chance: int, iterations: int, chunk_size: Optional[int] = None,
+                 min_changes: int = grid.MIN_CHANGES, boundary: str = DEFAULT_BOUNDARY,
+                 frames_dir: Optional[str] = None, log_passes: bool = False, generator: str = 'cells',
+                 strip_workers: int = 1, engine: str = grid.DEFAULT_ENGINE,
+                 write_index: bool = False) -> str:
+    """
+    Generate a single map of a batch and write it to disk, run inside a worker process for parallel batches so that
+    only the file path has to be sent back.
+
+    :param seed:           The seed for the whole batch of maps
+    :param index:          The index of the map within the batch
+    :param output_dir:     The directory the batch is written to
+    :param output_format:  One of OUTPUT_FORMATS
+    :param screen_width:   Width of screen surface as a number of pixels
+    :param screen_height:  Height of screen surface as a number of pixels
+    :param square_size:    Size of an individual terrain square as a number of pixels
+    :param land_chance:    The chance that a given terrain square should start as grass
+    :param iterations:     The number of cellular automata passes to run
+    :param chunk_size:     If given, generate the map a chunk of this many rows and columns at a time
+    :param min_changes:    Stop the passes early once a pass changes fewer than this many cells, not supported for
+                           chunked maps
+    :param boundary:       How cells on the edge of the map see past it, one of neighbourhood.BOUNDARY_MODES, chunked
+                           maps always have a water border
+    :param frames_dir:     If given, each pass is written as a png frame to a directory for the map inside this one,
+                           not supported for chunked maps
+    :param log_passes:     Whether to print the number of cells changed by each pass, not supported for chunked maps
+    :param generator:      One of GENERATORS, chunked maps are always made by the cells generator
+    :param strip_workers:  The number of worker processes to spread the map's passes over
+    :param engine:         The engine the cells generator runs its passes on, one of grid.ENGINES
+    :param write_index:    Whether to label the map's regions and index the nearest cell of each terrain type, saved
+                           beside the map, not supported for chunked maps
+
+    :return: The file path the map was written to
+    """
+    path = map_path(output_dir, index, output_format)
+    if chunk_size:
+        generate_chunked_map(seed, index, path, output_format, screen_width, screen_height, square_size, land_chance,
+                             iterations, chunk_size)
+        return path
+
+    terrain_grid = generate_map(seed, index, screen_width, screen_height, square_size, land_chance, iterations,
+                                min_changes, boundary, frames_dir, log_passes, generator, strip_workers, engine)
+    save_map(terrain_grid, path, output_format, screen_width, screen_height, square_size, map_seed(seed, index),
+             land_chance, iterations)
+    if write_index:
+        build_index(terrain_grid).save(index_path(path))
+
+    return path
+
+
+def run_batch(seed: int, count: int, output_dir: str, output_format: str, screen_width: int, screen_height: int,
+              square_size: int, land_chance: int, iterations: int, workers: int = 1,
+              chunk_size: Optional[int] = None, report: Callable[[str], None] = print,
+              min_changes: int = grid.MIN_CHANGES, boundary: str = DEFAULT_BOUNDARY,
+              frames_dir: Optional[str] = None, log_passes: bool = False, generator: str = 'cells',
+              strip_workers: int = 1, engine: str = grid.DEFAULT_ENGINE, write_index: bool = False) -> None:
+    """
+    Generate a batch of maps, spreading them over a pool of worker processes if more than one worker is asked for.
+    Every map is seeded from the batch seed and its own index, so the output is identical however many workers
+    are used. Each map is reported as soon as it's finished, along with the throughput so far.
+
+    :param seed:           The seed for the whole batch of maps
+    :param count:          The number of maps to generate
+    :param output_dir:     The directory the batch is written to
+    :param output_format:  One of OUTPUT_FORMATS
+    :param screen_width:   Width of screen surface as a number of pixels
+    :param screen_height:  Height of screen surface as a number of pixels
+    :param square_size:    Size of an individual terrain square as a number of pixels
+    :param land_chance:    The chance that a given terrain square should start as grass
+    :param iterations:     The number of cellular automata passes to run
+    :param workers:        The number of worker processes, 0 uses one per CPU core
+    :param chunk_size:     If given, generate each map a chunk of this many rows and columns at a time
+    :param report:         Called with a progress line after each map is finished
+    :param min_changes:    Stop the passes early once a pass changes fewer than this many cells
+    :param boundary:       How cells on the edge of the map see past it, one of neighbourhood.BOUNDARY_MODES
+    :param frames_dir:     If given, each pass of each map is written as a png frame to a directory for the map
+                           inside this one
+    :param log_passes:     Whether to print the number of cells changed by each pass of each map
+    :param generator:      One of GENERATORS
+    :param strip_workers:  The number of worker processes to spread each map's passes over, only when the batch
+                           itself runs in a single worker
+    :param engine:         The engine the cells generator runs its passes on, one of grid.ENGINES
+    :param write_index:    Whether to write an index of the regions and nearest terrain of each map beside it
+    """
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    # No more workers are started than there are maps to make
+    workers = max(min(workers, count), 1)
+
+    job_args = (output_dir, output_format, screen_width, screen_height, square_size, land_chance, iterations,
+                chunk_size, min_changes, boundary, frames_dir, log_passes, generator, strip_workers, engine,
+                write_index)
+    start = time.perf_counter()
+
+    def report_progress(done: int, path: str) -> None:
+        rate = done / max(time.perf_counter() - start, 1e-9)
+        report('[{}/{}] {} ({:.1f} maps/s)'.format(done, count, path, rate))
+
+    if workers == 1:
+        for index in range(0, count):
+            report_progress(index + 1, generate_job(seed, index, *job_args))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(generate_job, seed, index, *job_args) for index in range(0, count)]
+        for done, future in enumerate(as_completed(futures), 1):
+            report_progress(done, future.result())
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Parse the command line arguments for a headless batch run.
+
+    :param argv:  The arguments to parse, sys.argv is used if not given
+
+    :return: The parsed arguments
+    """
+    parser = argparse.ArgumentParser(description='Generate terrain maps to disk without opening a display window.')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed for the batch, a non-negative integer. A random one is picked and printed if not '
+                             'given')
+    parser.add_argument('--width', type=int, default=1600, help='Width of the display window the map is sized for')
+    parser.add_argument('--height', type=int, default=800, help='Height of the display window the map is sized for')
+    parser.add_argument('--square-size', type=int, default=12, help='Size of a terrain square in pixels')
+    parser.add_argument('--land-chance', type=int, default=50,
+                        help='The chance that a terrain square will randomly start as a grass square')
+    parser.add_argument('--iterations', type=int, default=grid.TRANSFORM_PASSES,
+                        help='Number of cellular automata passes to run')
+    parser.add_argument('--min-changes', type=int, default=grid.MIN_CHANGES,
+                        help='Stop the passes early once a pass changes fewer than this many cells')
+    parser.add_argument('--boundary', choices=BOUNDARY_MODES, default=DEFAULT_BOUNDARY,
+                        help='How cells on the edge of the map see past it: clamp repeats the edge cells, wrap joins '
+                             'opposite edges and water surrounds the map with water')
+    parser.add_argument('--generator', choices=GENERATORS, default='cells',
+                        help='Run cellular automata over a random grid, or pick biomes from elevation and moisture '
+                             'with the passes only smoothing the coastline')
+    parser.add_argument('--engine', choices=grid.ENGINES, default=grid.DEFAULT_ENGINE,
+                        help='Run the passes over a grid of one byte terrain type codes, or over bit-packed planes '
+                             'of them, which gives the same maps')
+    parser.add_argument('--count', type=int, default=1, help='Number of maps to generate')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='png', dest='output_format',
+                        help='Write rendered png images, raw npy arrays of terrain type codes or terrain map files')
+    parser.add_argument('--output-dir', default='.', help='Directory to write the maps to')
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help='Generate each map on disk a chunk of this many cells square at a time, for maps too '
+                             'large to fit in memory. Only supported with the npy and trn formats')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of worker processes to spread the batch over, 0 or not given uses one per CPU '
+                             'core, or just one with --strip-workers')
+    parser.add_argument('--strip-workers', type=int, default=1,
+                        help='Number of worker processes to spread each map over, each advancing a horizontal strip '
+                             'of it, 0 uses one per CPU core. For single maps too large for one core')
+    parser.add_argument('--frames-dir', default=None,
+                        help='Write every pass of each map as a png frame to a directory for the map inside this one')
+    parser.add_argument('--index', action='store_true', dest='write_index',
+                        help='Label the regions of each map and index the nearest cell of each terrain type to every '
+                             'cell, written beside the map. Not supported with --chunk-size')
+    parser.add_argument('--log-passes', action='store_true',
+                        help='Print the number of cells changed by each pass of each map')
+
+    args = parser.parse_args(argv)
+    # Each map's seed is derived from the batch seed by a numpy SeedSequence, which only takes non-negative entropy
+    if args.seed is not None and args.seed < 0:
+        parser.error('--seed must not be negative')
+    if args.chunk_size and args.output_format == 'png':
+        parser.error('--chunk-size is not supported with --format png')
+    if args.chunk_size and args.min_changes:
+        parser.error('--min-changes is not supported with --chunk-size')
+    if args.chunk_size and args.boundary != 'water':
+        parser.error('--boundary {} is not supported with --chunk-size'.format(args.boundary))
+    if args.chunk_size and (args.frames_dir or args.log_passes):
+        parser.error('--frames-dir and --log-passes are not supported with --chunk-size')
+    if args.chunk_size and args.write_index:
+        parser.error('--index is not supported with --chunk-size')
+    if args.chunk_size and args.generator != 'cells':
+        parser.error('--generator {} is not supported with --chunk-size'.format(args.generator))
+    if args.strip_workers != 1 and (args.chunk_size or args.workers not in (None, 1) or args.generator != 'cells' or
+                                    args.frames_dir or args.log_passes):
+        parser.error('--strip-workers is not supported with --chunk-size, --workers, --generator biomes, '
+                     '--frames-dir or --log-passes')
+    if args.engine != grid.DEFAULT_ENGINE and (args.chunk_size or args.strip_workers != 1 or
+                                               args.generator != 'cells'):
+        parser.error('--engine {} is not supported with --chunk-size, --strip-workers or --generator biomes'.format(
+            args.engine))
+
+    # Strip workers already spread each map over the cores, so the batch itself is run in one process
+    if args.workers is None:
+        args.workers = 1 if args.strip_workers != 1 else 0
+
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Generate a batch of maps and write each one to disk as soon as it's finished.
+
+    :param argv:  The arguments to parse, sys.argv is used if not given
+    """
+    args = parse_args(argv)
+    if args.seed is None:
+        args.seed = random.randrange(2 ** 32)
+    print('Seed: {}'.format(args.seed))
+
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    run_batch(args.seed, args.count, args.output_dir, args.output_format, args.width, args.height, args.square_size,
+              args.land_chance, args.iterations, args.workers, args.chunk_size, min_changes=args.min_changes,
+              boundary=args.boundary, frames_dir=args.frames_dir, log_passes=args.log_passes,
+              generator=args.generator, strip_workers=args.strip_workers or os.cpu_count() or 1, engine=args.engine,
+              write_index=args.write_index)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,24 @@
 import math
 
-from typing import List, Any
+from typing import List, Any, Tuple
+
+
+def get_grid_shape(screen_width: int, screen_height: int, square_size: int) -> Tuple[int, int]:
+    """
+    Get the number of rows and columns of terrain squares needed to cover double the values of the screen width
+    and height.
+
+    :param screen_width:   Width of screen surface as a number of pixels
+    :param screen_height:  Height of screen surface as a number of pixels
+    :param square_size:    Size of an individual terrain square as a number of pixels
+
+    :return: The number of rows and columns as a (rows, columns) tuple
+    """
+
+    max_x = math.ceil(screen_width / square_size) * 2
+    max_y = (math.ceil(screen_height / square_size) + 20) * 2
+
+    return max_y, max_x
 
 
 def get_2d_list(screen_width: int, screen_height: int, square_size: int) -> List[List[Any]]:
@@ -16,10 +34,7 @@ def get_2d_list(screen_width: int, screen_height: int, square_size: int) -> List
     :return: The complete 2d list of zeros
     """
 
-    max_x = math.ceil(screen_width / square_size) * 2
-    max_y = (math.ceil(screen_height / square_size) + 20) * 2
+    max_y, max_x = get_grid_shape(screen_width, screen_height, square_size)
 
-    # Could use numpy.zeros((max_y, max_x), dtype=int).tolist() here instead, but I'm not sure if the speed
-    # difference justifies bringing in the numpy requirement?
     squares_list = [[0 for x in range(max_x)] for y in range(max_y)]
     return squares_list
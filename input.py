@@ -1,18 +1,25 @@
-import math
-from typing import Union
+import traceback
+from typing import Optional, Sequence, Union
 
 import pygame
 from pygame.locals import *
 from pygame.surface import Surface, SurfaceType
 
-import generate_squares
-import transform
+import grid
+import map_format
+import render
+from classes.cellular_automaton import CellularAutomaton
 from classes.key_input import KeyInput
+from classes.map_index import index_path
+from classes.pass_observers import DisplayObserver, PassLogger
+from classes.regen_worker import RegenWorker
+from classes.zoom_pyramid import ZoomPyramid
+from random_field import RandomField
 
 
 def compute_input_actions(screen_width: int, screen_height: int, square_size: int,
                           display_surface: Union[Surface, SurfaceType], terrain_surf: Union[Surface, SurfaceType],
-                          k_inp: KeyInput, debug: bool) -> Surface:
+                          k_inp: KeyInput, debug: bool, regen_worker: Optional[RegenWorker] = None) -> Surface:
     """
     This function evaluates any user input from key presses and carries out the related processes
 
@@ -23,29 +30,37 @@ def compute_input_actions(screen_width: int, screen_height: int, square_size: in
     :param terrain_surf:     The display surface containing the map information
     :param k_inp:            A KeyInput helper
     :param debug:            Debug variable for showing process steps
+    :param regen_worker:     If given, maps are regenerated in the background by this worker
 
     :return: The terrain surface with any changes made to it
     """
     # Get all pressed keys
     key = pygame.key.get_pressed()
 
+    if k_inp.world is not None:
+        compute_world_actions(key, display_surface, k_inp)
+        return terrain_surf
+
     # Regenerate the map
     if key[K_r]:
-        regen_map(screen_width, screen_height, square_size, terrain_surf, k_inp, debug)
+        regen_map(screen_width, screen_height, square_size, terrain_surf, k_inp, debug, regen_worker)
 
-    # Regenerate the map with a decreased land spawning chance
+    # Regenerate the map from the same seed with a decreased land spawning chance
     if key[K_UP]:
         k_inp.land_chance += 1
-        regen_map(screen_width, screen_height, square_size, terrain_surf, k_inp, debug)
+        regen_map(screen_width, screen_height, square_size, terrain_surf, k_inp, debug, regen_worker, k_inp.seed)
 
-    # Regenerate the map with an increased land spawning chance
+    # Regenerate the map from the same seed with an increased land spawning chance
     if key[K_DOWN]:
         k_inp.land_chance -= 1
-        regen_map(screen_width, screen_height, square_size, terrain_surf, k_inp, debug)
+        regen_map(screen_width, screen_height, square_size, terrain_surf, k_inp, debug, regen_worker, k_inp.seed)
 
-    # Save the map to an image
+    # Save the map to an image, and the terrain itself to a terrain map file with its index beside it, the index
+    # being built and saved in the background
     if key[K_s]:
         pygame.image.save(terrain_surf, 'map.png')
+        map_format.write_map('map.trn', k_inp.terrain_grid, k_inp.seed, k_inp.land_chance, grid.TRANSFORM_PASSES)
+        k_inp.index_saver.save(k_inp.terrain_grid, index_path('map.trn'))
 
     # Check if the user tried to drag the screen view around
     drag_screen(k_inp, display_surface)
@@ -61,10 +76,57 @@ def compute_input_actions(screen_width: int, screen_height: int, square_size: in
     return terrain_surf
 
 
+def compute_world_actions(key: Sequence[bool], display_surface: Union[Surface, SurfaceType], k_inp: KeyInput) -> None:
+    """
+    This function carries out the key press actions when exploring an unbounded world. There's no whole map to
+    save or zoom, so saving saves the view on screen and the zoom keys do nothing.
+
+    :param key:              The pressed state of every key
+    :param display_surface:  The display surface to draw onto
+    :param k_inp:            A KeyInput helper
+    """
+    # Start a new world
+    if key[K_r]:
+        regen_world(k_inp, grid.new_seed())
+
+    # Regenerate the world from the same seed with a decreased land spawning chance
+    if key[K_UP]:
+        k_inp.land_chance += 1
+        regen_world(k_inp, k_inp.seed)
+
+    # Regenerate the world from the same seed with an increased land spawning chance
+    if key[K_DOWN]:
+        k_inp.land_chance -= 1
+        regen_world(k_inp, k_inp.seed)
+
+    # Save the view on screen to an image
+    if key[K_s]:
+        pygame.image.save(display_surface, 'map.png')
+
+    drag_screen(k_inp, display_surface)
+
+
+def regen_world(k_inp: KeyInput, seed: int) -> None:
+    """
+    This function switches an unbounded world to a new seed or land chance, its chunks are then generated in the
+    background as they're shown.
+
+    :param k_inp:  A KeyInput helper
+    :param seed:   The seed of the new world
+    """
+    k_inp.seed = seed
+    k_inp.world.reset(seed, k_inp.land_chance)
+    k_inp.last_blit = None
+
+
 def regen_map(screen_width: int, screen_height: int, square_size: int, terrain_surf: Union[Surface, SurfaceType],
-              k_inp: KeyInput, debug: bool) -> None:
+              k_inp: KeyInput, debug: bool, regen_worker: Optional[RegenWorker] = None,
+              seed: Optional[int] = None, profile_path: Optional[str] = None) -> None:
     """
-    This function regenerates the terrain map with a new random seed
+    This function regenerates the terrain map, with a new random seed unless one is given. If a regen worker is
+    given, and the process steps aren't being shown, the map is generated in the background (or taken from the
+    worker's map cache) and swapped in by swap_in_regen once finished. Each stage of the regen is timed by the
+    KeyInput's profiler.
 
     :param screen_width:     Width of screen surface as a number of pixels
     :param screen_height:    Height of screen surface as a number of pixels
@@ -72,14 +134,91 @@ def regen_map(screen_width: int, screen_height: int, square_size: int, terrain_s
     :param terrain_surf:     The display surface containing the map information
     :param k_inp:            A KeyInput helper
     :param debug:            Debug variable for showing process steps
+    :param regen_worker:     If given, the worker to regenerate the map in the background
+    :param seed:             The seed to regenerate the map from, a new random one if not given
+    :param profile_path:     If given, the regen is run under cProfile and its stats written to this file path
     """
-    squares_list = generate_squares.generate_squares(screen_width, screen_height, square_size, terrain_surf,
-                                                     k_inp.land_chance)
+    if seed is None:
+        seed = grid.new_seed()
+    if regen_worker is not None and not debug:
+        regen_worker.request(seed, k_inp.land_chance, profile_path)
+        return
+
+    if profile_path is None:
+        generate_map(screen_width, screen_height, square_size, terrain_surf, k_inp, debug, seed)
+    else:
+        with k_inp.profiler.profile(profile_path):
+            generate_map(screen_width, screen_height, square_size, terrain_surf, k_inp, debug, seed)
 
-    for i in range(0, 7):
-        squares_list = transform.transform(squares_list, screen_width, screen_height, square_size,
-                                           terrain_surf, debug)
-    k_inp.terrain_surf_copy = terrain_surf
+
+def generate_map(screen_width: int, screen_height: int, square_size: int,
+                 terrain_surf: Union[Surface, SurfaceType], k_inp: KeyInput, debug: bool, seed: int) -> None:
+    """
+    This function generates and renders the terrain map on the main thread, showing each pass as it's run in debug.
+
+    :param screen_width:     Width of screen surface as a number of pixels
+    :param screen_height:    Height of screen surface as a number of pixels
+    :param square_size:      Size of an individual terrain square as a number of pixels
+    :param terrain_surf:     The display surface containing the map information
+    :param k_inp:            A KeyInput helper
+    :param debug:            Debug variable for showing process steps
+    :param seed:             The seed to generate the map from
+    """
+    profiler = k_inp.profiler
+    regen = profiler.begin_regen()
+    with profiler.stage('regen', regen):
+        random_field = RandomField(seed)
+        with profiler.stage('generate_grid', regen):
+            terrain_grid = grid.generate_grid(screen_width, screen_height, square_size, k_inp.land_chance,
+                                              random_field)
+
+        if debug:
+            render.render_grid(terrain_grid, square_size, terrain_surf)
+
+        with profiler.stage('setup_automaton', regen):
+            automaton = CellularAutomaton(terrain_grid, random_field=random_field)
+        if debug:
+            automaton.subscribe(DisplayObserver(terrain_surf, pygame.display.get_surface(), square_size))
+            automaton.subscribe(PassLogger())
+        automaton.subscribe(profiler.pass_timer(regen))
+        automaton.run(grid.TRANSFORM_PASSES, grid.MIN_CHANGES)
+        terrain_grid = automaton.cells
+
+        if not debug:
+            with profiler.stage('render', regen):
+                render.render_grid(terrain_grid, square_size, terrain_surf)
+    profiler.end_regen(regen)
+    k_inp.set_terrain(terrain_surf, terrain_grid, seed)
+
+
+def swap_in_regen(regen_worker: RegenWorker, terrain_surf: Union[Surface, SurfaceType], k_inp: KeyInput,
+                  display_surface: Union[Surface, SurfaceType]) -> Surface:
+    """
+    Swap a map finished by the regen worker in for the one on screen, if one has finished. If a regen failed its
+    error is printed and the map on screen kept, drawn again over the text shown while it was generating.
+
+    :param regen_worker:     The worker regenerating maps in the background
+    :param terrain_surf:     The display surface containing the map information
+    :param k_inp:            A KeyInput helper
+    :param display_surface:  The display surface to draw onto
+
+    :return: The terrain surface to use from now on
+    """
+    error = regen_worker.poll_error()
+    if error is not None:
+        print('Regenerating the map failed, keeping the current map')
+        traceback.print_exception(type(error), error, error.__traceback__)
+        k_inp.last_blit = None
+        blit_to_display(display_surface, k_inp)
+
+    result = regen_worker.poll()
+    if result is None:
+        return terrain_surf
+
+    k_inp.set_terrain(result.terrain_surf, result.terrain_grid, result.seed, result.zoom_pyramid)
+    blit_to_display(display_surface, k_inp)
+
+    return result.terrain_surf
 
 
 def drag_screen(k_inp: KeyInput, display_surface: Union[Surface, SurfaceType]) -> None:
@@ -105,8 +244,7 @@ def drag_screen(k_inp: KeyInput, display_surface: Union[Surface, SurfaceType]) -
         k_inp.diff = (0, 0)
 
     # Set changes made to the current position of the display surface to enable the view dragging behaviour,
-    # trying to ensure that the screen surface doesn't exceed the bounds of the terrain surface.
-    # TODO make this work properly when the view is zoomed in or out, currently only works properly for default view
+    # ensuring that the screen surface doesn't exceed the bounds of the terrain surface at the current zoom level.
     if k_inp.is_new_pos_in_x_bound() and k_inp.is_new_pos_in_y_bound():
         k_inp.current_surface_pos = k_inp.get_new_surface_pos()
 
@@ -125,14 +263,10 @@ def zoom_out(k_inp: KeyInput, screen_width: int, screen_height: int, terrain_sur
     :param display_surface:  The display surface to draw onto
     :param square_size:      Size of an individual terrain square as a number of pixels
     """
-    if k_inp.terrain_surf_copy.get_width() > screen_width + math.ceil(terrain_surf.get_width() / 5):
-        k_inp.terrain_surf_copy = pygame.transform.smoothscale(
-            terrain_surf,
-            (
-                k_inp.get_width() - square_size * math.ceil(screen_width / 20),
-                k_inp.get_height() - square_size * math.ceil(screen_height / 20)
-            )
-        )
+    with k_inp.profiler.stage('zoom'):
+        zoom_pyramid = get_zoom_pyramid(k_inp, screen_width, screen_height, terrain_surf, square_size)
+        if k_inp.zoom_level > zoom_pyramid.min_level:
+            k_inp.set_zoom_level(k_inp.zoom_level - 1)
 
         blit_to_display(display_surface, k_inp)
 
@@ -149,31 +283,77 @@ def zoom_in(k_inp: KeyInput, screen_width: int, screen_height: int, terrain_surf
         :param display_surface:  The display surface to draw onto
         :param square_size:      Size of an individual terrain square as a number of pixels
         """
-
-    if k_inp.get_width() < screen_width * 3:
-        k_inp.terrain_surf_copy = pygame.transform.smoothscale(
-            terrain_surf,
-            (
-                k_inp.get_width() + square_size * math.ceil(screen_width / 20),
-                k_inp.get_height() + square_size * math.ceil(screen_height / 20)
-            )
-        )
+    with k_inp.profiler.stage('zoom'):
+        zoom_pyramid = get_zoom_pyramid(k_inp, screen_width, screen_height, terrain_surf, square_size)
+        if k_inp.zoom_level < zoom_pyramid.max_level:
+            k_inp.set_zoom_level(k_inp.zoom_level + 1)
 
         blit_to_display(display_surface, k_inp)
 
 
+def get_zoom_pyramid(k_inp: KeyInput, screen_width: int, screen_height: int,
+                     terrain_surf: Union[Surface, SurfaceType], square_size: int) -> ZoomPyramid:
+    """
+    Get the zoom pyramid for the terrain surface, making a new one if the terrain surface has changed since the
+    current one was made.
+
+    :param k_inp:            A KeyInput helper
+    :param screen_width:     Width of screen surface as a number of pixels
+    :param screen_height:    Height of screen surface as a number of pixels
+    :param terrain_surf:     The display surface containing the map information
+    :param square_size:      Size of an individual terrain square as a number of pixels
+
+    :return: The zoom pyramid
+    """
+    if k_inp.zoom_pyramid is None or k_inp.zoom_pyramid.base is not terrain_surf:
+        k_inp.zoom_pyramid = ZoomPyramid(terrain_surf, screen_width, screen_height, square_size)
+
+    return k_inp.zoom_pyramid
+
+
 def blit_to_display(display_surface: Union[Surface, SurfaceType], k_inp: KeyInput) -> None:
     """
     Function to blit terrain position changes to the display
-    e.g. when the user drags the map around, or zooms in or out
+    e.g. when the user drags the map around, or zooms in or out.
+    Only the part of the terrain surface that's visible on screen is blitted, nothing is blitted if the view hasn't
+    changed since the last blit, and the area blitted is added to the KeyInput's dirty rects.
 
     :param display_surface:  The display surface to draw onto
     :param k_inp:            A KeyInput helper
     """
-    display_surface.blit(
-        k_inp.terrain_surf_copy,
-        (
-            k_inp.current_surface_pos[0],
-            k_inp.current_surface_pos[1]
+    if k_inp.world is not None:
+        blit_world(display_surface, k_inp)
+        return
+
+    if k_inp.last_blit is not None and k_inp.last_blit[0] is k_inp.terrain_surf_copy and \
+            k_inp.last_blit[1] == k_inp.current_surface_pos:
+        return
+
+    x, y = k_inp.current_surface_pos
+    visible_area = pygame.Rect(max(-x, 0), max(-y, 0), k_inp.screen_width, k_inp.screen_height)
+    with k_inp.profiler.stage('blit'):
+        k_inp.dirty_rects.append(
+            display_surface.blit(k_inp.terrain_surf_copy, (max(x, 0), max(y, 0)), visible_area)
         )
-    )
\ No newline at end of file
+    k_inp.last_blit = (k_inp.terrain_surf_copy, k_inp.current_surface_pos)
+
+
+def blit_world(display_surface: Union[Surface, SurfaceType], k_inp: KeyInput) -> None:
+    """
+    Function to blit the view of an unbounded world to the display. The view is drawn again every frame until every
+    chunk in it has been generated, and after that only when it moves.
+
+    :param display_surface:  The display surface to draw onto
+    :param k_inp:            A KeyInput helper
+    """
+    if k_inp.last_blit is not None and k_inp.last_blit[1] == k_inp.current_surface_pos:
+        return
+
+    x, y = k_inp.current_surface_pos
+    view = pygame.Rect(-x, -y, k_inp.screen_width, k_inp.screen_height)
+
+    # Dragging the map one way moves the view the other way
+    with k_inp.profiler.stage('blit'):
+        complete = k_inp.world.blit_view(display_surface, view, (-k_inp.diff[0], -k_inp.diff[1]))
+    k_inp.dirty_rects.append(display_surface.get_rect())
+    k_inp.last_blit = (k_inp.world, k_inp.current_surface_pos) if complete else None
@@ -0,0 +1,96 @@
+import struct
+from typing import List, NamedTuple, Tuple
+
+import numpy as np
+
+from terrain_types import NAMES, PALETTE
+
+# A terrain map file is a fixed size header, then a palette entry for each terrain type, then the grid of uint8
+# terrain type codes in row order, starting at an offset aligned to DATA_ALIGNMENT bytes so it can be memory mapped.
+MAGIC = b'TERRMAP\0'
+VERSION = 1
+DATA_ALIGNMENT = 64
+
+# magic, version, data offset, rows, columns, seed, land chance, iterations, number of palette entries
+HEADER_STRUCT = struct.Struct('<8sHIQQQhHH')
+# type code, red, green, blue, name
+PALETTE_ENTRY_STRUCT = struct.Struct('<BBBB16s')
+
+# Number of bytes of cells written at a time, so that on disk grids can be exported without loading them into memory
+WRITE_BLOCK_BYTES = 1 << 24
+
+
+class MapHeader(NamedTuple):
+    """
+    The header of a terrain map file, palette entries are (type code, name, RGB colour) tuples.
+    """
+    rows: int
+    cols: int
+    seed: int
+    land_chance: int
+    iterations: int
+    palette: List[Tuple[int, str, Tuple[int, int, int]]]
+    data_offset: int
+
+
+class MapFormatError(ValueError):
+    """
+    Raised when a file isn't a terrain map file this version of the format can read.
+    """
+
+
+def write_map(path: str, cells: np.ndarray, seed: int, land_chance: int, iterations: int) -> None:
+    """
+    Write a grid of terrain to a terrain map file. The grid can be an in memory array or a memory mapped one, it's
+    written a block of rows at a time.
+
+    :param path:         The file path to write to
+    :param cells:        The grid of terrain type codes
+    :param seed:         The seed the terrain was generated from
+    :param land_chance:  The chance that a terrain square started as grass
+    :param iterations:   The number of cellular automata passes run over the terrain
+    """
+    rows, cols = cells.shape
+    palette_size = PALETTE_ENTRY_STRUCT.size * len(NAMES)
+    data_offset = -(-(HEADER_STRUCT.size + palette_size) // DATA_ALIGNMENT) * DATA_ALIGNMENT
+
+    with open(path, 'wb') as map_file:
+        map_file.write(HEADER_STRUCT.pack(MAGIC, VERSION, data_offset, rows, cols, seed, land_chance, iterations,
+                                          len(NAMES)))
+        for type_code, name in enumerate(NAMES):
+            map_file.write(PALETTE_ENTRY_STRUCT.pack(type_code, *PALETTE[type_code], name.encode('utf-8')))
+        map_file.write(b'\0' * (data_offset - HEADER_STRUCT.size - palette_size))
+
+        block_rows = max(1, WRITE_BLOCK_BYTES // max(cols, 1))
+        for start in range(0, rows, block_rows):
+            map_file.write(np.ascontiguousarray(cells[start:start + block_rows], dtype=np.uint8).tobytes())
+
+
+def read_header(buffer: bytes) -> MapHeader:
+    """
+    Read the header and palette from the start of a terrain map file.
+
+    :param buffer:  A buffer holding at least the header and palette of the file, e.g. a memory map of the file
+
+    :return: The parsed header
+    """
+    if len(buffer) < HEADER_STRUCT.size:
+        raise MapFormatError('File is too short to be a terrain map')
+
+    magic, version, data_offset, rows, cols, seed, land_chance, iterations, palette_length = \
+        HEADER_STRUCT.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise MapFormatError('File is not a terrain map')
+    if version != VERSION:
+        raise MapFormatError('Unsupported terrain map version {}'.format(version))
+    if len(buffer) < data_offset + rows * cols:
+        raise MapFormatError('Terrain map is truncated')
+
+    palette = []
+    for i in range(0, palette_length):
+        type_code, red, green, blue, name = PALETTE_ENTRY_STRUCT.unpack_from(
+            buffer, HEADER_STRUCT.size + i * PALETTE_ENTRY_STRUCT.size
+        )
+        palette.append((type_code, name.rstrip(b'\0').decode('utf-8'), (red, green, blue)))
+
+    return MapHeader(rows, cols, seed, land_chance, iterations, palette, data_offset)
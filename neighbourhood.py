@@ -0,0 +1,120 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from terrain_types import WATER
+
+# How cells on the edge of the map see past it. Clamp repeats the edge cells outwards, wrap joins opposite edges so
+# the map is toroidal, and water surrounds the map with a fixed border of water
+BOUNDARY_MODES = ('clamp', 'wrap', 'water')
+DEFAULT_BOUNDARY = 'water'
+
+# Row and column offsets of the eight neighbours of a cell
+NEIGHBOUR_DELTAS: Tuple[Tuple[int, int], ...] = tuple(
+    (di, dj) for di in range(-1, 2) for dj in range(-1, 2) if di != 0 or dj != 0
+)
+
+
+def check_boundary(boundary: str) -> None:
+    """
+    Check that a boundary mode is one of BOUNDARY_MODES.
+
+    :param boundary:  The boundary mode
+
+    :raises ValueError: If the boundary mode isn't known
+    """
+    if boundary not in BOUNDARY_MODES:
+        raise ValueError('Unknown boundary mode {!r}, expected one of {}'.format(boundary, ', '.join(BOUNDARY_MODES)))
+
+
+def neighbour_position(i: int, j: int, di: int, dj: int, rows: int, cols: int,
+                       boundary: str = DEFAULT_BOUNDARY) -> Optional[Tuple[int, int]]:
+    """
+    Work out where a neighbour of a cell is from the cell's grid position, rather than storing it.
+
+    :param i:         The row of the cell
+    :param j:         The column of the cell
+    :param di:        The row offset of the neighbour, -1, 0 or 1
+    :param dj:        The column offset of the neighbour, -1, 0 or 1
+    :param rows:      The number of rows in the grid
+    :param cols:      The number of columns in the grid
+    :param boundary:  One of BOUNDARY_MODES
+
+    :return: The row and column of the neighbour, or None if it's part of the water border around the grid
+    """
+    ni = i + di
+    nj = j + dj
+    if 0 <= ni < rows and 0 <= nj < cols:
+        return ni, nj
+
+    if boundary == 'wrap':
+        return ni % rows, nj % cols
+    if boundary == 'clamp':
+        return min(max(ni, 0), rows - 1), min(max(nj, 0), cols - 1)
+    return None
+
+
+def neighbour_type_ids(squares_list: List[list], i: int, j: int, boundary: str = DEFAULT_BOUNDARY) -> List[int]:
+    """
+    Get the terrain type codes of the eight neighbours of a square in a list of terrain squares.
+
+    :param squares_list:  The list of terrain squares
+    :param i:             The row of the square
+    :param j:             The column of the square
+    :param boundary:      One of BOUNDARY_MODES
+
+    :return: The terrain type code of each neighbour
+    """
+    rows = len(squares_list)
+    cols = len(squares_list[0])
+
+    type_ids = []
+    for di, dj in NEIGHBOUR_DELTAS:
+        position = neighbour_position(i, j, di, dj, rows, cols, boundary)
+        if position is None:
+            type_ids.append(WATER)
+        else:
+            type_ids.append(squares_list[position[0]][position[1]].type_id)
+
+    return type_ids
+
+
+def fill_border(padded: np.ndarray, boundary: str = DEFAULT_BOUNDARY) -> None:
+    """
+    Fill in the one cell border of a padded grid of terrain type codes from the grid inside it.
+
+    :param padded:    The grid with a one cell border around it, the border is overwritten
+    :param boundary:  One of BOUNDARY_MODES
+    """
+    if boundary == 'wrap':
+        padded[0, :] = padded[-2, :]
+        padded[-1, :] = padded[1, :]
+        padded[:, 0] = padded[:, -2]
+        padded[:, -1] = padded[:, 1]
+    elif boundary == 'clamp':
+        padded[0, :] = padded[1, :]
+        padded[-1, :] = padded[-2, :]
+        padded[:, 0] = padded[:, 1]
+        padded[:, -1] = padded[:, -2]
+    else:
+        padded[0, :] = WATER
+        padded[-1, :] = WATER
+        padded[:, 0] = WATER
+        padded[:, -1] = WATER
+
+
+def fold_border(marked: np.ndarray, boundary: str = DEFAULT_BOUNDARY) -> None:
+    """
+    Move marks made on the one cell border of a padded grid onto the cells inside the grid that the border stands
+    for, so marking a cell's whole neighbourhood in the padded grid marks every cell that can see it.
+
+    :param marked:    The padded grid of marks
+    :param boundary:  One of BOUNDARY_MODES
+    """
+    # Clamped border cells only repeat the edge cells, which are already in the neighbourhood, and the water border
+    # never changes, so only wrapping needs anything moving
+    if boundary == 'wrap':
+        marked[1, :] |= marked[-1, :]
+        marked[-2, :] |= marked[0, :]
+        marked[:, 1] |= marked[:, -1]
+        marked[:, -2] |= marked[:, 0]
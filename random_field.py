@@ -0,0 +1,120 @@
+import random
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Multipliers of the SplitMix64 finaliser, and odd constants used to spread the pass and stream numbers of a key
+MIX_MULTIPLIERS = (0xBF58476D1CE4E5B9, 0x94D049BB133111EB)
+PASS_MULTIPLIER = 0x9E3779B97F4A7C15
+STREAM_MULTIPLIER = 0xD6E8FEB86659FD93
+
+MASK_64 = 2 ** 64 - 1
+
+
+def mix(value: int) -> int:
+    """
+    Scramble a 64 bit integer with the SplitMix64 finaliser.
+
+    :param value:  The integer to scramble
+
+    :return: The scrambled integer
+    """
+    value &= MASK_64
+    value = ((value ^ (value >> 30)) * MIX_MULTIPLIERS[0]) & MASK_64
+    value = ((value ^ (value >> 27)) * MIX_MULTIPLIERS[1]) & MASK_64
+    return value ^ (value >> 31)
+
+
+def mix_array(values: np.ndarray) -> np.ndarray:
+    """
+    Scramble an array of 64 bit integers in place with the SplitMix64 finaliser.
+
+    :param values:  The array of uint64 integers to scramble
+
+    :return: The same array
+    """
+    values ^= values >> np.uint64(30)
+    values *= np.uint64(MIX_MULTIPLIERS[0])
+    values ^= values >> np.uint64(27)
+    values *= np.uint64(MIX_MULTIPLIERS[1])
+    values ^= values >> np.uint64(31)
+    return values
+
+
+class RandomField:
+    """
+    Counter based random numbers, where every draw is a pure function of the seed, the pass, a stream number and the
+    row and column of the cell it's for.
+
+    Because no draw depends on any other having been made first, a whole pass's draws can be made in one bulk call,
+    just the draws for the cells that need them can be made, and the same cell gets the same draw whatever order
+    cells are evaluated in or however the grid is split into chunks.
+
+    Attributes:
+        seed:  The seed the draws are derived from
+
+    Methods:
+        block:  Draw for every cell in a rectangular block of the grid
+        at:     Draw for cells at the given rows and columns
+    """
+
+    def __init__(self, seed: Optional[int] = None):
+        self.seed = seed if seed is not None else random.randrange(2 ** 63)
+
+    def _row_keys(self, pass_index: int, stream: int, rows: np.ndarray) -> np.ndarray:
+        key = mix(mix(self.seed) + pass_index * PASS_MULTIPLIER + stream * STREAM_MULTIPLIER)
+        return mix_array(rows.astype(np.uint64) ^ np.uint64(key))
+
+    def block(self, pass_index: int, stream: int, top: int, left: int, shape: Tuple[int, int],
+              out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Draw a uniform number in [0, 1) for every cell of a rectangular block of the grid.
+
+        :param pass_index:  The pass the draws are for
+        :param stream:      Which of a pass's independent sets of draws to take, e.g. the index of a rule
+        :param top:         The row of the top left cell of the block
+        :param left:        The column of the top left cell of the block
+        :param shape:       The number of rows and columns in the block
+        :param out:         If given, a float32 array of the block's shape to write the draws into
+
+        :return: The float32 draws for the block
+        """
+        rows, cols = shape
+        row_keys = self._row_keys(pass_index, stream, np.arange(top, top + rows, dtype=np.int64))
+
+        values = np.empty(shape, dtype=np.uint64)
+        np.multiply(np.arange(left, left + cols, dtype=np.int64).astype(np.uint64), np.uint64(PASS_MULTIPLIER),
+                    out=values[0])
+        np.bitwise_xor(values[0], row_keys[:, None], out=values)
+        return self._to_uniform(mix_array(values), out)
+
+    def at(self, pass_index: int, stream: int, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        """
+        Draw a uniform number in [0, 1) for each of the given cells, the same as block would draw for them.
+
+        :param pass_index:  The pass the draws are for
+        :param stream:      Which of a pass's independent sets of draws to take, e.g. the index of a rule
+        :param rows:        The row of each cell
+        :param cols:        The column of each cell
+
+        :return: The float32 draws for the cells
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        values = np.asarray(cols, dtype=np.int64).astype(np.uint64) * np.uint64(PASS_MULTIPLIER)
+        if len(rows) == 0:
+            return values.astype(np.float32)
+
+        # Work out the key of each row the cells cover once, rather than once per cell
+        top = rows.min()
+        row_keys = self._row_keys(pass_index, stream, np.arange(top, rows.max() + 1, dtype=np.int64))
+        values ^= row_keys[rows - top]
+        return self._to_uniform(mix_array(values))
+
+    @staticmethod
+    def _to_uniform(values: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        # The top 24 bits fill a float32's mantissa exactly
+        values >>= np.uint64(40)
+        if out is None:
+            out = np.empty(values.shape, dtype=np.float32)
+        np.multiply(values, np.float32(2 ** -24), out=out, casting='unsafe')
+        return out
@@ -0,0 +1,244 @@
+from typing import NamedTuple, Tuple
+
+import numpy as np
+
+# Cells touching along an edge are in the same region with 4 connectivity, with 8 cells touching at a corner are too
+CONNECTIVITIES = (4, 8)
+DEFAULT_CONNECTIVITY = 8
+
+
+class Regions(NamedTuple):
+    """
+    The connected regions of a grid of terrain, each a set of cells of the same terrain type that touch each other.
+    Per region arrays are indexed by the region's label, bounding boxes are (top, left, bottom, right) with the
+    bottom and right inclusive, and centroids are (row, column).
+    """
+    labels: np.ndarray
+    type_ids: np.ndarray
+    areas: np.ndarray
+    bounding_boxes: np.ndarray
+    centroids: np.ndarray
+
+
+def find_runs(cells: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Split every row of a grid into runs of cells of the same terrain type.
+
+    :param cells:  The grid of terrain type codes
+
+    :return: The run each cell is part of, and the flat index of the first cell of each run, runs being numbered in
+             row order
+    """
+    starts = np.ones(cells.shape, dtype=bool)
+    np.not_equal(cells[:, 1:], cells[:, :-1], out=starts[:, 1:])
+    run_starts = np.flatnonzero(starts)
+    runs = np.cumsum(starts, dtype=np.int64).reshape(cells.shape) - 1
+    return runs, run_starts
+
+
+def touching_runs(cells: np.ndarray, runs: np.ndarray, connectivity: int = DEFAULT_CONNECTIVITY) -> np.ndarray:
+    """
+    Find every pair of runs of the same terrain type that touch each other across neighbouring rows.
+
+    :param cells:         The grid of terrain type codes
+    :param runs:          The run each cell is part of, see find_runs
+    :param connectivity:  One of CONNECTIVITIES
+
+    :return: The pairs of runs, as an array of (upper run, lower run) rows, each pair at most once for each of the
+             ways cells can touch
+    """
+    cols = cells.shape[1]
+    starts = np.ones(cells.shape, dtype=bool)
+    np.not_equal(runs[:, 1:], runs[:, :-1], out=starts[:, 1:])
+
+    upper_runs = []
+    lower_runs = []
+    for dc in ((0,) if connectivity == 4 else (-1, 0, 1)):
+        # Each cell against the cell below it, below and to the left or below and to the right. Two runs overlap
+        # over one span of columns, so a pair is only taken where one of its runs starts or the span meets the edge
+        left, right = max(-dc, 0), cols - max(dc, 0)
+        touching = cells[:-1, left:right] == cells[1:, left + dc:right + dc]
+        first = starts[:-1, left:right] | starts[1:, left + dc:right + dc]
+        first[:, :1] = True
+        touching &= first
+        upper_runs.append(runs[:-1, left:right][touching])
+        lower_runs.append(runs[1:, left + dc:right + dc][touching])
+
+    return np.stack((np.concatenate(upper_runs), np.concatenate(lower_runs)), axis=1)
+
+
+def join_runs(run_count: int, pairs: np.ndarray) -> np.ndarray:
+    """
+    Union-find over runs, joining each pair of touching runs into the same set a whole array of pairs at a time.
+    Every round points each run straight at the root of its set, then hooks the root of every pair still in
+    different sets onto the lower of the two roots, until every pair is in the same set. Roots only ever hook onto
+    lower roots so no cycles can form.
+
+    :param run_count:  The number of runs
+    :param pairs:      The pairs of runs that touch, see touching_runs
+
+    :return: The root run of the set each run is in, the lowest numbered run in the set
+    """
+    parents = np.arange(0, run_count, dtype=np.int64)
+    first, second = pairs[:, 0], pairs[:, 1]
+    while True:
+        while True:
+            grandparents = parents[parents]
+            if np.array_equal(grandparents, parents):
+                break
+            parents = grandparents
+
+        first_roots, second_roots = parents[first], parents[second]
+        apart = first_roots != second_roots
+        if not apart.any():
+            return parents
+
+        first, second = first[apart], second[apart]
+        first_roots, second_roots = first_roots[apart], second_roots[apart]
+        np.minimum.at(parents, np.maximum(first_roots, second_roots), np.minimum(first_roots, second_roots))
+
+
+def label_regions(cells: np.ndarray, connectivity: int = DEFAULT_CONNECTIVITY) -> Regions:
+    """
+    Label the connected regions of each terrain type in a grid, e.g. each island, lake and mountain range, in a
+    single pass over the grid's runs of cells, and work out the area, bounding box and centroid of each.
+
+    :param cells:         The grid of terrain type codes
+    :param connectivity:  One of CONNECTIVITIES
+
+    :return: The regions, labelled from 0 in the order their first cell comes in row order
+
+    :raises ValueError: If the connectivity isn't known
+    """
+    if connectivity not in CONNECTIVITIES:
+        raise ValueError('Unknown connectivity {!r}, expected one of {}'.format(
+            connectivity, ', '.join(str(value) for value in CONNECTIVITIES)))
+
+    rows, cols = cells.shape
+    runs, run_starts = find_runs(cells)
+    roots = join_runs(len(run_starts), touching_runs(cells, runs, connectivity))
+    roots, run_regions = np.unique(roots, return_inverse=True)
+    region_count = len(roots)
+
+    run_rows, run_lefts = np.divmod(run_starts, cols)
+    run_lengths = np.diff(np.append(run_starts, rows * cols))
+    run_rights = run_lefts + run_lengths - 1
+
+    areas = np.bincount(run_regions, weights=run_lengths, minlength=region_count).astype(np.int64)
+    bounding_boxes = np.empty((region_count, 4), dtype=np.int64)
+    bounding_boxes[:, 0] = rows
+    bounding_boxes[:, 1] = cols
+    bounding_boxes[:, 2:] = -1
+    np.minimum.at(bounding_boxes[:, 0], run_regions, run_rows)
+    np.minimum.at(bounding_boxes[:, 1], run_regions, run_lefts)
+    np.maximum.at(bounding_boxes[:, 2], run_regions, run_rows)
+    np.maximum.at(bounding_boxes[:, 3], run_regions, run_rights)
+
+    centroids = np.empty((region_count, 2), dtype=np.float64)
+    centroids[:, 0] = np.bincount(run_regions, weights=run_lengths * run_rows, minlength=region_count) / areas
+    centroids[:, 1] = np.bincount(run_regions, weights=run_lengths * (run_lefts + run_rights) / 2,
+                                  minlength=region_count) / areas
+
+    type_ids = np.empty(region_count, dtype=np.uint8)
+    type_ids[run_regions] = cells.ravel()[run_starts]
+
+    return Regions(run_regions.astype(np.int32)[runs], type_ids, areas, bounding_boxes, centroids)
+
+
+def nearest_cells(cells: np.ndarray, type_id: int) -> np.ndarray:
+    """
+    Find the nearest cell of a terrain type to every cell of a grid by straight line distance, an exact Euclidean
+    distance transform done one axis at a time in time linear in the size of the grid (Felzenszwalb and
+    Huttenlocher's lower envelope of parabolas). Along each row the nearest cell of the type in that row is found
+    with running maximums and minimums of the columns of the cells of the type, then down each column the nearest of
+    those is found with lower_envelope. The columns are taken along the grid's shorter side, as lower_envelope steps
+    through them a row at a time.
+
+    :param cells:    The grid of terrain type codes
+    :param type_id:  The terrain type to find the nearest cells of
+
+    :return: The flat index of the nearest cell of the type to each cell, -1 everywhere if there are none
+    """
+    is_type = cells == type_id
+    if not is_type.any():
+        return np.full(cells.shape, -1, dtype=np.int64)
+
+    transposed = cells.shape[0] > cells.shape[1]
+    if transposed:
+        is_type = np.ascontiguousarray(is_type.T)
+    rows, cols = is_type.shape
+
+    # The nearest cell of the type in the same row, to the left or right, with the distance squared to it
+    columns = np.arange(0, cols, dtype=np.int64)
+    left = np.maximum.accumulate(np.where(is_type, columns, -cols * 2), axis=1)
+    right = np.minimum.accumulate(np.where(is_type, columns, cols * 3)[:, ::-1], axis=1)[:, ::-1]
+    row_nearest = np.where(columns - left <= right - columns, left, right)
+    row_distances = (row_nearest - columns).astype(np.float64) ** 2
+    row_distances[~is_type.any(axis=1)] = np.inf
+
+    # Then down the columns, the row whose nearest is nearest
+    nearest_rows = lower_envelope(row_distances)
+    nearest_cols = row_nearest[nearest_rows, columns]
+    if transposed:
+        return (nearest_cols * rows + nearest_rows).T
+    return nearest_rows * cols + nearest_cols
+
+
+def lower_envelope(distances: np.ndarray) -> np.ndarray:
+    """
+    Solve the one dimensional squared distance transform down every column of a grid at once: for each cell find the
+    row q minimising (row - q)^2 + distances[q], in time linear in the number of rows. Each row q with a finite
+    distance is a parabola with its lowest point at q, and the lower envelope of the parabolas is built a row at a
+    time, popping parabolas the new one hides, then read off from the top. Every column keeps its own stack of
+    parabolas, and each step only touches the columns that still need it.
+
+    :param distances:  The squared distance of each cell to its nearest point along its row, infinite where there is
+                       none, with at least one finite distance in every column
+
+    :return: The row of the parabola lowest at each cell
+    """
+    rows, cols = distances.shape
+    columns = np.arange(0, cols, dtype=np.int64)
+    squares = np.arange(0, rows, dtype=np.float64) ** 2
+
+    # For each column the rows of the parabolas in its envelope, from the top, the rows the envelope switches from
+    # each to the next at, and the index of its last parabola
+    parabolas = np.zeros((rows, cols), dtype=np.int64)
+    starts = np.empty((rows + 1, cols), dtype=np.float64)
+    last = np.full(cols, -1, dtype=np.int64)
+
+    for q in range(0, rows):
+        heights = distances[q] + squares[q]
+        adding = np.flatnonzero(np.isfinite(heights))
+        start = np.full(len(adding), -np.inf)
+
+        # Pop every parabola the new one is lower than from where that parabola starts onwards
+        pending = np.flatnonzero(last[adding] >= 0)
+        while len(pending):
+            column = adding[pending]
+            top = last[column]
+            row = parabolas[top, column]
+            crossing = (heights[column] - distances[row, column] - squares[row]) / (2.0 * (q - row))
+            hidden = crossing <= starts[top, column]
+
+            start[pending[~hidden]] = crossing[~hidden]
+            pending = pending[hidden]
+            last[adding[pending]] -= 1
+            pending = pending[last[adding[pending]] >= 0]
+
+        last[adding] += 1
+        parabolas[last[adding], adding] = q
+        starts[last[adding], adding] = start
+        starts[last[adding] + 1, adding] = np.inf
+
+    # Then walk down each column's envelope
+    nearest = np.empty((rows, cols), dtype=np.int64)
+    current = np.zeros(cols, dtype=np.int64)
+    for row in range(0, rows):
+        moving = columns[starts[current + 1, columns] < row]
+        while len(moving):
+            current[moving] += 1
+            moving = moving[starts[current[moving] + 1, moving] < row]
+        nearest[row] = parabolas[current, columns]
+
+    return nearest
@@ -0,0 +1,79 @@
+from typing import Union
+
+import numpy as np
+import pygame
+from pygame.surface import Surface, SurfaceType
+
+from terrain_types import PALETTE
+
+# If more than this fraction of the visible cells have changed it's cheaper to render the whole grid again than to
+# redraw the changed cells one by one
+FULL_RENDER_FRACTION = 0.05
+
+
+def render_grid(terrain_grid: np.ndarray, square_size: int, display_surface: Union[Surface, SurfaceType]) -> None:
+    """
+    Render a whole grid of terrain to a display surface in one go, each cell as a square of its terrain colour with
+    a 1 pixel black border.
+
+    :param terrain_grid:     The grid of terrain type codes
+    :param square_size:      Size of an individual terrain square as a number of pixels
+    :param display_surface:  The display surface to draw onto
+    """
+    width, height = display_surface.get_size()
+    rows = min(terrain_grid.shape[0], -(-height // square_size))
+    cols = min(terrain_grid.shape[1], -(-width // square_size))
+
+    # Look up the mapped colour of every visible cell, in (x, y) order for surfarray
+    cells = mapped_palette(display_surface)[terrain_grid[:rows, :cols].T]
+
+    # Scale each cell up to a square of pixels and overlay the black borders
+    pixels = np.empty((cols * square_size, rows * square_size), dtype=np.uint32)
+    pixels.reshape(cols, square_size, rows, square_size)[...] = cells[:, None, :, None]
+    pixels[::square_size, :] = display_surface.map_rgb((0, 0, 0))
+    pixels[:, ::square_size] = display_surface.map_rgb((0, 0, 0))
+    pixels = pixels[:width, :height]
+
+    surface_pixels = pygame.surfarray.pixels2d(display_surface)
+    surface_pixels[:pixels.shape[0], :pixels.shape[1]] = pixels
+    del surface_pixels
+
+
+def render_changes(old_grid: np.ndarray, new_grid: np.ndarray, square_size: int,
+                   display_surface: Union[Surface, SurfaceType]) -> int:
+    """
+    Update a display surface showing one grid of terrain to show another, only redrawing the cells that differ
+    between them. The cell borders are left as they are.
+
+    :param old_grid:         The grid of terrain type codes currently shown on the display surface
+    :param new_grid:         The grid of terrain type codes to show, the same shape as the old grid
+    :param square_size:      Size of an individual terrain square as a number of pixels
+    :param display_surface:  The display surface to draw onto
+
+    :return: The number of visible cells that changed
+    """
+    width, height = display_surface.get_size()
+    rows = min(new_grid.shape[0], -(-height // square_size))
+    cols = min(new_grid.shape[1], -(-width // square_size))
+
+    changed_rows, changed_cols = np.nonzero(old_grid[:rows, :cols] != new_grid[:rows, :cols])
+    if len(changed_rows) > rows * cols * FULL_RENDER_FRACTION:
+        render_grid(new_grid, square_size, display_surface)
+        return len(changed_rows)
+
+    colours = mapped_palette(display_surface)[new_grid[changed_rows, changed_cols]]
+    for i, j, colour in zip(changed_rows.tolist(), changed_cols.tolist(), colours.tolist()):
+        display_surface.fill(colour, (j * square_size + 1, i * square_size + 1, square_size - 1, square_size - 1))
+
+    return len(changed_rows)
+
+
+def mapped_palette(display_surface: Union[Surface, SurfaceType]) -> np.ndarray:
+    """
+    Get the colour of each terrain type mapped to the pixel format of a display surface.
+
+    :param display_surface:  The display surface the colours will be drawn onto
+
+    :return: The mapped colours, indexed by terrain type code
+    """
+    return np.array([display_surface.map_rgb(tuple(colour)) for colour in PALETTE], dtype=np.uint32)
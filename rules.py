@@ -0,0 +1,42 @@
+from typing import NamedTuple, Tuple
+
+from terrain_types import WATER, GRASS, MOUNTAIN
+
+
+class Rule(NamedTuple):
+    """
+    A single cellular automata rule: a cell of from_type becomes to_type when the number of its eight neighbours that
+    are of any of the count_types is between min_count and max_count inclusive, with the given chance.
+
+    Rules in a rule set are all evaluated against the grid as it was at the start of a pass, and where more than one
+    rule applies to a cell the later rule in the set wins.
+    """
+    from_type: int
+    to_type: int
+    count_types: Tuple[int, ...]
+    min_count: int
+    max_count: int
+    chance: float = 1.0
+
+
+# The original rule set. Grass without enough land around it turns to water, grass surrounded by grass can randomly
+# turn to mountain, as can grass next to a small number of mountains, water surrounded by enough land turns to grass
+# and mountains surrounded by water turn to grass.
+DEFAULT_RULES = (
+    Rule(GRASS, WATER, (GRASS, MOUNTAIN), 0, 3),
+    Rule(GRASS, MOUNTAIN, (GRASS,), 8, 8, chance=1 / 1001),
+    Rule(GRASS, MOUNTAIN, (MOUNTAIN,), 1, 2, chance=100 / 1001),
+    Rule(WATER, GRASS, (GRASS, MOUNTAIN), 5, 8),
+    Rule(MOUNTAIN, GRASS, (WATER,), 7, 8),
+)
+
+# Just the rules that smooth out a coastline, grass without enough land around it turns to water and water
+# surrounded by enough land turns to grass, used to tidy the coastline of a biome map
+SMOOTHING_RULES = (
+    Rule(GRASS, WATER, (GRASS,), 0, 3),
+    Rule(WATER, GRASS, (GRASS,), 5, 8),
+)
+
+# Bump whenever DEFAULT_RULES or the way rules are applied changes, so stored or cached maps made with the old rules
+# can be told apart
+RULE_VERSION = 2
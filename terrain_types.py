@@ -0,0 +1,42 @@
+from typing import NamedTuple, Tuple
+
+import numpy as np
+
+# Compact integer codes for each terrain type, used as the cell values of a terrain grid. The cellular automata
+# rules only make the first three, the rest are biomes made by the biome generator, where water is shallow water
+WATER = 0
+GRASS = 1
+MOUNTAIN = 2
+DEEP_WATER = 3
+SAND = 4
+FOREST = 5
+HILL = 6
+SNOW = 7
+
+
+class TerrainType(NamedTuple):
+    """
+    An entry in the palette registry of terrain types, shared by every cell of that type.
+    """
+    type_id: int
+    name: str
+    colour: Tuple[int, int, int]
+
+
+# The palette registry, indexed by type code
+TERRAIN_TYPES: Tuple[TerrainType, ...] = (
+    TerrainType(WATER, 'Water', (0, 0, 255)),
+    TerrainType(GRASS, 'Grass', (0, 255, 0)),
+    TerrainType(MOUNTAIN, 'Mountain', (146, 146, 135)),
+    TerrainType(DEEP_WATER, 'Deep Water', (0, 0, 160)),
+    TerrainType(SAND, 'Sand', (238, 214, 150)),
+    TerrainType(FOREST, 'Forest', (0, 140, 40)),
+    TerrainType(HILL, 'Hill', (150, 190, 90)),
+    TerrainType(SNOW, 'Snow', (250, 250, 250)),
+)
+
+# RGB colour of each terrain type, indexed by its type code
+PALETTE = np.array([terrain_type.colour for terrain_type in TERRAIN_TYPES], dtype=np.uint8)
+
+# Name of each terrain type, indexed by its type code
+NAMES = tuple(terrain_type.name for terrain_type in TERRAIN_TYPES)
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The modules under test live at the top of the repository rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Nothing under test opens a window, but pygame still needs a video driver to make surfaces
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
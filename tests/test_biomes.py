@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+import biomes
+from classes.cellular_automaton import CellularAutomaton
+from helper import get_grid_shape
+from random_field import RandomField
+from rules import SMOOTHING_RULES
+from terrain_types import DEEP_WATER, FOREST, GRASS, HILL, MOUNTAIN, SAND, SNOW, WATER
+
+WATER_TYPES = (WATER, DEEP_WATER)
+
+
+def test_classify_bands():
+    # Sea level is half way up at a land chance of 50, and the bands go up from there
+    assert biomes.sea_level(50) == 128
+    elevation = np.array([[0, 100, 127, 128, 150, 200, 230, 250]], dtype=np.uint8)
+    expected = [DEEP_WATER, WATER, WATER, SAND, GRASS, HILL, MOUNTAIN, SNOW]
+
+    dry = biomes.classify_biomes(elevation, np.zeros_like(elevation), 50)
+    np.testing.assert_array_equal(dry[0], expected)
+
+    # Wet grass and hills are forest, and nothing else changes
+    wet = biomes.classify_biomes(elevation, np.ones_like(elevation), 50)
+    np.testing.assert_array_equal(wet[0], [FOREST if type_id in (GRASS, HILL) else type_id for type_id in expected])
+
+
+def test_classify_with_land_mask():
+    # Land below sea level is the lowest band, and water above it is still water
+    elevation = np.array([[60, 200]], dtype=np.uint8)
+    land = np.array([[True, False]])
+    terrain = biomes.classify_biomes(elevation, np.zeros_like(elevation), 50, land)
+    np.testing.assert_array_equal(terrain[0], [SAND, WATER])
+
+
+@pytest.mark.parametrize('land_chance', [0, 30, 70, 100])
+def test_classify_matches_thresholds(land_chance):
+    random_field = RandomField(4)
+    shape = (60, 90)
+    elevation = biomes.elevation_levels(random_field, shape)
+    moisture = biomes.moisture_levels(random_field, shape)
+    terrain = biomes.classify_biomes(elevation, moisture, land_chance)
+
+    is_water = np.isin(terrain, WATER_TYPES)
+    np.testing.assert_array_equal(is_water, elevation < biomes.sea_level(land_chance))
+    assert not np.any((terrain == FOREST) & (moisture == 0))
+    assert not np.any(np.isin(terrain, (GRASS, HILL)) & (moisture == 1))
+
+
+def test_noise_matches_across_origins():
+    # Any part of the noise made on its own matches the same part of a larger block
+    random_field = RandomField(8)
+    whole = biomes.fractal_noise(random_field, biomes.ELEVATION_STREAM, (80, 100), 32, 4)
+    part = biomes.fractal_noise(random_field, biomes.ELEVATION_STREAM, (30, 45), 32, 4, origin=(37, 41))
+    np.testing.assert_allclose(part, whole[37:67, 41:86], rtol=0, atol=1e-6)
+    assert 0 <= whole.min() and whole.max() <= 1
+
+
+def test_smoothing_decides_the_coastline():
+    seed, land_chance, passes = 12, 50, 3
+    terrain = biomes.generate_biomes(200, 150, 4, land_chance, RandomField(seed), smooth_passes=passes)
+    unsmoothed = biomes.generate_biomes(200, 150, 4, land_chance, RandomField(seed))
+
+    random_field = RandomField(seed)
+    shape = get_grid_shape(200, 150, 4)
+    elevation = biomes.elevation_levels(random_field, shape)
+    coastline = np.where(elevation >= biomes.sea_level(land_chance), GRASS, WATER).astype(np.uint8)
+    automaton = CellularAutomaton(coastline, SMOOTHING_RULES, random_field=random_field)
+    automaton.run(passes)
+
+    # The land is the smoothed coastline's, and only cells the passes changed differ from the unsmoothed map
+    np.testing.assert_array_equal(~np.isin(terrain, WATER_TYPES), automaton.cells != WATER)
+    changed = automaton.cells != coastline
+    assert changed.any()
+    np.testing.assert_array_equal(terrain[~changed], unsmoothed[~changed])
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+import grid
+from classes.bitplane_automaton import BitplaneAutomaton, find_mismatch
+from neighbourhood import BOUNDARY_MODES
+from random_field import RandomField
+from rules import DEFAULT_RULES, SMOOTHING_RULES, Rule
+from terrain_types import FOREST, GRASS, MOUNTAIN, SAND, SNOW, WATER
+
+# Rules over more types than fit in two bitplanes, with counts right up to all eight neighbours
+BIOME_RULES = (
+    Rule(SAND, FOREST, (GRASS, FOREST), 6, 8),
+    Rule(FOREST, SNOW, (SNOW, MOUNTAIN), 1, 8, chance=0.5),
+    Rule(SNOW, WATER, (WATER,), 0, 0),
+    Rule(GRASS, SAND, (WATER, SAND), 3, 5),
+)
+
+
+@pytest.mark.parametrize('shape', [(1, 1), (5, 63), (17, 64), (33, 65), (40, 130)])
+@pytest.mark.parametrize('boundary', BOUNDARY_MODES)
+@pytest.mark.parametrize('rules', [DEFAULT_RULES, SMOOTHING_RULES])
+def test_matches_cellular_automaton(shape, boundary, rules):
+    cells = grid.random_grid(shape, 50, RandomField(21))
+    assert find_mismatch(cells, 12, rules, boundary, RandomField(21)) is None
+
+
+@pytest.mark.parametrize('boundary', BOUNDARY_MODES)
+def test_matches_with_more_bitplanes(boundary):
+    types = np.array([WATER, GRASS, MOUNTAIN, SAND, FOREST, SNOW], dtype=np.uint8)
+    cells = np.random.default_rng(22).choice(types, size=(29, 70))
+    assert find_mismatch(cells, 8, BIOME_RULES, boundary, RandomField(22), origin=(-300, 41)) is None
+
+
+def test_matches_when_most_cells_draw():
+    # Mostly grass, so the chance of grass turning to mountain is drawn for most cells at once
+    cells = grid.random_grid((64, 200), 5, RandomField(23))
+    assert find_mismatch(cells, 6, DEFAULT_RULES, random_field=RandomField(23)) is None
+
+
+def test_find_mismatch_reports_first_differing_pass(monkeypatch):
+    step = BitplaneAutomaton.step
+
+    def broken_step(self):
+        changed = step(self)
+        if self.passes == 3:
+            self.load(np.where(self.cells == WATER, GRASS, WATER).astype(np.uint8))
+            self.passes = 3
+        return changed
+
+    monkeypatch.setattr(BitplaneAutomaton, 'step', broken_step)
+    cells = grid.random_grid((20, 30), 50, RandomField(24))
+    assert find_mismatch(cells, 6, random_field=RandomField(24)) == 3
+
+
+def test_cells_round_trip():
+    cells = np.random.default_rng(25).integers(0, 8, size=(13, 131), dtype=np.uint8)
+    np.testing.assert_array_equal(BitplaneAutomaton(cells).cells, cells)
@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+
+import grid
+from classes.cellular_automaton import CellularAutomaton
+from neighbourhood import BOUNDARY_MODES, NEIGHBOUR_DELTAS, neighbour_position
+from random_field import RandomField
+from rules import DEFAULT_RULES, SMOOTHING_RULES, Rule
+from terrain_types import GRASS, MOUNTAIN, WATER
+
+# Rules that overlap, so which one wins matters, with no chance involved
+OVERLAPPING_RULES = (
+    Rule(GRASS, WATER, (GRASS,), 0, 4),
+    Rule(GRASS, MOUNTAIN, (WATER,), 4, 8),
+    Rule(WATER, GRASS, (GRASS, MOUNTAIN), 4, 8),
+    Rule(MOUNTAIN, WATER, (MOUNTAIN,), 0, 1),
+)
+
+
+def reference_step(cells, rules, boundary, random_field, pass_index):
+    """
+    One pass worked out a cell at a time, every rule against the grid from before the pass, later rules winning.
+    """
+    rows, cols = cells.shape
+    draws = [random_field.block(pass_index, index, 0, 0, cells.shape) for index in range(0, len(rules))]
+    result = cells.copy()
+    for i in range(0, rows):
+        for j in range(0, cols):
+            neighbours = []
+            for di, dj in NEIGHBOUR_DELTAS:
+                position = neighbour_position(i, j, di, dj, rows, cols, boundary)
+                neighbours.append(WATER if position is None else cells[position])
+
+            for index, rule in enumerate(rules):
+                count = sum(neighbour in rule.count_types for neighbour in neighbours)
+                if cells[i, j] != rule.from_type or not rule.min_count <= count <= rule.max_count:
+                    continue
+                if rule.chance < 1 and not draws[index][i, j] < rule.chance:
+                    continue
+                result[i, j] = rule.to_type
+    return result
+
+
+def random_cells(seed, shape=(23, 31), types=(WATER, GRASS, MOUNTAIN)):
+    return np.random.default_rng(seed).choice(np.array(types, dtype=np.uint8), size=shape)
+
+
+@pytest.mark.parametrize('boundary', BOUNDARY_MODES)
+@pytest.mark.parametrize('rules', [DEFAULT_RULES, SMOOTHING_RULES, OVERLAPPING_RULES])
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_passes_match_reference(boundary, rules, seed):
+    cells = random_cells(seed)
+    random_field = RandomField(seed)
+    automaton = CellularAutomaton(cells, rules, boundary=boundary, random_field=random_field)
+
+    expected = cells
+    for pass_index in range(1, 5):
+        expected = reference_step(expected, rules, boundary, random_field, pass_index)
+        automaton.step()
+        np.testing.assert_array_equal(automaton.cells, expected)
+
+
+def test_transform_grid_is_one_pass():
+    cells = random_cells(3)
+    random_field = RandomField(3)
+    automaton = CellularAutomaton(cells, random_field=random_field)
+    automaton.step()
+
+    np.testing.assert_array_equal(grid.transform_grid(cells, random_field), automaton.cells)
+
+
+def test_step_leaves_input_and_counts_changes():
+    cells = random_cells(4)
+    original = cells.copy()
+    automaton = CellularAutomaton(cells, random_field=RandomField(4))
+    changed = automaton.step()
+
+    np.testing.assert_array_equal(cells, original)
+    np.testing.assert_array_equal(automaton.previous_cells, original)
+    assert changed == np.count_nonzero(automaton.cells != original)
+
+
+@pytest.mark.parametrize('boundary', BOUNDARY_MODES)
+@pytest.mark.parametrize('rules', [DEFAULT_RULES, SMOOTHING_RULES])
+@pytest.mark.parametrize('seed', [0, 1])
+def test_frontier_matches_dense(boundary, rules, seed, monkeypatch):
+    active_steps = []
+    step_active = CellularAutomaton._step_active
+    monkeypatch.setattr(CellularAutomaton, '_step_active',
+                        lambda self, active: active_steps.append(len(active)) or step_active(self, active))
+
+    cells = grid.random_grid((90, 130), 50, RandomField(seed))
+    frontier = CellularAutomaton(cells, rules, boundary=boundary, random_field=RandomField(seed))
+    dense = CellularAutomaton(cells, rules, use_frontier=False, boundary=boundary, random_field=RandomField(seed))
+    for pass_index in range(0, 20):
+        assert frontier.step() == dense.step()
+        np.testing.assert_array_equal(frontier.cells, dense.cells)
+
+    # Most of the later passes should only have evaluated the active cells
+    assert len(active_steps) > 10
+
+
+def test_run_stops_below_min_changes():
+    cells = grid.random_grid((60, 80), 50, RandomField(5))
+    automaton = CellularAutomaton(cells, random_field=RandomField(5))
+    automaton.run(50, min_changes=20)
+
+    assert automaton.change_counts[-1] < 20
+    assert all(count >= 20 for count in automaton.change_counts[:-1])
+    assert len(automaton.change_counts) < 50
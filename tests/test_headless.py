@@ -0,0 +1,33 @@
+import os
+
+import numpy as np
+import pytest
+
+import headless
+from classes.chunked_world import ChunkedWorld
+from classes.map_file import MapFile
+
+
+@pytest.mark.parametrize('output_format', ['npy', 'trn'])
+def test_chunked_map_leaves_only_the_map(tmp_path, output_format):
+    path = str(tmp_path / 'map_00000.{}'.format(output_format))
+    headless.generate_chunked_map(3, 0, path, output_format, 40, 30, 4, 50, 2, 16)
+
+    assert os.listdir(str(tmp_path)) == [os.path.basename(path)]
+    if output_format == 'npy':
+        cells = np.load(path)
+    else:
+        with MapFile(path) as map_file:
+            cells = np.array(map_file.cells)
+    assert cells.shape == headless.get_grid_shape(40, 30, 4)
+
+
+def test_chunked_map_cleans_up_when_generation_fails(tmp_path, monkeypatch):
+    def transform(world, seed):
+        raise RuntimeError('transform failed')
+
+    monkeypatch.setattr(ChunkedWorld, 'transform', transform)
+    with pytest.raises(RuntimeError):
+        headless.generate_chunked_map(3, 0, str(tmp_path / 'map_00000.npy'), 'npy', 40, 30, 4, 50, 2, 16)
+
+    assert os.listdir(str(tmp_path)) == []
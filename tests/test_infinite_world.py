@@ -0,0 +1,51 @@
+import numpy as np
+import pygame
+
+import grid
+from classes.infinite_world import InfiniteWorld, generate_chunk
+from classes.zoom_pyramid import surface_bytes
+from random_field import RandomField
+
+
+def test_neighbouring_chunks_match_one_larger_grid():
+    # A cell only sees one cell further per pass, so away from the edges by at least the number of passes a larger
+    # finite grid from the same seed is the unbounded world
+    chunk_size = 16
+    assert chunk_size >= grid.TRANSFORM_PASSES
+    chunks = np.block([[generate_chunk(5, 50, chunk_x, chunk_y, chunk_size) for chunk_x in (1, 2)]
+                       for chunk_y in (1, 2)])
+
+    size = chunk_size * 3 + grid.TRANSFORM_PASSES
+    # At a square size of 2, a screen width or height in pixels gives at least that many cells
+    larger = grid.generate_terrain(size, size, 2, 50, grid.TRANSFORM_PASSES, RandomField(5), min_changes=0)
+    assert min(larger.shape) >= size
+    np.testing.assert_array_equal(chunks, larger[chunk_size:chunk_size * 3, chunk_size:chunk_size * 3])
+
+
+def test_cache_evicts_least_recently_used_outside_the_view():
+    world = InfiniteWorld(1, 50, 1, chunk_size=8)
+    # Stopped so chunks are only added here
+    world.stop()
+    chunk_bytes = surface_bytes(pygame.Surface((8, 8), 0, 32))
+    world.max_bytes = chunk_bytes * 2
+    display_surface = pygame.Surface((8, 8), 0, 32)
+
+    def remember(chunk):
+        with world._condition:
+            world._remember(chunk, pygame.Surface((8, 8), 0, 32))
+
+    remember((0, 0))
+    remember((1, 0))
+    # Showing (0, 0) makes it the most recently used, so (1, 0) is evicted for (2, 0)
+    assert world.blit_view(display_surface, pygame.Rect(0, 0, 8, 8))
+    remember((2, 0))
+    assert list(world._surfaces) == [(0, 0), (2, 0)]
+    assert world._cached_bytes == chunk_bytes * 2
+
+    # Chunks in view are kept even over the limit
+    world.blit_view(pygame.Surface((24, 8), 0, 32), pygame.Rect(0, 0, 24, 8))
+    remember((3, 0))
+    assert list(world._surfaces) == [(0, 0), (2, 0), (3, 0)]
+    remember((4, 0))
+    assert list(world._surfaces) == [(0, 0), (2, 0), (4, 0)]
+    assert world._cached_bytes == chunk_bytes * 3
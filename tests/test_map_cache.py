@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+
+from classes.map_cache import MapCache, MapKey
+
+
+def make_key(seed):
+    return MapKey(seed, 40, 30, 4, 50, 10)
+
+
+def make_grid(seed):
+    return np.random.default_rng(seed).integers(0, 8, (15, 20), dtype=np.uint8)
+
+
+def set_mtime(cache, key, mtime):
+    os.utime(cache._path(key), (mtime, mtime))
+
+
+def test_put_copies_the_grid():
+    cache = MapCache()
+    terrain_grid = make_grid(1)
+    cache.put(make_key(1), terrain_grid)
+
+    # The caller's grid stays writable, and changing it doesn't change the cached map
+    assert terrain_grid.flags.writeable
+    terrain_grid[0, 0] += 1
+    cached = cache.get(make_key(1))
+    assert not cached.flags.writeable
+    np.testing.assert_array_equal(cached[1:], terrain_grid[1:])
+    assert cached[0, 0] != terrain_grid[0, 0]
+
+
+def test_memory_evicts_least_recently_used():
+    cache = MapCache(max_entries=2)
+    cache.put(make_key(1), make_grid(1))
+    cache.put(make_key(2), make_grid(2))
+    assert cache.get(make_key(1)) is not None
+    cache.put(make_key(3), make_grid(3))
+
+    assert cache.get(make_key(2)) is None
+    np.testing.assert_array_equal(cache.get(make_key(1)), make_grid(1))
+    np.testing.assert_array_equal(cache.get(make_key(3)), make_grid(3))
+    assert cache.stats() == {'hits': 3, 'disk_hits': 0, 'misses': 1, 'entries': 2}
+
+
+def test_disk_hits_are_promoted_to_memory(tmp_path):
+    MapCache(directory=str(tmp_path)).put(make_key(1), make_grid(1))
+
+    cache = MapCache(directory=str(tmp_path))
+    np.testing.assert_array_equal(cache.get(make_key(1)), make_grid(1))
+    assert cache.stats() == {'hits': 1, 'disk_hits': 1, 'misses': 0, 'entries': 1}
+
+    # Found in memory the second time, even with the file gone
+    os.remove(cache._path(make_key(1)))
+    cached = cache.get(make_key(1))
+    np.testing.assert_array_equal(cached, make_grid(1))
+    assert not cached.flags.writeable
+    assert cache.stats() == {'hits': 2, 'disk_hits': 1, 'misses': 0, 'entries': 1}
+
+
+def test_disk_size_cap_evicts_least_recently_used(tmp_path):
+    cache = MapCache(directory=str(tmp_path))
+    cache.put(make_key(1), make_grid(1))
+    map_bytes = os.path.getsize(cache._path(make_key(1)))
+    cache = MapCache(directory=str(tmp_path), max_disk_bytes=map_bytes * 2)
+
+    cache.put(make_key(1), make_grid(1))
+    set_mtime(cache, make_key(1), 1)
+    cache.put(make_key(2), make_grid(2))
+    set_mtime(cache, make_key(2), 2)
+
+    # Reading the first map from disk makes it the most recently used, so the second is evicted for the third
+    assert MapCache(directory=str(tmp_path)).get(make_key(1)) is not None
+    cache.put(make_key(3), make_grid(3))
+
+    assert sorted(os.listdir(str(tmp_path))) == sorted(os.path.basename(cache._path(make_key(seed))) for seed in (1, 3))
+    assert sum(entry.stat().st_size for entry in os.scandir(str(tmp_path))) <= cache.max_disk_bytes
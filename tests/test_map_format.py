@@ -0,0 +1,99 @@
+import os
+
+import numpy as np
+import pytest
+
+import map_format
+from classes.map_file import MapFile
+from terrain_types import NAMES, PALETTE
+
+
+@pytest.fixture
+def cells():
+    return np.random.default_rng(0).integers(0, len(NAMES), size=(37, 53), dtype=np.uint8)
+
+
+def test_round_trip(tmp_path, cells):
+    path = str(tmp_path / 'map.trn')
+    map_format.write_map(path, cells, 2 ** 63 + 5, 48, 7)
+
+    with MapFile(path) as map_file:
+        assert (map_file.rows, map_file.cols) == cells.shape
+        assert (map_file.seed, map_file.land_chance, map_file.iterations) == (2 ** 63 + 5, 48, 7)
+        assert map_file.palette == [(code, name, tuple(int(value) for value in PALETTE[code]))
+                                    for code, name in enumerate(NAMES)]
+        np.testing.assert_array_equal(map_file.cells, cells)
+
+
+def test_data_is_aligned(tmp_path, cells):
+    path = str(tmp_path / 'map.trn')
+    map_format.write_map(path, cells, 1, 50, 7)
+
+    with open(path, 'rb') as map_file:
+        header = map_format.read_header(map_file.read())
+    assert header.data_offset % map_format.DATA_ALIGNMENT == 0
+
+
+def test_read_rect(tmp_path, cells):
+    path = str(tmp_path / 'map.trn')
+    map_format.write_map(path, cells, 1, 50, 7)
+
+    with MapFile(path) as map_file:
+        np.testing.assert_array_equal(map_file.read_rect(5, 3, 20, 11), cells[3:14, 5:25])
+        np.testing.assert_array_equal(map_file.read_rect(40, 30, 20, 20), cells[30:, 40:])
+
+
+def test_memory_mapped_grid_written_in_blocks(tmp_path, cells, monkeypatch):
+    monkeypatch.setattr(map_format, 'WRITE_BLOCK_BYTES', 100)
+    source = np.lib.format.open_memmap(str(tmp_path / 'cells.npy'), mode='w+', dtype=np.uint8, shape=cells.shape)
+    source[:] = cells
+    path = str(tmp_path / 'map.trn')
+    map_format.write_map(path, source, 1, 50, 7)
+
+    with MapFile(path) as map_file:
+        np.testing.assert_array_equal(map_file.cells, cells)
+
+
+@pytest.mark.parametrize('corrupt', [
+    lambda data: data[:10],
+    lambda data: b'XXXX' + data[4:],
+    lambda data: data[:-1],
+])
+def test_bad_files_rejected(tmp_path, cells, corrupt):
+    path = str(tmp_path / 'map.trn')
+    map_format.write_map(path, cells, 1, 50, 7)
+    with open(path, 'rb') as map_file:
+        data = map_file.read()
+
+    with pytest.raises(map_format.MapFormatError):
+        map_format.read_header(corrupt(data))
+
+
+@pytest.mark.parametrize('contents', [b'', b'TERRMAP\0', b'not a terrain map at all, just some text' * 4])
+def test_map_file_rejects_empty_and_short_files(tmp_path, contents):
+    path = tmp_path / 'map.trn'
+    path.write_bytes(contents)
+
+    with pytest.raises(map_format.MapFormatError):
+        MapFile(str(path))
+
+
+def test_map_file_rejects_truncated_file(tmp_path, cells):
+    path = tmp_path / 'map.trn'
+    map_format.write_map(str(path), cells, 1, 50, 7)
+    path.write_bytes(path.read_bytes()[:-10])
+
+    with pytest.raises(map_format.MapFormatError):
+        MapFile(str(path))
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc/self/fd'), reason='needs /proc to count open files')
+def test_map_file_closes_file_on_failure(tmp_path):
+    path = tmp_path / 'map.trn'
+    path.write_bytes(b'x' * 1000)
+    open_files = len(os.listdir('/proc/self/fd'))
+
+    for i in range(0, 5):
+        with pytest.raises(map_format.MapFormatError):
+            MapFile(str(path))
+    assert len(os.listdir('/proc/self/fd')) == open_files
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from neighbourhood import check_boundary, fill_border, fold_border, neighbour_position
+from terrain_types import WATER
+
+
+def test_inside_grid_is_the_same_for_every_mode():
+    for boundary in ('clamp', 'wrap', 'water'):
+        assert neighbour_position(2, 3, -1, 1, 5, 6, boundary) == (1, 4)
+
+
+def test_edges():
+    assert neighbour_position(0, 0, -1, -1, 5, 6, 'wrap') == (4, 5)
+    assert neighbour_position(4, 5, 1, 1, 5, 6, 'wrap') == (0, 0)
+    assert neighbour_position(0, 0, -1, -1, 5, 6, 'clamp') == (0, 0)
+    assert neighbour_position(4, 2, 1, -1, 5, 6, 'clamp') == (4, 1)
+    assert neighbour_position(0, 3, -1, 0, 5, 6, 'water') is None
+
+    # The left edge doesn't see the right edge unless wrapping
+    assert neighbour_position(2, 0, 0, -1, 5, 6, 'clamp') == (2, 0)
+    assert neighbour_position(2, 0, 0, -1, 5, 6, 'water') is None
+
+
+@pytest.mark.parametrize('boundary', ['clamp', 'wrap', 'water'])
+def test_fill_border_matches_neighbour_position(boundary):
+    cells = np.random.default_rng(0).integers(1, 3, size=(5, 7), dtype=np.uint8)
+    padded = np.zeros((7, 9), dtype=np.uint8)
+    padded[1:-1, 1:-1] = cells
+    fill_border(padded, boundary)
+
+    for i in range(-1, 6):
+        for j in range(-1, 8):
+            if 0 <= i < 5 and 0 <= j < 7:
+                continue
+            inside_i, inside_j = min(max(i, 0), 4), min(max(j, 0), 6)
+            position = neighbour_position(inside_i, inside_j, i - inside_i, j - inside_j, 5, 7, boundary)
+            assert padded[i + 1, j + 1] == (WATER if position is None else cells[position])
+
+
+def test_fold_border_wraps_marks():
+    marked = np.zeros((6, 7), dtype=bool)
+    marked[0, 3] = True
+    marked[2, -1] = True
+    fold_border(marked, 'wrap')
+
+    assert marked[-2, 3] and marked[2, 1]
+
+
+def test_unknown_boundary():
+    with pytest.raises(ValueError):
+        check_boundary('mirror')
@@ -0,0 +1,84 @@
+import numpy as np
+import pygame
+import pytest
+
+import generate_squares
+import grid
+import transform
+from classes.chunked_world import ChunkedWorld
+from neighbourhood import BOUNDARY_MODES
+from random_field import RandomField, mix, mix_array
+
+
+def test_mix_array_matches_mix():
+    values = np.array([0, 1, 2 ** 63, 2 ** 64 - 1, 123456789], dtype=np.uint64)
+    assert mix_array(values.copy()).tolist() == [mix(int(value)) for value in values]
+
+
+def test_at_matches_block():
+    random_field = RandomField(7)
+    block = random_field.block(3, 2, -4, 10, (9, 12))
+    rows, cols = np.meshgrid(np.arange(-4, 5), np.arange(10, 22), indexing='ij')
+    draws = random_field.at(3, 2, rows.ravel()[::-1], cols.ravel()[::-1])
+
+    np.testing.assert_array_equal(draws[::-1].reshape(block.shape), block)
+
+
+def test_block_of_block_is_the_same():
+    random_field = RandomField(8)
+    whole = random_field.block(1, 0, 0, 0, (20, 30))
+    np.testing.assert_array_equal(random_field.block(1, 0, 5, 7, (10, 11)), whole[5:15, 7:18])
+
+
+def test_draws_depend_on_every_part_of_the_key():
+    draws = RandomField(1).block(1, 0, 0, 0, (16, 16))
+    np.testing.assert_array_equal(RandomField(1).block(1, 0, 0, 0, (16, 16)), draws)
+    for other in (RandomField(2).block(1, 0, 0, 0, (16, 16)), RandomField(1).block(2, 0, 0, 0, (16, 16)),
+                  RandomField(1).block(1, 1, 0, 0, (16, 16))):
+        assert np.count_nonzero(other == draws) < 4
+
+
+def test_draws_are_uniform():
+    draws = RandomField(3).block(1, 0, 0, 0, (400, 500))
+    assert draws.dtype == np.float32
+    assert draws.min() >= 0 and draws.max() < 1
+    counts = np.bincount((draws * 10).astype(np.int64).ravel(), minlength=10)
+    assert np.all(np.abs(counts - draws.size / 10) < draws.size / 10 * 0.05)
+
+
+def test_empty_at():
+    assert len(RandomField(1).at(1, 0, np.array([], dtype=np.int64), np.array([], dtype=np.int64))) == 0
+
+
+@pytest.mark.parametrize('boundary', BOUNDARY_MODES)
+def test_object_engine_matches_grid_engine(boundary):
+    width, height, square_size, passes = 240, 160, 8, 5
+    surface = pygame.Surface((width, height))
+    random_field = RandomField(11)
+
+    squares_list = generate_squares.generate_squares(width, height, square_size, surface, 50, random_field)
+    for pass_index in range(1, passes + 1):
+        squares_list = transform.transform(squares_list, width, height, square_size, surface, False, boundary,
+                                           random_field, pass_index)
+    objects = np.array([[square.type_id for square in row] for row in squares_list], dtype=np.uint8)
+
+    cells = grid.generate_terrain(width, height, square_size, 50, passes, RandomField(11), min_changes=0,
+                                  boundary=boundary)
+    np.testing.assert_array_equal(objects, cells)
+
+
+@pytest.mark.parametrize('chunk_size', [7, 16, 64])
+def test_chunked_world_matches_in_memory(tmp_path, chunk_size):
+    rows, cols, passes = 45, 61, 6
+    world = ChunkedWorld(rows, cols, chunk_size, str(tmp_path))
+    world.generate(50, 13)
+    for i in range(0, passes):
+        world.transform(13)
+
+    random_field = RandomField(13)
+    cells = grid.random_grid((rows, cols), 50, random_field)
+    for pass_index in range(1, passes + 1):
+        cells = grid.transform_grid(cells, random_field, pass_index=pass_index)
+
+    np.testing.assert_array_equal(np.asarray(world.cells), cells)
+    world.close()
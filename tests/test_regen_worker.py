@@ -0,0 +1,46 @@
+import time
+
+from classes.map_cache import MapCache
+from classes.regen_worker import RegenWorker
+
+
+class FailingCache(MapCache):
+    """
+    A map cache whose first lookup fails, as if generating the map had raised.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.failures = 1
+
+    def get_or_generate(self, key, generate):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError('generation failed')
+        return super().get_or_generate(key, generate)
+
+
+def wait_until_idle(worker, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while worker.is_busy():
+        assert time.monotonic() < deadline, 'the regen worker is still busy'
+        time.sleep(0.01)
+
+
+def test_failed_regen_is_reported_and_worker_carries_on():
+    worker = RegenWorker(40, 30, 4, FailingCache())
+    try:
+        worker.request(1, 50)
+        wait_until_idle(worker)
+        assert worker.poll() is None
+        error = worker.poll_error()
+        assert isinstance(error, RuntimeError)
+        assert worker.poll_error() is None
+
+        worker.request(2, 50)
+        wait_until_idle(worker)
+        assert worker.poll_error() is None
+        result = worker.poll()
+        assert result is not None and result.seed == 2
+    finally:
+        worker.stop()
@@ -0,0 +1,218 @@
+from collections import deque
+
+import numpy as np
+import pytest
+
+import regions
+from classes.index_saver import IndexSaver
+from classes.map_index import build_index, index_path, load_index
+from map_format import MapFormatError
+from terrain_types import GRASS, MOUNTAIN, WATER
+
+
+def flood_fill_labels(cells, connectivity):
+    """
+    Label regions by flood filling from each unlabelled cell in row order.
+    """
+    rows, cols = cells.shape
+    deltas = [(di, dj) for di in (-1, 0, 1) for dj in (-1, 0, 1)
+              if (di, dj) != (0, 0) and (connectivity == 8 or di == 0 or dj == 0)]
+    labels = np.full(cells.shape, -1, dtype=np.int64)
+    label = 0
+    for i in range(0, rows):
+        for j in range(0, cols):
+            if labels[i, j] >= 0:
+                continue
+            labels[i, j] = label
+            queue = deque([(i, j)])
+            while queue:
+                ci, cj = queue.popleft()
+                for di, dj in deltas:
+                    ni, nj = ci + di, cj + dj
+                    if 0 <= ni < rows and 0 <= nj < cols and labels[ni, nj] < 0 and cells[ni, nj] == cells[i, j]:
+                        labels[ni, nj] = label
+                        queue.append((ni, nj))
+            label += 1
+    return labels
+
+
+def random_cells(seed, shape):
+    return np.random.default_rng(seed).choice(np.array([WATER, GRASS, MOUNTAIN], dtype=np.uint8), size=shape,
+                                              p=[0.45, 0.45, 0.1])
+
+
+@pytest.mark.parametrize('connectivity', regions.CONNECTIVITIES)
+@pytest.mark.parametrize('shape', [(1, 1), (1, 40), (40, 1), (31, 47), (64, 64)])
+@pytest.mark.parametrize('seed', [0, 1])
+def test_labels_match_flood_fill(connectivity, shape, seed):
+    cells = random_cells(seed, shape)
+    map_regions = regions.label_regions(cells, connectivity)
+    expected = flood_fill_labels(cells, connectivity)
+    np.testing.assert_array_equal(map_regions.labels, expected)
+
+    for label in range(0, expected.max() + 1):
+        region_rows, region_cols = np.nonzero(expected == label)
+        assert map_regions.type_ids[label] == cells[region_rows[0], region_cols[0]]
+        assert map_regions.areas[label] == len(region_rows)
+        assert tuple(map_regions.bounding_boxes[label]) == (region_rows.min(), region_cols.min(),
+                                                            region_rows.max(), region_cols.max())
+        np.testing.assert_allclose(map_regions.centroids[label], (region_rows.mean(), region_cols.mean()))
+
+
+def test_spiral_needs_many_joins():
+    # One long winding region whose runs only join up over many rounds of the union-find
+    cells = np.full((21, 21), WATER, dtype=np.uint8)
+    for ring in range(0, 10, 2):
+        cells[ring, ring:21 - ring] = GRASS
+        cells[ring:21 - ring, 20 - ring] = GRASS
+        cells[20 - ring, ring:21 - ring] = GRASS
+        cells[ring + 2:21 - ring, ring] = GRASS
+        cells[ring + 2, ring:ring + 3] = GRASS
+    for connectivity in regions.CONNECTIVITIES:
+        np.testing.assert_array_equal(regions.label_regions(cells, connectivity).labels,
+                                      flood_fill_labels(cells, connectivity))
+
+
+def test_unknown_connectivity():
+    with pytest.raises(ValueError):
+        regions.label_regions(np.zeros((3, 3), dtype=np.uint8), 6)
+
+
+@pytest.mark.parametrize('type_id', [WATER, GRASS, MOUNTAIN])
+@pytest.mark.parametrize('shape', [(1, 30), (30, 1), (37, 29), (29, 37)])
+def test_nearest_matches_all_pairs(type_id, shape):
+    cells = random_cells(2, shape)
+    cells[cells == MOUNTAIN] = WATER
+    cells.flat[np.random.default_rng(3).choice(cells.size, 3, replace=False)] = MOUNTAIN
+
+    nearest = regions.nearest_cells(cells, type_id)
+    rows, cols = np.divmod(np.arange(0, cells.size), shape[1])
+    targets = np.flatnonzero(cells == type_id)
+    all_pairs = (rows[:, None] - rows[targets]) ** 2 + (cols[:, None] - cols[targets]) ** 2
+
+    assert np.all(cells.ravel()[nearest.ravel()] == type_id)
+    found = (rows - rows[nearest.ravel()]) ** 2 + (cols - cols[nearest.ravel()]) ** 2
+    np.testing.assert_array_equal(found, all_pairs.min(axis=1))
+
+
+def test_nearest_of_one_cell():
+    # A single cell of the type is nearest to everything, the case that was slowest before the lower envelope
+    cells = np.full((300, 200), WATER, dtype=np.uint8)
+    cells[120, 7] = MOUNTAIN
+    np.testing.assert_array_equal(regions.nearest_cells(cells, MOUNTAIN), 120 * 200 + 7)
+
+
+@pytest.mark.parametrize('shape', [(40, 25), (25, 40)])
+def test_lower_envelope_matches_brute_force(shape):
+    rng = np.random.default_rng(6)
+    distances = rng.integers(0, 60, shape).astype(np.float64)
+    distances[rng.random(shape) < 0.7] = np.inf
+    distances[rng.integers(0, shape[0], shape[1]), np.arange(0, shape[1])] = 4.0
+
+    nearest = regions.lower_envelope(distances)
+    rows = np.arange(0, shape[0])[:, None]
+    columns = np.arange(0, shape[1])
+    brute_force = ((rows[:, :, None] - rows[:, 0]) ** 2 + distances.T[None]).min(axis=2)
+    np.testing.assert_array_equal((rows - nearest) ** 2 + distances[nearest, columns], brute_force)
+
+
+def test_nearest_of_absent_type():
+    cells = np.full((4, 5), GRASS, dtype=np.uint8)
+    np.testing.assert_array_equal(regions.nearest_cells(cells, WATER), -1)
+
+
+def test_index_round_trip(tmp_path):
+    cells = random_cells(4, (33, 45))
+    map_index = build_index(cells)
+    path = index_path(str(tmp_path / 'map_00000.trn'))
+    assert path.endswith('map_00000.index.npz')
+    map_index.save(path)
+
+    loaded = load_index(path)
+    assert loaded.connectivity == map_index.connectivity
+    for field in regions.Regions._fields:
+        np.testing.assert_array_equal(getattr(loaded.regions, field), getattr(map_index.regions, field))
+    assert loaded.nearest.keys() == map_index.nearest.keys()
+
+    x, y = 10, 20
+    region = loaded.region_at(x, y)
+    assert region.type_id == cells[y, x]
+    assert x - region.bounding_box[0] < region.bounding_box[2] and y - region.bounding_box[1] < region.bounding_box[3]
+    nearest_x, nearest_y = loaded.nearest_cell(x, y, MOUNTAIN)
+    assert cells[nearest_y, nearest_x] == MOUNTAIN
+    assert loaded.distances(MOUNTAIN)[y, x] == pytest.approx(loaded.distance_to(x, y, MOUNTAIN))
+
+
+def test_load_rejects_other_files(tmp_path):
+    path = str(tmp_path / 'other.npz')
+    np.savez(path, cells=np.zeros(3))
+    with pytest.raises(MapFormatError):
+        load_index(path)
+
+
+def saved_index(tmp_path):
+    path = str(tmp_path / 'map.index.npz')
+    build_index(random_cells(5, (20, 30))).save(path)
+    with open(path, 'rb') as index_file:
+        return path, index_file.read()
+
+
+@pytest.mark.parametrize('corrupt', [
+    lambda data: data[:len(data) // 2],
+    lambda data: data[:10],
+    lambda data: b'',
+    lambda data: b'this is not a zip file' * 10,
+    lambda data: data[:len(data) // 2] + bytes(len(data) - len(data) // 2),
+])
+def test_load_rejects_corrupt_files(tmp_path, corrupt):
+    path, data = saved_index(tmp_path)
+    with open(path, 'wb') as index_file:
+        index_file.write(corrupt(data))
+
+    with pytest.raises(MapFormatError):
+        load_index(path)
+
+
+def test_load_rejects_bare_npy(tmp_path):
+    path = str(tmp_path / 'map.index.npz')
+    with open(path, 'wb') as index_file:
+        np.save(index_file, np.zeros((3, 3)))
+
+    with pytest.raises(MapFormatError):
+        load_index(path)
+
+
+def test_load_rejects_pickles(tmp_path):
+    path = str(tmp_path / 'map.index.npz')
+    with open(path, 'wb') as index_file:
+        np.save(index_file, np.array([{'version': 1}], dtype=object), allow_pickle=True)
+
+    with pytest.raises(MapFormatError):
+        load_index(path)
+
+
+def test_load_rejects_other_versions(tmp_path):
+    path = str(tmp_path / 'map.index.npz')
+    np.savez(path, version=99)
+
+    with pytest.raises(MapFormatError, match='version'):
+        load_index(path)
+
+
+def test_index_saver(tmp_path):
+    cells = random_cells(7, (24, 31))
+    saver = IndexSaver()
+    assert saver.index_of(cells) is None
+
+    path = str(tmp_path / 'map.index.npz')
+    assert saver.save(cells, path)
+    saver.thread.join()
+    built = saver.index_of(cells)
+    assert built is not None
+    np.testing.assert_array_equal(load_index(path).regions.labels, built.regions.labels)
+
+    # Saving the same grid again reuses its index, a different grid doesn't
+    assert saver.save(cells, path)
+    saver.thread.join()
+    assert saver.index_of(cells) is built
+    assert saver.index_of(cells.copy()) is None
@@ -0,0 +1,45 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+import grid
+from classes.strip_world import StripWorld
+from helper import get_grid_shape
+from neighbourhood import BOUNDARY_MODES
+from random_field import RandomField
+
+
+def test_strips_cover_every_row():
+    strips = StripWorld(10, 20, 3).strips()
+    assert strips == [(0, 3), (3, 6), (6, 10)]
+    assert StripWorld(2, 20, 8).workers == 2
+
+
+@pytest.mark.parametrize('boundary', BOUNDARY_MODES)
+@pytest.mark.parametrize('workers', [1, 2, 3])
+@pytest.mark.parametrize('min_changes', [0, grid.MIN_CHANGES])
+def test_matches_generate_terrain(boundary, workers, min_changes):
+    world = StripWorld(*get_grid_shape(100, 74, 4), workers, boundary=boundary)
+    cells = world.generate_terrain(50, RandomField(17), grid.TRANSFORM_PASSES, min_changes)
+
+    expected = grid.generate_terrain(100, 74, 4, 50, grid.TRANSFORM_PASSES, RandomField(17), min_changes=min_changes,
+                                     boundary=boundary)
+    np.testing.assert_array_equal(cells, expected)
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != 'fork', reason='needs workers forked from the test')
+def test_failed_worker_stops_the_others(monkeypatch):
+    # Workers are forked, so they see the patched random_grid. Every strip but the first fails before its first
+    # exchange, leaving the first waiting at the barrier until they break it
+    random_grid = grid.random_grid
+
+    def failing_random_grid(shape, grass_chance, random_field, origin=(0, 0)):
+        if origin[0] > 0:
+            raise RuntimeError('strip failed')
+        return random_grid(shape, grass_chance, random_field, origin)
+
+    monkeypatch.setattr(grid, 'random_grid', failing_random_grid)
+    world = StripWorld(*get_grid_shape(100, 74, 4), 3)
+    with pytest.raises(RuntimeError, match='exit codes'):
+        world.generate_terrain(50, RandomField(17))
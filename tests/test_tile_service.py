@@ -0,0 +1,87 @@
+import asyncio
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import tiles
+from classes.infinite_world import generate_region
+from classes.tile_service import TileService
+
+
+@pytest.fixture
+def service(monkeypatch):
+    # Tiles are made on threads rather than in worker processes, so the patched render_tile is the one called
+    calls = []
+    release = threading.Event()
+    release.set()
+
+    def render_tile(seed, land_chance, z, x, y, tile_format):
+        calls.append((seed, z, x, y, tile_format))
+        release.wait()
+        return bytes(100)
+
+    monkeypatch.setattr(tiles, 'render_tile', render_tile)
+    tile_service = TileService(50, max_bytes=250)
+    tile_service._executor.shutdown()
+    tile_service._executor = ThreadPoolExecutor(max_workers=2)
+    tile_service.calls = calls
+    tile_service.release = release
+    yield tile_service
+    release.set()
+    tile_service.close()
+
+
+def test_concurrent_requests_are_coalesced(service):
+    async def request_twice():
+        service.release.clear()
+        requests = asyncio.gather(service.get_tile(1, 4, 0, 0, 'png'), service.get_tile(1, 4, 0, 0, 'png'))
+        # Let both requests start before the tile is finished
+        await asyncio.sleep(0.05)
+        service.release.set()
+        return await requests
+
+    first, second = asyncio.run(request_twice())
+    assert first == second
+    assert service.calls == [(1, 4, 0, 0, 'png')]
+    assert service.stats()['misses'] == 1 and service.stats()['coalesced'] == 1
+
+
+def test_cache_evicts_least_recently_used(service):
+    async def request(*tile):
+        return await service.get_tile(1, 4, *tile, 'png')
+
+    async def requests():
+        await request(0, 0)
+        await request(1, 0)
+        await request(0, 0)
+        # Over the 250 bytes, so the least recently used tile, (1, 0), goes
+        await request(2, 0)
+        assert service.stats()['tiles'] == 2 and service.stats()['cached_bytes'] == 200
+        await request(0, 0)
+        await request(2, 0)
+        await request(1, 0)
+
+    asyncio.run(requests())
+    assert [call[2:4] for call in service.calls] == [(0, 0), (1, 0), (2, 0), (1, 0)]
+    assert service.stats()['hits'] == 3
+
+
+@pytest.mark.parametrize('z', [tiles.BASE_ZOOM + 2, tiles.BASE_ZOOM - 1])
+def test_tiles_line_up_at_their_seams(z):
+    # Four tiles around the origin make up the same terrain as one region covering all of them
+    top, left, size, step = tiles.tile_area(z, -1, -1)
+    region = generate_region(3, 50, top, left, (size * 2, size * 2))[::step, ::step]
+    quarter = size // step
+    for x in (-1, 0):
+        for y in (-1, 0):
+            row, col = (y + 1) * quarter, (x + 1) * quarter
+            expected = region[row:row + quarter, col:col + quarter]
+            np.testing.assert_array_equal(tiles.tile_cells(3, 50, z, x, y), expected)
+
+
+def test_npy_tiles_decode_to_their_cells():
+    tile = tiles.render_tile(3, 50, tiles.BASE_ZOOM + 2, 1, -2, 'npy')
+    np.testing.assert_array_equal(np.load(io.BytesIO(tile)), tiles.tile_cells(3, 50, tiles.BASE_ZOOM + 2, 1, -2))
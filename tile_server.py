@@ -0,0 +1,60 @@
+import argparse
+import asyncio
+import os
+from typing import List, Optional
+
+from classes.tile_service import DEFAULT_MAX_BYTES, TileService
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Parse the command line arguments for the tile server.
+
+    :param argv:  The arguments to parse, sys.argv is used if not given
+
+    :return: The parsed arguments
+    """
+    parser = argparse.ArgumentParser(description='Serve tiles of unbounded terrain worlds over HTTP, at '
+                                                 '/{seed}/{z}/{x}/{y}.png or .npy for the raw terrain type codes.')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8000, help='Port to listen on')
+    parser.add_argument('--land-chance', type=int, default=50,
+                        help='The chance that a terrain square will randomly start as a grass square')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='Number of worker processes tiles are made in, 0 uses one per CPU core')
+    parser.add_argument('--cache-mb', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help='Memory the cached tiles can take up, in megabytes')
+
+    return parser.parse_args(argv)
+
+
+async def serve(args: argparse.Namespace) -> None:
+    """
+    Run the tile server until it's interrupted.
+
+    :param args:  The parsed command line arguments
+    """
+    service = TileService(args.land_chance, args.workers or os.cpu_count() or 1, args.cache_mb * 1024 * 1024)
+    try:
+        server = await service.serve(args.host, args.port)
+        print('Serving tiles on http://{}:{}/'.format(args.host, args.port))
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Start the tile server.
+
+    :param argv:  The arguments to parse, sys.argv is used if not given
+    """
+    try:
+        asyncio.run(serve(parse_args(argv)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
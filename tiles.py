@@ -0,0 +1,112 @@
+import io
+import struct
+import zlib
+from typing import Tuple
+
+import numpy as np
+
+from classes.infinite_world import generate_region
+from terrain_types import PALETTE
+
+# Width and height of a tile in pixels
+TILE_SIZE = 256
+
+# At the base zoom level each cell is one pixel. Each level in is twice the size, and each level out shows every
+# other cell of the level in from it, so covers twice the area
+BASE_ZOOM = 4
+MIN_ZOOM = 1
+MAX_ZOOM = 8
+
+# A tile rendered as a png image, or the raw grid of terrain type codes it shows in numpy's npy format
+TILE_FORMATS = ('png', 'npy')
+
+
+def tile_area(z: int, x: int, y: int) -> Tuple[int, int, int, int]:
+    """
+    Work out which cells of the world a tile covers.
+
+    :param z:  The zoom level
+    :param x:  The column of the tile
+    :param y:  The row of the tile
+
+    :return: The row and column in the world of the tile's top left cell, the number of cells it covers across and
+             down, and the step between the cells it shows
+    """
+    if z >= BASE_ZOOM:
+        size = TILE_SIZE >> (z - BASE_ZOOM)
+        step = 1
+    else:
+        size = TILE_SIZE << (BASE_ZOOM - z)
+        step = 1 << (BASE_ZOOM - z)
+
+    return y * size, x * size, size, step
+
+
+def tile_cells(seed: int, land_chance: int, z: int, x: int, y: int) -> np.ndarray:
+    """
+    Generate the grid of terrain type codes a tile shows, one per cell at the base zoom level and in, and every
+    step-th cell across and down further out.
+
+    :param seed:         The seed of the world
+    :param land_chance:  The chance that a given cell should start as grass
+    :param z:            The zoom level
+    :param x:            The column of the tile
+    :param y:            The row of the tile
+
+    :return: The grid of terrain type codes
+    """
+    top, left, size, step = tile_area(z, x, y)
+    return generate_region(seed, land_chance, top, left, (size, size))[::step, ::step]
+
+
+def render_tile(seed: int, land_chance: int, z: int, x: int, y: int, tile_format: str) -> bytes:
+    """
+    Generate a tile and encode it, run in a worker process.
+
+    :param seed:         The seed of the world
+    :param land_chance:  The chance that a given cell should start as grass
+    :param z:            The zoom level
+    :param x:            The column of the tile
+    :param y:            The row of the tile
+    :param tile_format:  One of TILE_FORMATS
+
+    :return: The encoded tile
+    """
+    cells = tile_cells(seed, land_chance, z, x, y)
+    if tile_format == 'npy':
+        buffer = io.BytesIO()
+        np.save(buffer, np.ascontiguousarray(cells))
+        return buffer.getvalue()
+
+    # Look up each cell's colour and scale it up to the tile size
+    scale = TILE_SIZE // cells.shape[0]
+    pixels = PALETTE[cells]
+    if scale > 1:
+        pixels = np.repeat(np.repeat(pixels, scale, axis=0), scale, axis=1)
+    return encode_png(pixels)
+
+
+def encode_png(pixels: np.ndarray) -> bytes:
+    """
+    Encode an image as a png, using only the standard library.
+
+    :param pixels:  The uint8 RGB colour of each pixel, indexed by row then column
+
+    :return: The png file's bytes
+    """
+    height, width = pixels.shape[:2]
+
+    # Each row of pixels starts with a byte giving its filter type, 0 being no filter
+    rows = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    rows[:, 1:] = pixels.reshape(height, width * 3)
+
+    def chunk(chunk_type: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + chunk_type + data + \
+            struct.pack('>I', zlib.crc32(chunk_type + data) & 0xFFFFFFFF)
+
+    return b''.join((
+        b'\x89PNG\r\n\x1a\n',
+        chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)),
+        chunk(b'IDAT', zlib.compress(rows.tobytes(), 6)),
+        chunk(b'IEND', b''),
+    ))
@@ -1,15 +1,28 @@
-from random import randint
-from typing import List, Union
+from typing import List, Optional, Union
 
+import numpy as np
 import pygame
 from pygame.surface import Surface, SurfaceType
 
 from helper import get_2d_list
 from classes.terrain_square import TerrainSquare
+from neighbourhood import DEFAULT_BOUNDARY, neighbour_type_ids
+from random_field import RandomField
+from terrain_types import WATER, GRASS, MOUNTAIN
+
+# The chances of grass surrounded by grass turning to mountain, and of grass next to one or two mountains turning to
+# mountain, along with the random field streams they draw from. The streams are the indices of the matching rules in
+# rules.DEFAULT_RULES, so the grid engine makes the same map from the same random field
+MOUNTAIN_CHANCE = 1 / 1001
+MOUNTAIN_STREAM = 1
+MOUNTAIN_SPREAD_CHANCE = 100 / 1001
+MOUNTAIN_SPREAD_STREAM = 2
 
 
 def transform(original_list: List[List[TerrainSquare]], screen_width: int, screen_height: int, square_size: int,
-              display_surface: Union[Surface, SurfaceType], show_process: bool) -> List[List[TerrainSquare]]:
+              display_surface: Union[Surface, SurfaceType], show_process: bool,
+              boundary: str = DEFAULT_BOUNDARY, random_field: Optional[RandomField] = None,
+              pass_index: int = 1) -> List[List[TerrainSquare]]:
     """
     This function acts as the cellular automata algorithm; it takes the list of terrain squares and transforms each
     square according to the state of it's neighbours. With successive iterations this smooths out the terrain into
@@ -22,93 +35,110 @@ def transform(original_list: List[List[TerrainSquare]], screen_width: int, scree
     :param display_surface:  The display surface to draw onto
     :param show_process:     Debug variable which, when set to true,
                              shows the output of each iteration of running the transform
+    :param boundary:         How squares on the edge of the map see past it, one of neighbourhood.BOUNDARY_MODES
+    :param random_field:     The random field to draw from, a freshly seeded one is used if not given
+    :param pass_index:       The number of the pass, which picks the random field's draws
 
     :return: The transformed list of terrain squares
     """
 
     squares_list = get_2d_list(screen_width, screen_height, square_size)
 
+    # Draw for every square at once rather than square by square
+    if random_field is None:
+        random_field = RandomField()
+    shape = (len(original_list), len(original_list[0]))
+    mountain_draws = (random_field.block(pass_index, MOUNTAIN_STREAM, 0, 0, shape) <
+                      np.float32(MOUNTAIN_CHANCE)).tolist()
+    mountain_spread_draws = (random_field.block(pass_index, MOUNTAIN_SPREAD_STREAM, 0, 0, shape) <
+                             np.float32(MOUNTAIN_SPREAD_CHANCE)).tolist()
+
+    # Changes are only applied once every square has been evaluated, so that every square sees the state of its
+    # neighbours from before this iteration whatever order the squares are visited in
+    changes = []
+
     for i in range(0, len(original_list)):
         for j in range(0, len(original_list[i])):
 
             # Land pruning ----------------------------------------------------------------------------------
 
-            if original_list[i][j].terrain_type[0] == "Grass":
+            if original_list[i][j].type_id == GRASS:
 
                 # Set neighbour counts
                 neighbour_count = 0
                 mountain_neighbour_count = 0
 
                 # Find neighbours
-                for neighbour in original_list[i][j].neighbours:
-                    if neighbour.terrain_type[0] == "Grass":
+                for neighbour in neighbour_type_ids(original_list, i, j, boundary):
+                    if neighbour == GRASS:
                         neighbour_count += 1
-
-                for neighbour in original_list[i][j].neighbours:
-                    if neighbour.terrain_type[0] == "Mountain":
+                    elif neighbour == MOUNTAIN:
                         mountain_neighbour_count += 1
 
                 # Create mountains
-                mountain_true = randint(0, 1000)
-                if neighbour_count > 7 and mountain_true > 999:
-                    set_as_mountain(i, j, squares_list, original_list, display_surface, show_process)
+                if neighbour_count > 7 and mountain_draws[i][j]:
+                    changes.append((i, j, set_as_mountain))
                 elif neighbour_count + mountain_neighbour_count > 3:
                     squares_list[i][j] = original_list[i][j]
                 else:
-                    set_as_water(i, j, squares_list, original_list, display_surface, show_process)
+                    changes.append((i, j, set_as_water))
 
                 # Turn grass to mountain if right amount of neighbours are mountain
-                mountain_chance = randint(0, 1000)
-                if 3 > mountain_neighbour_count >= 1 and mountain_chance > 900:
-                    set_as_mountain(i, j, squares_list, original_list, display_surface, show_process)
+                if 3 > mountain_neighbour_count >= 1 and mountain_spread_draws[i][j]:
+                    changes.append((i, j, set_as_mountain))
                 else:
                     squares_list[i][j] = original_list[i][j]
             # ------------------------------------------------------------------------------------------------
 
             # Water pruning ----------------------------------------------------------------------------------
-            elif original_list[i][j].terrain_type[0] == "Water":
+            elif original_list[i][j].type_id == WATER:
                 neighbour_count = 0
-                for neighbour in original_list[i][j].neighbours:
-                    if neighbour.terrain_type[0] == "Grass" or neighbour.terrain_type[0] == "Mountain":
+                for neighbour in neighbour_type_ids(original_list, i, j, boundary):
+                    if neighbour == GRASS or neighbour == MOUNTAIN:
                         neighbour_count += 1
                 if neighbour_count > 4:
-                    set_as_grass(i, j, squares_list, original_list, display_surface, show_process)
+                    changes.append((i, j, set_as_grass))
                 else:
                     squares_list[i][j] = original_list[i][j]
             # -------------------------------------------------------------------------------------------------
 
             # Mountain pruning --------------------------------------------------------------------------------
-            elif original_list[i][j].terrain_type[0] == "Mountain":
+            elif original_list[i][j].type_id == MOUNTAIN:
                 water_neighbour_count = 0
 
-                for neighbour in original_list[i][j].neighbours:
-                    if neighbour.terrain_type[0] == "Water":
+                for neighbour in neighbour_type_ids(original_list, i, j, boundary):
+                    if neighbour == WATER:
                         water_neighbour_count += 1
 
                 if water_neighbour_count > 6:
-                    set_as_grass(i, j, squares_list, original_list, display_surface, show_process)
+                    changes.append((i, j, set_as_grass))
                 else:
                     squares_list[i][j] = original_list[i][j]
             # -------------------------------------------------------------------------------------------------
 
+    for i, j, set_as in changes:
+        set_as(i, j, squares_list, original_list, display_surface)
+
+    # Show the whole pass with one display update, rather than one for every square changed
+    if show_process:
+        pygame.display.update()
+
     return squares_list
 
 
-def set_as_mountain(i, j, squares_list, original_list, display_surface, show_process):
-    set_as_type(("Mountain", (146, 146, 135)), i, j, squares_list, original_list, display_surface, show_process)
+def set_as_mountain(i, j, squares_list, original_list, display_surface):
+    set_as_type(MOUNTAIN, i, j, squares_list, original_list, display_surface)
 
 
-def set_as_water(i, j, squares_list, original_list, display_surface, show_process):
-    set_as_type(("Water", (0, 0, 255)), i, j, squares_list, original_list, display_surface, show_process)
+def set_as_water(i, j, squares_list, original_list, display_surface):
+    set_as_type(WATER, i, j, squares_list, original_list, display_surface)
 
 
-def set_as_grass(i, j, squares_list, original_list, display_surface, show_process):
-    set_as_type(("Grass", (0, 255, 0)), i, j, squares_list, original_list, display_surface, show_process)
+def set_as_grass(i, j, squares_list, original_list, display_surface):
+    set_as_type(GRASS, i, j, squares_list, original_list, display_surface)
 
 
-def set_as_type(terrain_type, i, j, squares_list, original_list, display_surface, show_process):
+def set_as_type(type_id, i, j, squares_list, original_list, display_surface):
     squares_list[i][j] = original_list[i][j]
-    squares_list[i][j].terrain_type = terrain_type
+    squares_list[i][j].type_id = type_id
     squares_list[i][j].draw_square(display_surface)
-    if show_process:
-        pygame.display.update()